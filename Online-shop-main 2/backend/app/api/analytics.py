@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, timedelta
+from typing import List, Optional
+from backend.app.db.postgres import get_db
+from backend.app.dependencies.auth import get_current_admin
+from backend.app.schemas.analytics import DailySales, ProductSales, CategorySales
+from backend.app.services.analytics import revenue_by_day, top_products, sales_by_category
+
+router = APIRouter()
+
+
+def date_range(date_from: Optional[date] = None, date_to: Optional[date] = None) -> tuple[date, date]:
+    # По умолчанию — последние 30 дней
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=29)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    return date_from, date_to
+
+
+@router.get("/revenue", response_model=List[DailySales])
+async def get_revenue(period=Depends(date_range), db: AsyncSession = Depends(get_db), admin=Depends(get_current_admin)):
+    return await revenue_by_day(db, *period)
+
+
+@router.get("/top-products", response_model=List[ProductSales])
+async def get_top_products(
+    by: str = Query("revenue", pattern="^(revenue|units)$"),
+    limit: int = Query(10, ge=1, le=100),
+    period=Depends(date_range),
+    db: AsyncSession = Depends(get_db),
+    admin=Depends(get_current_admin)
+):
+    return await top_products(db, *period, by=by, limit=limit)
+
+
+@router.get("/categories", response_model=List[CategorySales])
+async def get_category_sales(period=Depends(date_range), db: AsyncSession = Depends(get_db), admin=Depends(get_current_admin)):
+    return await sales_by_category(db, *period)
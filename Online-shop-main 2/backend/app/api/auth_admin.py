@@ -3,7 +3,6 @@ from fastapi.templating import Jinja2Templates
 from fastapi.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from passlib.hash import bcrypt
 from uuid import uuid4
 from datetime import datetime
 import json
@@ -11,6 +10,11 @@ import logging
 from backend.app.db.postgres import get_db
 from backend.app.db.redis import get_redis
 from backend.app.models.postgres_models import Admin
+from backend.app.services.passwords import hash_password, verify_password
+from backend.app.services.sessions import (
+    SESSION_MODE, ACCESS_COOKIE, REFRESH_COOKIE, start_session, set_session_cookies, clear_session_cookies,
+    refresh_session, end_session
+)
 from backend.app.schemas.admin import AdminRegister, AdminLogin, AdminOut
 from redis.asyncio import Redis
 from backend.app.dependencies.auth import get_current_admin  # Импортируем зависимость
@@ -42,7 +46,7 @@ async def register_admin(
     if result.scalar_one_or_none():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
 
-    hashed_password = bcrypt.hash(admin_password)
+    hashed_password = await hash_password(admin_password)
     new_admin = Admin(email=admin_email, password=hashed_password)
 
     try:
@@ -82,9 +86,27 @@ async def login_admin(
     result = await db.execute(select(Admin).where(Admin.email == admin_email))
     admin = result.scalar_one_or_none()
 
-    if not admin or not bcrypt.verify(admin_password, admin.password):
+    if not admin:
         logger.error(f"Invalid credentials for {admin_email}")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    valid, new_hash = await verify_password(admin_password, admin.password)
+    if not valid:
+        logger.error(f"Invalid credentials for {admin_email}")
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    if new_hash:
+        # Параметры стоимости изменились: сохраняем пересчитанный хеш
+        admin.password = new_hash
+        await db.commit()
+        logger.debug(f"Password rehashed for admin {admin_email}")
+
+    if SESSION_MODE == "token":
+        session_id, refresh_token = await start_session(redis, {"admin_id": admin.id})
+        if data:
+            set_session_cookies(response, session_id, refresh_token)
+            return {"session_id": session_id}
+        redirect = RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
+        set_session_cookies(redirect, session_id, refresh_token)
+        return redirect
 
     # Check for existing session
     async for key in redis.scan_iter("session:*"):
@@ -130,6 +152,17 @@ async def login_admin(
     logger.debug(f"Cookie set for new session: session_id={session_id}")
     return {"session_id": session_id} if data else RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
 
+@router.post("/refresh")
+async def refresh_admin_session(request: Request, response: Response, redis: Redis = Depends(get_redis)):
+    return await refresh_session(request, response, redis)
+
+@router.post("/logout")
+async def logout_admin(request: Request, redis: Redis = Depends(get_redis)):
+    await end_session(redis, request.cookies.get(ACCESS_COOKIE), request.cookies.get(REFRESH_COOKIE))
+    redirect = RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
+    clear_session_cookies(redirect)
+    return redirect
+
 @router.get("/admin/protected")
 async def protected_route(admin: dict = Depends(get_current_admin)):
     logger.debug(f"Admin accessing protected route: {admin}")
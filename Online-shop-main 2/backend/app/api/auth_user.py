@@ -7,16 +7,16 @@ from backend.app.db.postgres import get_db
 from backend.app.db.redis import get_redis
 from backend.app.models.postgres_models import Customer
 from backend.app.schemas.user import UserRegister, UserLogin, UserOut
-from passlib.context import CryptContext
+from backend.app.services.passwords import hash_password, verify_password
+from backend.app.services.sessions import (
+    SESSION_MODE, ACCESS_COOKIE, REFRESH_COOKIE, start_session, set_session_cookies, clear_session_cookies,
+    refresh_session, end_session
+)
 from redis.asyncio import Redis
-import uuid
-import json
 import logging
-from datetime import datetime
 from typing import Optional
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 templates = Jinja2Templates(directory="templates")
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -51,7 +51,7 @@ async def register_user(
         address=address
     )
 
-    hashed_password = pwd_context.hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     new_user = Customer(
         name=user_data.name,
         email=user_data.email,
@@ -95,22 +95,41 @@ async def login_user(
     logger.debug(f"Attempting to login user: {email}")
     result = await db.execute(select(Customer).where(Customer.email == email))
     user = result.scalars().first()
-    if not user or not pwd_context.verify(pwd, user.password):
+    if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
+    valid, new_hash = await verify_password(pwd, user.password)
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
+    if new_hash:
+        # Параметры стоимости изменились: сохраняем пересчитанный хеш
+        user.password = new_hash
+        await db.commit()
+        logger.debug(f"Password rehashed for user {email}")
 
-    session_id = str(uuid.uuid4())
-    session_data = {
-        "customer_id": user.id,
-        "last_activity": datetime.utcnow().isoformat()
-    }
     try:
-        await redis.set(f"session:{session_id}", json.dumps(session_data), ex=3600)
-        logger.debug(f"Session created for user {email}: {session_id}")
+        session_id, refresh_token = await start_session(redis, {"customer_id": user.id})
+        logger.debug(f"Session created for user {email} ({SESSION_MODE} mode)")
     except Exception as e:
         logger.error(f"Redis error: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create session")
 
-    response.set_cookie(key="session_id", value=session_id, httponly=True)
     if user_data:  # JSON API
+        set_session_cookies(response, session_id, refresh_token)
         return {"message": "Login successful", "session_id": session_id}
-    return RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
\ No newline at end of file
+    # Cookie ставится на сам редирект: заголовки параметра response к возвращаемому ответу не добавляются
+    redirect = RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
+    set_session_cookies(redirect, session_id, refresh_token)
+    return redirect
+
+
+@router.post("/jwt/refresh")
+async def refresh_user_session(request: Request, response: Response, redis: Redis = Depends(get_redis)):
+    return await refresh_session(request, response, redis)
+
+
+@router.post("/jwt/logout")
+async def logout_user(request: Request, redis: Redis = Depends(get_redis)):
+    await end_session(redis, request.cookies.get(ACCESS_COOKIE), request.cookies.get(REFRESH_COOKIE))
+    redirect = RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
+    clear_session_cookies(redirect)
+    return redirect
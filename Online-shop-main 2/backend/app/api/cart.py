@@ -1,5 +1,5 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -10,6 +10,10 @@ from backend.app.db.redis import get_redis
 from backend.app.models.postgres_models import Product
 from backend.app.dependencies.auth import get_current_user
 from backend.app.schemas.cart import CartItem, CartOut
+from backend.app.services.reservations import reserve_stock, release_stock
+from backend.app.services.sessions import resolve_session
+from backend.app.services.serialization import fast_json
+from backend.app.services.pricing import price_cart
 import json
 
 # Настройка логирования
@@ -24,98 +28,101 @@ async def get_auth_context(request: Request, redis=Depends(get_redis)):
     is_authenticated = False
     session_id = request.cookies.get("session_id")
     if session_id:
-        session_data = await redis.get(f"session:{session_id}")
-        if session_data:
+        if await resolve_session(redis, session_id):
             is_authenticated = True
     return {"request": request, "is_authenticated": is_authenticated}
 
 @router.get("/html")
 async def read_cart_html(context: dict = Depends(get_auth_context), user=Depends(get_current_user), db_pg: AsyncSession = Depends(get_db), db_mongo=Depends(get_mongo_db)):
     logger.debug(f"Reading cart for user: {user}")
-    cart = get_cart(db_mongo, str(user["customer_id"]))
+    cart = get_cart(db_mongo, str(user["id"]))
     if not cart or not cart.get("items"):
-        return templates.TemplateResponse("cart.html", {**context, "cart_items": [], "total": 0})
+        return templates.TemplateResponse("cart.html", {**context, "cart_items": [], "total": 0, "discount": 0})
 
     product_ids = [item["product_id"] for item in cart["items"]]
     result = await db_pg.execute(select(Product).where(Product.id.in_(product_ids)))
     products = {p.id: p for p in result.scalars().all()}
 
-    cart_items = []
-    total = 0
-    for item in cart["items"]:
-        product = products.get(item["product_id"])
-        if product:
-            cart_items.append({
-                "product": product,
-                "quantity": item["quantity"]
-            })
-            total += product.price * item["quantity"]
-
-    return templates.TemplateResponse("cart.html", {**context, "cart_items": cart_items, "total": total})
+    lines = [(products[item["product_id"]], item["quantity"]) for item in cart["items"] if item["product_id"] in products]
+    # Вся корзина одним проходом: акции, округление до копейки, итог без ошибок float
+    priced = await price_cart(db_mongo, lines)
+    cart_items = [
+        {"product": product, "quantity": quantity, "line": line}
+        for (product, quantity), line in zip(lines, priced.lines)
+    ]
+    return templates.TemplateResponse(
+        "cart.html", {**context, "cart_items": cart_items, "total": priced.total, "discount": priced.discount}
+    )
 
 @router.get("/", response_model=CartOut)
 async def read_cart(user=Depends(get_current_user), db=Depends(get_mongo_db)):
     logger.debug(f"Reading cart API for user: {user}")
-    cart = get_cart(db, str(user["customer_id"]))
+    cart = get_cart(db, str(user["id"]))
     if not cart or not cart.get("items"):
         raise HTTPException(status_code=404, detail="Cart is empty")
-    return cart
+    return fast_json(cart, CartOut)
 
 @router.post("/add", status_code=201)
-async def add_to_cart_endpoint(item: CartItem, user=Depends(get_current_user), db_mongo=Depends(get_mongo_db)):
+async def add_to_cart_endpoint(item: CartItem, user=Depends(get_current_user), db_mongo=Depends(get_mongo_db),
+                               db_pg: AsyncSession = Depends(get_db), redis=Depends(get_redis)):
     logger.debug(f"Adding to cart (endpoint): {item}, user: {user}")
-    cart = get_cart(db_mongo, str(user["customer_id"])) or {"items": [], "customer_id": str(user["customer_id"])}
+    product = await db_pg.get(Product, item.product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    await reserve_stock(redis, user["id"], product, item.quantity)
+    cart = get_cart(db_mongo, str(user["id"])) or {"items": [], "customer_id": str(user["id"])}
     for existing in cart["items"]:
         if existing["product_id"] == item.product_id:
             existing["quantity"] += item.quantity
             break
     else:
-        cart["items"].append(item.dict())
-    set_cart(str(user["customer_id"]), cart, db_mongo)
+        cart["items"].append(item.model_dump(mode="json"))
+    set_cart(str(user["id"]), cart, db_mongo)
     return cart
 
 @router.post("/add/html")
 async def add_to_cart_html(
     product_id: int = Form(...),
-    quantity: int = Form(...),
+    quantity: int = Form(..., ge=1),
     user=Depends(get_current_user),
     db_mongo=Depends(get_mongo_db),
-    db_pg: AsyncSession = Depends(get_db)
+    db_pg: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis)
 ):
     logger.debug(f"Adding to cart (html): product_id={product_id}, quantity={quantity}, user={user}")
     product = await db_pg.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    if quantity > product.stock_quantity:
-        raise HTTPException(status_code=400, detail="Requested quantity exceeds stock")
-    cart = get_cart(db_mongo, str(user["customer_id"])) or {"items": [], "customer_id": str(user["customer_id"])}
+    # Резерв в Redis: при распродаже конкуренция за остаток не доходит до строк products
+    await reserve_stock(redis, user["id"], product, quantity)
+    cart = get_cart(db_mongo, str(user["id"])) or {"items": [], "customer_id": str(user["id"])}
     for existing in cart["items"]:
         if existing["product_id"] == product_id:
             existing["quantity"] += quantity
             break
     else:
         cart["items"].append({"product_id": product_id, "quantity": quantity})
-    set_cart(str(user["customer_id"]), cart, db_mongo)
+    set_cart(str(user["id"]), cart, db_mongo)
     return RedirectResponse(url="/cart/html", status_code=303)
 
 @router.post("/add/{product_id}")
 async def add_to_cart_by_id(
     product_id: int,
-    quantity: int = 1,  # По умолчанию добавляем 1 единицу товара
+    quantity: int = Query(1, ge=1),  # По умолчанию добавляем 1 единицу товара
     user=Depends(get_current_user),
     db_mongo=Depends(get_mongo_db),
-    db_pg: AsyncSession = Depends(get_db)
+    db_pg: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis)
 ):
     logger.debug(f"Adding to cart by ID: product_id={product_id}, quantity={quantity}, user={user}")
     # Проверяем, существует ли продукт
     product = await db_pg.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    if quantity > product.stock_quantity:
-        raise HTTPException(status_code=400, detail="Requested quantity exceeds stock")
+    await reserve_stock(redis, user["id"], product, quantity)
 
     # Получаем корзину или создаем пустую
-    cart = get_cart(db_mongo, str(user["customer_id"])) or {"items": [], "customer_id": str(user["customer_id"])}
+    cart = get_cart(db_mongo, str(user["id"])) or {"items": [], "customer_id": str(user["id"])}
 
     # Обновляем или добавляем товар в корзину
     for existing in cart["items"]:
@@ -126,27 +133,32 @@ async def add_to_cart_by_id(
         cart["items"].append({"product_id": product_id, "quantity": quantity})
 
     # Сохраняем корзину
-    set_cart(str(user["customer_id"]), cart, db_mongo)
+    set_cart(str(user["id"]), cart, db_mongo)
     return RedirectResponse(url="/cart/html", status_code=303)
 
 @router.post("/remove", status_code=204)
-async def remove_item(item: CartItem, user=Depends(get_current_user), db=Depends(get_mongo_db)):
+async def remove_item(item: CartItem, user=Depends(get_current_user), db=Depends(get_mongo_db), redis=Depends(get_redis)):
     logger.debug(f"Removing item: {item}, user={user}")
-    remove_from_cart(db, str(user["customer_id"]), item.product_id)
+    remove_from_cart(db, str(user["id"]), item.product_id)
+    await release_stock(redis, user["id"], [item.product_id])
     return {"message": "Item removed"}
 
 @router.post("/remove/html")
 async def remove_item_html(
     product_id: int = Form(...),
     user=Depends(get_current_user),
-    db=Depends(get_mongo_db)
+    db=Depends(get_mongo_db),
+    redis=Depends(get_redis)
 ):
     logger.debug(f"Removing item (html): product_id={product_id}, user={user}")
-    remove_from_cart(db, str(user["customer_id"]), product_id)
+    remove_from_cart(db, str(user["id"]), product_id)
+    await release_stock(redis, user["id"], [product_id])
     return RedirectResponse(url="/cart/html", status_code=303)
 
 @router.post("/clear", status_code=204)
-async def clear(user=Depends(get_current_user), db=Depends(get_mongo_db)):
+async def clear(user=Depends(get_current_user), db=Depends(get_mongo_db), redis=Depends(get_redis)):
     logger.debug(f"Clearing cart for user: {user}")
-    clear_cart(db, str(user["customer_id"]))
+    cart = get_cart(db, str(user["id"]))
+    clear_cart(db, str(user["id"]))
+    await release_stock(redis, user["id"], [item["product_id"] for item in cart["items"]])
     return {"message": "Cart cleared"}
\ No newline at end of file
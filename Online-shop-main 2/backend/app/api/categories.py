@@ -8,10 +8,17 @@ from typing import List, Optional
 import logging
 
 from backend.app.db.postgres import get_db
+from backend.app.db.replica import get_read_db, get_read_session_factory
 from backend.app.db.redis import get_redis
 from backend.app.models.postgres_models import Category
 from backend.app.schemas.category import CategoryCreate, CategoryUpdate, CategoryResponse
 from backend.app.dependencies.auth import get_current_admin
+from backend.app.services.sessions import resolve_session
+from backend.app.services.catalog_cache import get_cached_categories, CATEGORY
+from backend.app.services.invalidation import publish_invalidation
+from backend.app.services.autocomplete import index_category, remove_entry, CATEGORY_ENTRY
+from backend.app.services.serialization import fast_json
+from backend.app.services.streaming_templates import StreamingTemplates, stream_scalars
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
@@ -19,13 +26,13 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
+streaming_templates = StreamingTemplates(directory="templates")
 
 async def get_auth_context(request: Request, redis=Depends(get_redis)):
     is_authenticated = False
     session_id = request.cookies.get("session_id")
     if session_id:
-        session_data = await redis.get(f"session:{session_id}")
-        if session_data:
+        if await resolve_session(redis, session_id):
             is_authenticated = True
     return {"request": request, "is_authenticated": is_authenticated}
 
@@ -34,14 +41,15 @@ async def get_categories_html(
     request: Request,
     query: str = "",
     context: dict = Depends(get_auth_context),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    session_factory=Depends(get_read_session_factory)
 ):
-    stmt = select(Category)
     if query:
-        stmt = stmt.filter(Category.name.ilike(f"%{query}%"))
-    result = await db.execute(stmt)
-    categories = result.scalars().all()
-    return templates.TemplateResponse(
+        stmt = select(Category).filter(Category.name.ilike(f"%{query}%")).order_by(Category.id)
+        categories = stream_scalars(session_factory, stmt)
+    else:
+        categories = await get_cached_categories(db)
+    return streaming_templates.TemplateResponse(
         "categories.html",
         {**context, "categories": categories, "query": query}
     )
@@ -64,11 +72,10 @@ async def get_edit_category_form(
 
 @router.get("/", response_model=List[CategoryResponse])
 async def get_categories(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Category))
-    return result.scalars().all()
+    return fast_json(await get_cached_categories(db), CategoryResponse)
 
 @router.get("/{category_id}", response_model=CategoryResponse)
-async def get_category(category_id: int, db: AsyncSession = Depends(get_db)):
+async def get_category(category_id: int, db: AsyncSession = Depends(get_read_db)):
     category = await db.get(Category, category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -79,6 +86,7 @@ async def create_category(
     name: str = Form(...),
     description: Optional[str] = Form(""),
     db: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
     admin=Depends(get_current_admin)
 ):
     logger.info(f"Creating category: name={name}, description={description}")
@@ -88,6 +96,8 @@ async def create_category(
         db.add(category)
         await db.commit()
         await db.refresh(category)
+        await publish_invalidation(redis, CATEGORY, [category.id])
+        await index_category(db, redis, category.id, category.name)
         logger.info(f"Category created: id={category.id}, description={category.description}")
         return RedirectResponse(url="/categories/html", status_code=303)
     except Exception as e:
@@ -101,6 +111,7 @@ async def update_category_form(
     name: str = Form(...),
     description: Optional[str] = Form(""),
     db: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
     admin=Depends(get_current_admin)
 ):
     logger.info(f"Updating category: id={category_id}, name={name}, description={description}")
@@ -115,6 +126,8 @@ async def update_category_form(
     )
     await db.commit()
     await db.refresh(category)
+    await publish_invalidation(redis, CATEGORY, [category.id])
+    await index_category(db, redis, category.id, category.name)
     logger.info(f"Category updated: id={category_id}, description={category.description}")
     return RedirectResponse(url="/categories/html", status_code=303)
 
@@ -123,6 +136,7 @@ async def update_category(
     category_id: int,
     category_data: CategoryUpdate,
     db: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
     admin=Depends(get_current_admin)
 ):
     category = await db.get(Category, category_id)
@@ -136,12 +150,15 @@ async def update_category(
     )
     await db.commit()
     await db.refresh(category)
+    await publish_invalidation(redis, CATEGORY, [category.id])
+    await index_category(db, redis, category.id, category.name)
     return category
 
 @router.delete("/{category_id}", status_code=204)
 async def delete_category(
     category_id: int,
     db: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
     admin=Depends(get_current_admin)
 ):
     category = await db.get(Category, category_id)
@@ -149,4 +166,6 @@ async def delete_category(
         raise HTTPException(status_code=404, detail="Category not found")
     await db.execute(delete(Category).where(Category.id == category_id))
     await db.commit()
+    await publish_invalidation(redis, CATEGORY, [category_id])
+    await remove_entry(redis, CATEGORY_ENTRY, category_id)
     return None
\ No newline at end of file
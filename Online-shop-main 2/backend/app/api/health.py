@@ -0,0 +1,45 @@
+import asyncio
+import os
+from fastapi import APIRouter, Depends, Request, status
+from fastapi.responses import JSONResponse
+from pymongo.database import Database
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.app.db.postgres import get_db
+from backend.app.db.redis import get_redis
+from backend.app.db.mongo import get_mongo_db
+
+router = APIRouter()
+
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", 2))
+
+
+# Liveness: процесс жив и цикл событий отвечает. Бэкенды не проверяются — их сбой не лечится перезапуском
+@router.get("/live")
+async def liveness():
+    return {"status": "ok"}
+
+
+# Readiness: старт (подключения, миграции, прогрев) завершён и все бэкенды отвечают
+@router.get("/ready")
+async def readiness(request: Request, db: AsyncSession = Depends(get_db), redis=Depends(get_redis),
+                    mongo_db: Database = Depends(get_mongo_db)):
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse({"status": "starting"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    checks = {
+        "postgres": db.execute(text("SELECT 1")),
+        "redis": redis.ping(),
+        "mongo": asyncio.to_thread(mongo_db.command, "ping"),
+    }
+    results = await asyncio.gather(
+        *(asyncio.wait_for(check, HEALTH_CHECK_TIMEOUT) for check in checks.values()), return_exceptions=True
+    )
+    backends = {
+        name: "ok" if not isinstance(result, BaseException) else f"error: {type(result).__name__}"
+        for name, result in zip(checks, results)
+    }
+    ready = all(state == "ok" for state in backends.values())
+    return JSONResponse(
+        {"status": "ready" if ready else "degraded", "backends": backends},
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
@@ -1,21 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import update, delete
 from backend.app.db.postgres import get_db
-from backend.app.models.postgres_models import OrderItem
+from backend.app.db.replica import get_read_db, read_session_factory
+from backend.app.services.serialization import fast_json
+from backend.app.models.postgres_models import OrderItem, Order
 from backend.app.schemas.order_item import OrderItemIn, OrderItemOut, OrderItemUpdate
-from typing import List
+from backend.app.dependencies.auth import get_current_admin
+from backend.app.services.exports import export_response
+from datetime import datetime
+from typing import List, Optional
 
 router = APIRouter()
 
+EXPORT_COLUMNS = ["id", "order_id", "product_id", "quantity", "price", "order_date", "status"]
+
 @router.get("/", response_model=List[OrderItemOut])
-async def get_all_order_items(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(OrderItem))
-    return result.scalars().all()
+async def get_all_order_items(
+    limit: int = Query(50, ge=1, le=500),
+    after_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Keyset-пагинация вместо выгрузки всей таблицы
+    stmt = select(OrderItem).order_by(OrderItem.id).limit(limit)
+    if after_id is not None:
+        stmt = stmt.where(OrderItem.id > after_id)
+    result = await db.execute(stmt)
+    return fast_json(result.scalars().all(), OrderItemOut)
+
+@router.get("/export")
+async def export_order_items(
+    format: str = "ndjson",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    status: Optional[str] = None,
+    admin=Depends(get_current_admin)
+):
+    stmt = (
+        select(OrderItem.id, OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, OrderItem.price,
+               Order.order_date, Order.status)
+        .join(Order, Order.id == OrderItem.order_id)
+        .order_by(OrderItem.id)
+    )
+    if date_from:
+        stmt = stmt.where(Order.order_date >= date_from)
+    if date_to:
+        stmt = stmt.where(Order.order_date < date_to)
+    if status:
+        stmt = stmt.where(Order.status == status)
+    return export_response(stmt, EXPORT_COLUMNS, format, "order_items", read_session_factory())
 
 @router.get("/{item_id}", response_model=OrderItemOut)
-async def get_order_item(item_id: int, db: AsyncSession = Depends(get_db)):
+async def get_order_item(item_id: int, db: AsyncSession = Depends(get_read_db)):
     item = await db.get(OrderItem, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Order item not found")
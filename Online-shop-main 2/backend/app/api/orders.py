@@ -1,17 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+import asyncio
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
+from datetime import datetime
 from backend.app.db.postgres import get_db
+from backend.app.db.replica import get_read_db, get_read_session_factory, read_session_factory
 from backend.app.models.postgres_models import Order, OrderItem, Product
-from backend.app.schemas.order import OrderCreate, OrderOut
-from backend.app.dependencies.auth import get_current_user
+from backend.app.schemas.order import OrderCreate, OrderOut, OrderQueuePage, OrderStatusUpdate, OrderTransitionResult
+from backend.app.dependencies.auth import get_current_user, get_current_admin
+from backend.app.services.exports import export_response
+from backend.app.services.serialization import FAST_JSON, IMMUTABLE_ORDER_STATUSES, fast_json, json_bytes, order_bytes_cache
+from backend.app.services.analytics import record_sales_deltas, sales_delta_rows
+from backend.app.services.reservations import checkout_stock, restock, reconcile_stock
 from backend.app.db.mongo import get_mongo_db, get_cart, clear_cart
+from backend.app.jobs.queue import enqueue
+from backend.app.jobs.handlers import CLEAR_CART, ClearCartJob
+from backend.app.db.redis import get_redis
+from backend.app.services.catalog_cache import PRODUCT
+from backend.app.services.invalidation import publish_invalidation
+from backend.app.services.pricing import price_cart
+from backend.app.services.inventory import take_stock
+from backend.app.services.streaming_templates import StreamingTemplates, stream_scalars
+from backend.app.services.fulfillment import fetch_queue_page, transition_orders, QUEUE_PAGE_SIZE, MAX_QUEUE_PAGE_SIZE
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
+streaming_templates = StreamingTemplates(directory="templates")
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = ["id", "customer_id", "order_date", "total_amount", "status"]
 
 
 async def get_auth_context(request: Request):
@@ -24,15 +46,67 @@ async def get_auth_context(request: Request):
 
 @router.get("/html")
 async def get_orders_html(context: dict = Depends(get_auth_context), user=Depends(get_current_user),
-                          db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Order).where(Order.customer_id == user["id"]))
-    orders = result.scalars().all()
-    return templates.TemplateResponse("orders.html", {**context, "orders": orders})
+                          session_factory=Depends(get_read_session_factory)):
+    stmt = select(Order).where(Order.customer_id == user["id"]).order_by(Order.id)
+    orders = stream_scalars(session_factory, stmt)
+    return streaming_templates.TemplateResponse("orders.html", {**context, "orders": orders})
+
+
+@router.get("/export")
+async def export_orders(
+    format: str = "ndjson",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    status: Optional[str] = None,
+    admin=Depends(get_current_admin)
+):
+    stmt = select(Order.id, Order.customer_id, Order.order_date, Order.total_amount, Order.status).order_by(Order.id)
+    if date_from:
+        stmt = stmt.where(Order.order_date >= date_from)
+    if date_to:
+        stmt = stmt.where(Order.order_date < date_to)
+    if status:
+        stmt = stmt.where(Order.status == status)
+    return export_response(stmt, EXPORT_COLUMNS, format, "orders", read_session_factory())
+
+
+@router.get("/admin/queue", response_model=OrderQueuePage)
+async def get_order_queue(
+    status: str = "pending",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(QUEUE_PAGE_SIZE, ge=1, le=MAX_QUEUE_PAGE_SIZE),
+    admin=Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db)
+):
+    return await fetch_queue_page(db, status, date_from, date_to, cursor, limit)
+
+
+@router.post("/admin/status", response_model=OrderTransitionResult)
+async def update_order_statuses(data: OrderStatusUpdate, admin=Depends(get_current_admin),
+                                db: AsyncSession = Depends(get_db), redis=Depends(get_redis)):
+    try:
+        result, stocks = await transition_orders(db, data.order_ids, data.status)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    if stocks:
+        # Отмена вернула товар на склад: резервы Redis и карточки товаров должны это увидеть
+        await reconcile_stock(redis, stocks)
+        await publish_invalidation(redis, PRODUCT, list(stocks))
+    return result
 
 
 @router.get("/{order_id}")
 async def get_order_html(order_id: int, context: dict = Depends(get_auth_context), user=Depends(get_current_user),
-                         db: AsyncSession = Depends(get_db)):
+                         db: AsyncSession = Depends(get_read_db)):
+    # Тот же путь, что у JSON-эндпоинта ниже, который объявлен позже и сам не срабатывает: выбираем по Accept
+    accept = context["request"].headers.get("accept", "")
+    if "application/json" in accept and "text/html" not in accept:
+        order = await get_order(order_id, user, db)
+        return order if isinstance(order, Response) else OrderOut.model_validate(order, from_attributes=True)
     order = await db.get(Order, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -48,51 +122,95 @@ async def get_order_html(order_id: int, context: dict = Depends(get_auth_context
 
 
 @router.get("/", response_model=List[OrderOut])
-async def get_orders(user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Order).where(Order.customer_id == user["id"]))
-    return result.scalars().all()
+async def get_orders(user=Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    # Позиции грузим одним запросом: ленивая загрузка OrderOut.items в async-сессии невозможна
+    result = await db.execute(
+        select(Order).options(selectinload(Order.items)).where(Order.customer_id == user["id"])
+    )
+    return fast_json(result.scalars().all(), OrderOut)
 
 
 @router.get("/{order_id}", response_model=OrderOut)
-async def get_order(order_id: int, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    order = await db.get(Order, order_id)
+async def get_order(order_id: int, user=Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    cached = order_bytes_cache.get(order_id) if FAST_JSON else None
+    if cached is not None:
+        customer_id, body = cached
+        if customer_id != user["id"]:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        return Response(content=body, media_type="application/json")
+    order = await db.get(Order, order_id, options=[selectinload(Order.items)])
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     if order.customer_id != user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized")
-    return order
+    if not FAST_JSON:
+        return order
+    body = json_bytes(order, OrderOut)
+    if order.status in IMMUTABLE_ORDER_STATUSES:
+        order_bytes_cache.put(order_id, (order.customer_id, body))
+    return Response(content=body, media_type="application/json")
 
 
 @router.post("/", response_model=OrderOut, status_code=201)
 async def create_order(user=Depends(get_current_user), db: AsyncSession = Depends(get_db),
-                       db_mongo=Depends(get_mongo_db)):
-    cart = await get_cart(db_mongo, str(user["id"]))
+                       db_mongo=Depends(get_mongo_db), redis=Depends(get_redis)):
+    cart = get_cart(db_mongo, str(user["id"]))
     if not cart or not cart.get("items"):
         raise HTTPException(status_code=400, detail="Cart is empty")
 
-    order = Order(customer_id=user["id"], status="pending")
-    db.add(order)
-    await db.commit()
-    await db.refresh(order)
-
-    total_amount = 0
+    quantities = {}
     for item in cart["items"]:
-        product = await db.get(Product, item["product_id"])
-        if not product:
-            raise HTTPException(status_code=404, detail=f"Product {item['product_id']} not found")
-        if product.stock_quantity < item["quantity"]:
-            raise HTTPException(status_code=400, detail=f"Not enough stock for product {product.name}")
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=item["product_id"],
-            quantity=item["quantity"],
-            price=product.price
-        )
-        db.add(order_item)
-        product.stock_quantity -= item["quantity"]
-        total_amount += product.price * item["quantity"]
-
-    order.total_amount = total_amount
-    await db.commit()
-    await clear_cart(db_mongo, str(user["id"]))
-    return RedirectResponse(url="/orders/html", status_code=303)
\ No newline at end of file
+        quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+    result = await db.execute(select(Product).where(Product.id.in_(quantities)))
+    products = {product.id: product for product in result.scalars().all()}
+    for product_id in quantities:
+        if product_id not in products:
+            raise HTTPException(status_code=404, detail=f"Product {product_id} not found")
+    # Порядок по id: одинаковый порядок блокировок строк products у параллельных заказов
+    lines = [(products[product_id], quantities[product_id]) for product_id in sorted(quantities)]
+    # Цены заказа — из движка цен: те же акции и округление, что в корзине
+    priced = await price_cart(db_mongo, lines)
+
+    # Резервы корзины списываются в Redis атомарно; Postgres получает только тех, кому хватило остатка
+    reserved = await checkout_stock(redis, user["id"], lines)
+    stocks = {}
+    try:
+        order = Order(customer_id=user["id"], order_date=datetime.utcnow(), total_amount=0, status="pending")
+        db.add(order)
+        await db.flush()
+
+        sales_lines = []
+        for (product, quantity), line in zip(lines, priced.lines):
+            # Условное списание: с products или, при STOCK_SHARDS, со свободного шарда остатка
+            remaining = await take_stock(db, product.id, quantity)
+            if remaining is None:
+                raise HTTPException(status_code=400, detail=f"Not enough stock for product {product.name}")
+            stocks[product.id] = remaining
+            db.add(OrderItem(order_id=order.id, product_id=product.id, quantity=quantity, price=line.price))
+            sales_lines.append({
+                "product_id": product.id,
+                "category_id": product.category_id,
+                "quantity": quantity,
+                "revenue": line.total
+            })
+
+        order.total_amount = priced.total
+        # В транзакции заказа только дописываются строки sales_deltas; агрегаты из них собирает SalesAggregator
+        await record_sales_deltas(db, sales_delta_rows(order.id, order.order_date, sales_lines))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        if reserved:
+            await restock(redis, [(product.id, quantity) for product, quantity in lines])
+        raise
+    await reconcile_stock(redis, stocks)
+    # Остаток в карточках товаров на всех воркерах
+    await publish_invalidation(redis, PRODUCT, list(stocks))
+    # Корзина очищается до ответа: иначе повторная отправка формы оформит тот же заказ ещё раз
+    try:
+        await asyncio.to_thread(clear_cart, db_mongo, str(user["id"]))
+    except Exception as e:
+        # Заказ уже зафиксирован — не роняем ответ, очистку повторит воркер
+        logger.error(f"Failed to clear cart of customer {user['id']} after order {order.id}: {str(e)}")
+        await enqueue(redis, CLEAR_CART, ClearCartJob(customer_id=str(user["id"])))
+    return RedirectResponse(url="/orders/html", status_code=303)
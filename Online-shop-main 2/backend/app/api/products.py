@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Form, UploadFile, File, status, Cookie
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, UploadFile, File, status, Cookie, Query
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import RedirectResponse
 from redis import Redis
@@ -8,58 +8,77 @@ from sqlalchemy import update, delete
 from typing import List
 from backend.app.models.postgres_models import Product, Category, Review
 from backend.app.db.postgres import get_db
-from backend.app.db.mongo import get_mongo_collection
+from backend.app.db.replica import get_read_db, get_read_session_factory
+from backend.app.db.mongo import get_mongo_collection, get_mongo_db
 from backend.app.dependencies.auth import get_current_admin
-from backend.app.db.redis import get_redis, get_cached_product, cache_product, add_popular_product, get_popular_products
-import json
+from backend.app.db.redis import get_redis, get_cached_product, cache_product, get_popular_products
+from backend.app.schemas.review import ReviewPage
+from backend.app.schemas.product import ProductBulkUpdate, ProductBulkReport
+from backend.app.services.reviews import get_review_page, FIRST_PAGE_SIZE
+from backend.app.services.profile_views import record_view
+from backend.app.services.recommendations import get_recommendations
+from backend.app.services.reservations import reconcile_stock
+from backend.app.services.sessions import resolve_session
+from backend.app.services.catalog_cache import get_cached_categories, get_product_card, PRODUCT
+from backend.app.services.invalidation import publish_invalidation
+from backend.app.services.pricing import price_products
+from backend.app.services.streaming_templates import StreamingTemplates, stream_partitions
+from backend.app.services.product_updates import apply_product_changes, UPDATED
+from backend.app.services.inventory import set_stock
+from backend.app.services.autocomplete import (
+    suggest, index_product, remove_entry, PRODUCT_ENTRY, SUGGEST_LIMIT, MAX_SUGGEST_LIMIT
+)
+from backend.app.jobs.queue import enqueue, JobContext
+from backend.app.jobs.handlers import (
+    SAVE_PRODUCT_DETAILS, DELETE_PRODUCT_DETAILS, PRODUCT_VIEWED, ProductDetailsJob, ProductJob
+)
 import os
 import logging
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
+streaming_templates = StreamingTemplates(directory="templates")
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 async def get_auth_context(request: Request, session_id: str = Cookie(default=None), redis: Redis = Depends(get_redis)):
     is_authenticated = False
     is_admin = False
+    customer_id = None
     logger.debug(f"Checking auth context with session_id: {session_id}")
     if session_id:
-        session_data = await redis.get(f"session:{session_id}")
-        if session_data:
-            try:
-                session = json.loads(session_data)
-                is_authenticated = True
-                is_admin = "admin_id" in session
-                logger.debug(f"Auth context: session_id={session_id}, is_authenticated={is_authenticated}, is_admin={is_admin}, session_data={session}")
-            except json.JSONDecodeError:
-                logger.error("Failed to decode session data")
+        session = await resolve_session(redis, session_id)
+        if session:
+            is_authenticated = True
+            is_admin = "admin_id" in session
+            customer_id = session.get("customer_id")
+            logger.debug(f"Auth context: session_id={session_id}, is_authenticated={is_authenticated}, is_admin={is_admin}, session_data={session}")
     else:
         logger.debug("No session_id provided in auth context")
-    return {"request": request, "is_authenticated": is_authenticated, "user": {"is_admin": is_admin}}
+    return {"request": request, "is_authenticated": is_authenticated, "user": {"is_admin": is_admin}, "customer_id": customer_id}
+
+async def _priced_products(session_factory, stmt, mongo_db):
+    # Цены считаются пачками по мере чтения, а не для всего каталога заранее
+    async for batch in stream_partitions(session_factory, stmt):
+        prices = await price_products(mongo_db, batch)
+        for product in batch:
+            yield product, prices[product.id]
 
 @router.get("/html")
-async def get_products_html(context: dict = Depends(get_auth_context), db: AsyncSession = Depends(get_db)):
+async def get_products_html(context: dict = Depends(get_auth_context), mongo_db=Depends(get_mongo_db),
+                            session_factory=Depends(get_read_session_factory)):
     query = context["request"].query_params.get("query", "")
-    stmt = select(Product)
+    stmt = select(Product).order_by(Product.id)
     if query:
         stmt = stmt.where(Product.name.ilike(f"%{query}%"))
-    try:
-        result = await db.execute(stmt)
-        products = result.scalars().all()
-        await db.commit()
-        logger.debug(f"Fetched {len(products)} products")
-    except Exception as e:
-        logger.error(f"Database error in get_products_html: {str(e)}")
-        await db.rollback()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to fetch products: {str(e)}")
-    return templates.TemplateResponse("products.html", {**context, "products": products, "query": query})
+    # Шапка уходит сразу, карточки — по мере чтения из базы
+    products = _priced_products(session_factory, stmt, mongo_db)
+    return streaming_templates.TemplateResponse("products.html", {**context, "products": products, "query": query})
 
 @router.get("/new")
 async def create_product_form(context: dict = Depends(get_auth_context), db: AsyncSession = Depends(get_db), admin=Depends(get_current_admin)):
     try:
-        result = await db.execute(select(Category))
-        categories = result.scalars().all()
+        categories = await get_cached_categories(db)
         await db.commit()
         logger.debug(f"Fetched {len(categories)} categories for product form")
     except Exception as e:
@@ -78,6 +97,7 @@ async def create_product_html(
     image: UploadFile = File(default=None),
     db: AsyncSession = Depends(get_db),
     mongo=Depends(get_mongo_collection),
+    redis=Depends(get_redis),
     admin=Depends(get_current_admin)
 ):
     try:
@@ -100,12 +120,11 @@ async def create_product_html(
         db.add(product)
         await db.commit()
         await db.refresh(product)
-        async with get_mongo_collection() as mongo:
-            mongo["products"].insert_one({
-                "product_id": product.id,
-                "description": description or "",
-                "attributes": {}
-            })
+        await publish_invalidation(redis, PRODUCT, [product.id])
+        await index_product(redis, product.id, name)
+        # Описание в Mongo пишет воркер; без очереди — сразу здесь
+        await enqueue(redis, SAVE_PRODUCT_DETAILS, ProductDetailsJob(product_id=product.id, description=description or ""),
+                      fallback=JobContext(redis, mongo.database))
         logger.debug(f"Created product: {product.id}, name: {name}")
     except Exception as e:
         logger.error(f"Database error in create_product_html: {str(e)}")
@@ -113,23 +132,53 @@ async def create_product_html(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to create product: {str(e)}")
     return RedirectResponse(url=f"/products/{product.id}", status_code=status.HTTP_303_SEE_OTHER)
 
+@router.get("/suggest")
+async def suggest_products(q: str = Query("", max_length=100), limit: int = Query(SUGGEST_LIMIT, ge=1, le=MAX_SUGGEST_LIMIT),
+                           redis=Depends(get_redis)):
+    # Подсказки для поля поиска: один запрос в Redis, Postgres не участвует
+    return await suggest(redis, q, limit)
+
 @router.get("/{product_id}")
-async def get_product_html(product_id: int, context: dict = Depends(get_auth_context), db: AsyncSession = Depends(get_db), redis=Depends(get_redis)):
+async def get_product_html(product_id: int, context: dict = Depends(get_auth_context), db: AsyncSession = Depends(get_db), redis=Depends(get_redis),
+                           mongo_db=Depends(get_mongo_db)):
     try:
-        product = await db.get(Product, product_id)
+        # Карточка из памяти воркера; правки товара сбрасывают её на всех воркерах через шину инвалидации
+        product = await get_product_card(db, product_id)
         if not product:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-        result = await db.execute(select(Review).where(Review.product_id == product_id))
-        reviews = result.scalars().all()
-        avg_rating = sum(r.rating for r in reviews) / len(reviews) if reviews else 0
-        await add_popular_product(product_id, redis)
+        # Только первая страница отзывов (из кеша), остальные — через /products/{id}/reviews
+        review_page = await get_review_page(db, redis, product_id)
+        reviews = review_page["items"]
+        avg_rating = review_page["average_rating"]
+        recommendations = await get_recommendations(redis, product_id)
+        price = (await price_products(mongo_db, [product]))[product_id]
+        # Счётчик популярности — без fallback: при недоступной очереди просмотр просто не учитывается
+        await enqueue(redis, PRODUCT_VIEWED, ProductJob(product_id=product_id))
+        record_view(context["customer_id"], product_id)
         await db.commit()
-        logger.debug(f"Fetched product: {product_id}, reviews: {len(reviews)}")
+        logger.debug(f"Fetched product: {product_id}, reviews: {len(reviews)} of {review_page['review_count']}")
     except Exception as e:
         logger.error(f"Database error in get_product_html: {str(e)}")
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to fetch product: {str(e)}")
-    return templates.TemplateResponse("product_detail.html", {**context, "product": product, "reviews": reviews, "avg_rating": avg_rating})
+    return templates.TemplateResponse("product_detail.html", {**context, "product": product, "price": price, "reviews": reviews, "avg_rating": avg_rating, "review_count": review_page["review_count"], "next_cursor": review_page["next_cursor"], "recommendations": recommendations})
+
+@router.get("/{product_id}/reviews", response_model=ReviewPage)
+async def get_product_reviews(
+    product_id: int,
+    sort: str = "newest",
+    cursor: str | None = None,
+    limit: int = Query(FIRST_PAGE_SIZE, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
+    redis=Depends(get_redis)
+):
+    # Первая страница попадает в общий кеш — её читаем с основной базы, чтобы не закешировать отставшую реплику
+    return await get_review_page(read_db if cursor else db, redis, product_id, sort, cursor, limit)
+
+@router.get("/{product_id}/recommendations")
+async def get_product_recommendations(product_id: int, redis=Depends(get_redis)):
+    return await get_recommendations(redis, product_id)
 
 @router.get("/edit/{product_id}")
 async def edit_product_form(product_id: int, context: dict = Depends(get_auth_context), db: AsyncSession = Depends(get_db), admin=Depends(get_current_admin)):
@@ -137,8 +186,7 @@ async def edit_product_form(product_id: int, context: dict = Depends(get_auth_co
         product = await db.get(Product, product_id)
         if not product:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-        result = await db.execute(select(Category))
-        categories = result.scalars().all()
+        categories = await get_cached_categories(db)
         await db.commit()
         logger.debug(f"Fetched product for edit: {product_id}, categories: {len(categories)}")
     except Exception as e:
@@ -158,6 +206,7 @@ async def edit_product(
     image: UploadFile = File(default=None),
     db: AsyncSession = Depends(get_db),
     mongo=Depends(get_mongo_collection),
+    redis=Depends(get_redis),
     admin=Depends(get_current_admin)
 ):
     try:
@@ -168,7 +217,8 @@ async def edit_product(
             "name": name,
             "price": price,
             "category_id": category_id,
-            "stock_quantity": stock_quantity
+            "stock_quantity": stock_quantity,
+            "version": Product.version + 1
         }
         if image:
             image_path = f"static/images/{image.filename}"
@@ -177,13 +227,14 @@ async def edit_product(
                 f.write(await image.read())
             update_data["image"] = image_path
         await db.execute(update(Product).where(Product.id == product_id).values(**update_data))
+        await set_stock(db, {product_id: stock_quantity})
         await db.commit()
-        async with get_mongo_collection() as mongo:
-            mongo["products"].update_one(
-                {"product_id": product_id},
-                {"$set": {"description": description or "", "attributes": {}}},
-                upsert=True
-            )
+        await publish_invalidation(redis, PRODUCT, [product_id])
+        await index_product(redis, product_id, name)
+        # Новый остаток от админа сразу виден резервам корзин
+        await reconcile_stock(redis, {product_id: stock_quantity})
+        await enqueue(redis, SAVE_PRODUCT_DETAILS, ProductDetailsJob(product_id=product_id, description=description or ""),
+                      fallback=JobContext(redis, mongo.database))
         logger.debug(f"Edited product: {product_id}, name: {name}")
     except Exception as e:
         logger.error(f"Database error in edit_product: {str(e)}")
@@ -191,16 +242,36 @@ async def edit_product(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to edit product: {str(e)}")
     return RedirectResponse(url=f"/products/{product_id}", status_code=status.HTTP_303_SEE_OTHER)
 
+@router.post("/bulk", response_model=ProductBulkReport)
+async def bulk_update_products(data: ProductBulkUpdate, db: AsyncSession = Depends(get_db), redis=Depends(get_redis),
+                               admin=Depends(get_current_admin)):
+    # Переоценка и пополнение склада пачкой: один UPDATE ... FROM (VALUES ...) на порцию вместо запроса на товар
+    try:
+        results, stocks = await apply_product_changes(db, data.changes)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    updated = [result["id"] for result in results if result["status"] == UPDATED]
+    if updated:
+        # Одно сообщение шины на всю пачку
+        await publish_invalidation(redis, PRODUCT, updated)
+    if stocks:
+        await reconcile_stock(redis, stocks)
+    return {"updated": len(updated), "results": results}
+
 @router.post("/delete/{product_id}")
-async def delete_product_html(product_id: int, db: AsyncSession = Depends(get_db), mongo=Depends(get_mongo_collection), admin=Depends(get_current_admin)):
+async def delete_product_html(product_id: int, db: AsyncSession = Depends(get_db), mongo=Depends(get_mongo_collection), redis=Depends(get_redis), admin=Depends(get_current_admin)):
     try:
         product = await db.get(Product, product_id)
         if not product:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
         await db.execute(delete(Product).where(Product.id == product_id))
         await db.commit()
-        async with get_mongo_collection() as mongo:
-            mongo["products"].delete_one({"product_id": product_id})
+        await publish_invalidation(redis, PRODUCT, [product_id])
+        await remove_entry(redis, PRODUCT_ENTRY, product_id)
+        await enqueue(redis, DELETE_PRODUCT_DETAILS, ProductJob(product_id=product_id),
+                      fallback=JobContext(redis, mongo.database))
         logger.debug(f"Deleted product: {product_id}")
     except Exception as e:
         logger.error(f"Database error in delete_product_html: {str(e)}")
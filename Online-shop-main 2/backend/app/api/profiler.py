@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.templating import Jinja2Templates
+from backend.app.dependencies.auth import get_current_admin
+from backend.app.middleware.profiler import get_history, get_profile, N_PLUS_ONE_THRESHOLD
+
+router = APIRouter()
+templates = Jinja2Templates(directory="templates")
+
+
+@router.get("/html")
+async def get_profiler_html(request: Request, only_n_plus_one: bool = False, admin=Depends(get_current_admin)):
+    profiles = get_history()
+    if only_n_plus_one:
+        profiles = [p for p in profiles if p["n_plus_one"]]
+    return templates.TemplateResponse("profiler.html", {
+        "request": request,
+        "is_authenticated": True,
+        "profiles": profiles,
+        "only_n_plus_one": only_n_plus_one,
+        "threshold": N_PLUS_ONE_THRESHOLD
+    })
+
+
+@router.get("/")
+async def get_profiler_report(only_n_plus_one: bool = False, admin=Depends(get_current_admin)):
+    profiles = get_history()
+    if only_n_plus_one:
+        profiles = [p for p in profiles if p["n_plus_one"]]
+    return [{key: value for key, value in p.items() if key != "queries"} for p in profiles]
+
+
+@router.get("/{profile_id}")
+async def get_profiler_entry(profile_id: str, admin=Depends(get_current_admin)):
+    profile = get_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
@@ -1,19 +1,26 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
 from backend.app.schemas.promotion import PromotionCreate, PromotionOut
-from backend.app.db.mongo import db, get_all_promotions, get_promotion, create_promotion, delete_promotion, get_mongo_db
+from backend.app.db.mongo import get_promotion, create_promotion, delete_promotion, get_mongo_db
+from backend.app.models.postgres_models import Product
+from backend.app.services.catalog_cache import get_cached_promotions, PROMOTION
+from backend.app.services.invalidation import publish_invalidation
+from backend.app.db.redis import get_redis
 from typing import List
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 from pymongo.database import Database
 from backend.app.db.postgres import get_db
 
 router = APIRouter()
 
-def read_promotions(db: Database = Depends(get_mongo_db)):
-    return get_all_promotions(db)
+@router.get("/", response_model=List[PromotionOut])
+async def read_promotions(db: Database = Depends(get_mongo_db)):
+    return await get_cached_promotions(db)
 
 
 @router.get("/{promo_id}", response_model=PromotionOut)
-def read_promotion(promo_id: str):
+def read_promotion(promo_id: str, db: Database = Depends(get_mongo_db)):
     promo = get_promotion(db, promo_id)
     if not promo:
         raise HTTPException(status_code=404, detail="Promotion not found")
@@ -23,7 +30,9 @@ def read_promotion(promo_id: str):
 @router.post("/", response_model=PromotionOut, status_code=201)
 async def create_new_promotion(
     data: PromotionCreate,
-    db_pg: AsyncSession = Depends(get_db)
+    db_pg: AsyncSession = Depends(get_db),
+    db: Database = Depends(get_mongo_db),
+    redis=Depends(get_redis)
 ):
     if data.products:
         result = await db_pg.execute(select(Product.id).where(Product.id.in_(data.products)))
@@ -31,10 +40,13 @@ async def create_new_promotion(
         missing = set(data.products) - existing_ids
         if missing:
             raise HTTPException(status_code=400, detail=f"Products not found: {list(missing)}")
-    
-    return create_promotion(db, data.dict())
+
+    promo = await asyncio.to_thread(create_promotion, db, data.dict())
+    await publish_invalidation(redis, PROMOTION, data.products)
+    return promo
 
 
 @router.delete("/{promo_id}", status_code=204)
-def delete_existing_promotion(promo_id: str):
-    delete_promotion(db, promo_id)
+async def delete_existing_promotion(promo_id: str, db: Database = Depends(get_mongo_db), redis=Depends(get_redis)):
+    await asyncio.to_thread(delete_promotion, db, promo_id)
+    await publish_invalidation(redis, PROMOTION)
@@ -1,17 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from fastapi.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Form
 from sqlalchemy.future import select
 from sqlalchemy import update, delete
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 from backend.app.db.postgres import get_db
+from backend.app.db.replica import get_read_db, read_session_factory
+from backend.app.services.serialization import fast_json
 from backend.app.models.postgres_models import Review, Product
 from backend.app.schemas.review import ReviewIn, ReviewUpdate, ReviewOut
-from backend.app.dependencies.auth import get_current_user
+from backend.app.dependencies.auth import get_current_user, get_current_admin
+from backend.app.services.exports import export_response
+from backend.app.services.reviews import invalidate_review_pages
+from backend.app.db.redis import get_redis
 
 router = APIRouter()
 
+EXPORT_COLUMNS = ["id", "product_id", "customer_id", "rating", "comment", "created_at"]
+
 @router.post("/", response_model=ReviewOut, status_code=201)
 async def create_review(
     request: Request,
@@ -19,6 +27,7 @@ async def create_review(
     rating: int = Form(...),
     comment: str = Form(...),
     db: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
     user=Depends(get_current_user)
 ):
     product = await db.get(Product, product_id)
@@ -29,15 +38,43 @@ async def create_review(
     db.add(review)
     await db.commit()
     await db.refresh(review)
+    await invalidate_review_pages(redis, product_id)
     return RedirectResponse(url=f"/products/{product_id}", status_code=303)
 
 @router.get("/", response_model=List[ReviewOut])
-async def get_reviews(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Review))
-    return result.scalars().all()
+async def get_reviews(
+    limit: int = Query(50, ge=1, le=500),
+    after_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Keyset-пагинация вместо выгрузки всей таблицы
+    stmt = select(Review).order_by(Review.id).limit(limit)
+    if after_id is not None:
+        stmt = stmt.where(Review.id > after_id)
+    result = await db.execute(stmt)
+    return fast_json(result.scalars().all(), ReviewOut)
+
+@router.get("/export")
+async def export_reviews(
+    format: str = "ndjson",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    product_id: Optional[int] = None,
+    admin=Depends(get_current_admin)
+):
+    stmt = select(
+        Review.id, Review.product_id, Review.customer_id, Review.rating, Review.comment, Review.created_at
+    ).order_by(Review.id)
+    if date_from:
+        stmt = stmt.where(Review.created_at >= date_from)
+    if date_to:
+        stmt = stmt.where(Review.created_at < date_to)
+    if product_id is not None:
+        stmt = stmt.where(Review.product_id == product_id)
+    return export_response(stmt, EXPORT_COLUMNS, format, "reviews", read_session_factory())
 
 @router.get("/{review_id}", response_model=ReviewOut)
-async def get_review(review_id: int, db: AsyncSession = Depends(get_db)):
+async def get_review(review_id: int, db: AsyncSession = Depends(get_read_db)):
     review = await db.get(Review, review_id)
     if not review:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -48,6 +85,7 @@ async def update_review(
     review_id: int,
     review_data: ReviewUpdate,
     db: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
     user=Depends(get_current_user)
 ):
     review = await db.get(Review, review_id)
@@ -60,12 +98,14 @@ async def update_review(
         update(Review).where(Review.id == review_id).values(**update_data)
     )
     await db.commit()
+    await invalidate_review_pages(redis, review.product_id)
     return await db.get(Review, review_id)
 
 @router.delete("/{review_id}", status_code=204)
 async def delete_review(
     review_id: int,
     db: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
     user=Depends(get_current_user)
 ):
     review = await db.get(Review, review_id)
@@ -75,4 +115,5 @@ async def delete_review(
         raise HTTPException(status_code=403, detail="Not authorized")
     await db.execute(delete(Review).where(Review.id == review_id))
     await db.commit()
+    await invalidate_review_pages(redis, review.product_id)
     return None
\ No newline at end of file
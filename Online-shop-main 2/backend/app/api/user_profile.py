@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query, status
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import RedirectResponse
 from pymongo.database import Database
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 from typing import Optional
 import logging
 
-from backend.app.db.mongo import get_mongo_db, get_user_profile, update_user_profile
-from backend.app.schemas.user_profile import UserProfileOut, UserProfileUpdate
+from backend.app.db.mongo import get_mongo_db, get_user_profile, update_user_profile, push_to_list, remove_from_list, get_list_page
+from backend.app.db.postgres import get_db
+from backend.app.models.postgres_models import Product
+from backend.app.schemas.user_profile import UserProfileOut, UserProfileUpdate, WishlistPage, WishlistProductsPage
 from backend.app.dependencies.auth import get_current_user
+from backend.app.services.profile_views import record_view, WISHLIST_LIMIT
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
@@ -63,4 +68,45 @@ async def update_user_profile(
     profile = update_user_profile(db, str(user["id"]), update_data)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
-    return profile
\ No newline at end of file
+    return profile
+
+@router.get("/wishlist", response_model=WishlistPage)
+async def read_wishlist(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    user=Depends(get_current_user),
+    db: Database = Depends(get_mongo_db)
+):
+    items, has_more = get_list_page(db, str(user["id"]), "wishlist", offset, limit)
+    return {"items": items, "offset": offset, "limit": limit, "has_more": has_more}
+
+@router.get("/wishlist/products", response_model=WishlistProductsPage)
+async def read_wishlist_products(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    user=Depends(get_current_user),
+    db: Database = Depends(get_mongo_db),
+    pg: AsyncSession = Depends(get_db)
+):
+    product_ids, has_more = get_list_page(db, str(user["id"]), "wishlist", offset, limit)
+    products = {}
+    if product_ids:
+        result = await pg.execute(select(Product).where(Product.id.in_(product_ids)))
+        products = {product.id: product for product in result.scalars().all()}
+    # Порядок как в wishlist; удалённые из каталога товары пропускаются
+    items = [products[product_id] for product_id in product_ids if product_id in products]
+    return {"items": items, "offset": offset, "limit": limit, "has_more": has_more}
+
+@router.post("/wishlist/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def add_to_wishlist(product_id: int, user=Depends(get_current_user), db: Database = Depends(get_mongo_db)):
+    if not push_to_list(db, str(user["id"]), "wishlist", product_id, WISHLIST_LIMIT):
+        raise HTTPException(status_code=409, detail=f"Wishlist is full (max {WISHLIST_LIMIT} items)")
+
+@router.delete("/wishlist/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def remove_from_wishlist(product_id: int, user=Depends(get_current_user), db: Database = Depends(get_mongo_db)):
+    remove_from_list(db, str(user["id"]), "wishlist", product_id)
+
+@router.post("/recent/{product_id}", status_code=status.HTTP_202_ACCEPTED)
+async def add_recent_view(product_id: int, user=Depends(get_current_user)):
+    # Запись уходит в буфер и попадает в Mongo пачкой при следующем сбросе
+    record_view(user["id"], product_id)
@@ -0,0 +1,96 @@
+import time
+import logging
+from typing import Callable
+import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+from pymongo import monitoring
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# Слушатель получает (backend, operation, statement, duration_seconds)
+BackendListener = Callable[[str, str, str, float], None]
+_listeners: list[BackendListener] = []
+
+
+def add_backend_listener(listener: BackendListener):
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def remove_backend_listener(listener: BackendListener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def notify(backend: str, operation: str, statement: str, duration: float):
+    for listener in _listeners:
+        try:
+            listener(backend, operation, statement, duration)
+        except Exception as e:
+            logger.error(f"Backend listener failed: {str(e)}")
+
+
+def instrument_engine(engine: AsyncEngine):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_start_time"].pop()
+        operation = statement.lstrip().split(" ", 1)[0].upper()
+        notify("postgres", operation, statement, duration)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        commands = " ".join(str(args[0]) for args, _ in self.command_stack)
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            notify("redis", "PIPELINE", commands, time.perf_counter() - start)
+
+
+class InstrumentedRedis(redis.Redis):
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            command = str(args[0]).upper()
+            key = str(args[1]) if len(args) > 1 else ""
+            notify("redis", command, f"{command} {key}".strip(), time.perf_counter() - start)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self):
+        # Имя коллекции есть только в started, длительность — только в succeeded/failed
+        self._collections: dict[int, str] = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else event.database_name
+
+    def succeeded(self, event):
+        self._notify(event)
+
+    def failed(self, event):
+        self._notify(event)
+
+    def _notify(self, event):
+        collection = self._collections.pop(event.request_id, event.database_name)
+        notify("mongo", event.command_name, f"{event.command_name} {collection}", event.duration_micros / 1_000_000)
@@ -0,0 +1,273 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.future import select
+from pymongo import ASCENDING
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError
+
+from backend.app.db.postgres import engine
+from backend.app.db.mongo import get_mongo_db, COLLECTION, CARTS_COLLECTION, PROMO_COLLECTION
+from backend.app.models.postgres_models import Order, OrderItem, Review, Product
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_TABLE = "schema_migrations"
+MIGRATIONS_COLLECTION = "schema_migrations"
+# Миграции запускает каждый стартующий воркер и реплика; применяет их только тот, кто взял блокировку,
+# остальные ждут и видят уже записанные версии
+MIGRATIONS_LOCK_ID = 72610026
+MIGRATIONS_LOCK_COLLECTION = "schema_migrations_lock"
+# Блокировка в Mongo снимается сама, если процесс умер посреди миграций
+MONGO_LOCK_TTL = int(os.getenv("MIGRATIONS_MONGO_LOCK_TTL", 600))
+
+_INDEX_NAME = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    # SQL выполняется вне транзакции, чтобы работал CREATE INDEX CONCURRENTLY
+    postgres: list[str] = field(default_factory=list)
+    # (коллекция, ключи индекса, опции create_index)
+    mongo: list[tuple[str, list[tuple[str, int]], dict]] = field(default_factory=list)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        version=1,
+        name="foreign_key_indexes",
+        postgres=[
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_orders_customer_id ON orders (customer_id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_order_items_product_id ON order_items (product_id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_reviews_product_id ON reviews (product_id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_category_id ON products (category_id)",
+        ],
+        mongo=[
+            (CARTS_COLLECTION, [("customer_id", ASCENDING)], {"name": "ix_carts_customer_id"}),
+            (COLLECTION, [("customer_id", ASCENDING)], {"name": "ix_user_profiles_customer_id"}),
+            (PROMO_COLLECTION, [("products", ASCENDING)], {"name": "ix_promotions_products"}),
+        ],
+    ),
+    Migration(
+        version=2,
+        name="review_page_indexes",
+        postgres=[
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_reviews_product_created "
+            "ON reviews (product_id, created_at DESC, id DESC)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_reviews_product_rating ON reviews (product_id, rating, id)",
+        ],
+    ),
+    Migration(
+        version=3,
+        name="order_queue_index",
+        postgres=[
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_orders_status_date ON orders (status, order_date, id)",
+        ],
+    ),
+    Migration(
+        version=4,
+        name="product_versions",
+        postgres=[
+            "ALTER TABLE products ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+        ],
+    ),
+    Migration(
+        version=5,
+        name="product_stock_shards",
+        postgres=[
+            "CREATE TABLE IF NOT EXISTS product_stock_shards ("
+            "product_id INTEGER NOT NULL REFERENCES products (id) ON DELETE CASCADE, "
+            "shard INTEGER NOT NULL, "
+            "quantity INTEGER NOT NULL DEFAULT 0 CONSTRAINT ck_product_stock_shards_quantity CHECK (quantity >= 0), "
+            "PRIMARY KEY (product_id, shard))",
+        ],
+    ),
+]
+
+
+async def _applied_postgres_versions(conn) -> set[int]:
+    await conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+        "version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+    result = await conn.execute(text(f"SELECT version FROM {MIGRATIONS_TABLE}"))
+    return {row[0] for row in result.all()}
+
+
+async def _drop_invalid_indexes(conn, statements: list[str]):
+    # Прерванный CREATE INDEX CONCURRENTLY оставляет индекс INVALID, и IF NOT EXISTS молча его пропустит:
+    # такой индекс удаляется и строится заново
+    names = [match.group(1) for match in map(_INDEX_NAME.search, statements) if match]
+    if not names:
+        return
+    result = await conn.execute(
+        text("SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+             "WHERE NOT i.indisvalid AND c.relname = ANY(:names)"),
+        {"names": names}
+    )
+    for name in result.scalars().all():
+        logger.warning(f"Dropping invalid index {name} left by an interrupted migration")
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+async def apply_postgres_migrations():
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        # Сессионная advisory-блокировка: держится на этом соединении до unlock или до его закрытия
+        await conn.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": MIGRATIONS_LOCK_ID})
+        try:
+            # Версии читаются уже под блокировкой: пока ждали, их мог применить другой воркер
+            applied = await _applied_postgres_versions(conn)
+            for migration in MIGRATIONS:
+                if migration.version in applied:
+                    continue
+                logger.info(f"Applying postgres migration {migration.version}: {migration.name}")
+                await _drop_invalid_indexes(conn, migration.postgres)
+                for statement in migration.postgres:
+                    await conn.execute(text(statement))
+                await conn.execute(
+                    text(f"INSERT INTO {MIGRATIONS_TABLE} (version, name, applied_at) "
+                         "VALUES (:version, :name, :applied_at) ON CONFLICT (version) DO NOTHING"),
+                    {"version": migration.version, "name": migration.name, "applied_at": datetime.utcnow()}
+                )
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": MIGRATIONS_LOCK_ID})
+
+
+def _acquire_mongo_lock(db: Database, owner: str):
+    # Документ-блокировка с _id: upsert по условию «истекла» либо захватывает её, либо падает на дубликате _id
+    while True:
+        now = datetime.utcnow()
+        try:
+            db[MIGRATIONS_LOCK_COLLECTION].find_one_and_update(
+                {"_id": "lock", "expires_at": {"$lt": now}},
+                {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=MONGO_LOCK_TTL)}},
+                upsert=True
+            )
+            return
+        except DuplicateKeyError:
+            time.sleep(0.5)
+
+
+def apply_mongo_migrations(db: Database):
+    owner = f"{os.uname().nodename}-{os.getpid()}"
+    _acquire_mongo_lock(db, owner)
+    try:
+        applied = {doc["version"] for doc in db[MIGRATIONS_COLLECTION].find({}, {"version": 1})}
+        for migration in MIGRATIONS:
+            if migration.version in applied:
+                continue
+            logger.info(f"Applying mongo migration {migration.version}: {migration.name}")
+            for collection, keys, options in migration.mongo:
+                db[collection].create_index(keys, **options)
+            db[MIGRATIONS_COLLECTION].update_one(
+                {"version": migration.version},
+                {"$setOnInsert": {"name": migration.name, "applied_at": datetime.utcnow()}},
+                upsert=True
+            )
+    finally:
+        db[MIGRATIONS_LOCK_COLLECTION].delete_one({"_id": "lock", "owner": owner})
+
+
+async def run_migrations():
+    await apply_postgres_migrations()
+    await asyncio.to_thread(apply_mongo_migrations, get_mongo_db())
+
+
+# Канонические запросы приложения: (таблица, которая должна читаться по индексу, запрос)
+CANONICAL_QUERIES = [
+    ("orders", select(Order).where(Order.customer_id == 1)),
+    ("order_items", select(OrderItem).where(OrderItem.order_id == 1)),
+    ("order_items", select(OrderItem).where(OrderItem.product_id == 1)),
+    ("reviews", select(Review).where(Review.product_id == 1)),
+    ("reviews", select(Review).where(Review.product_id == 1).order_by(Review.created_at.desc(), Review.id.desc()).limit(11)),
+    ("reviews", select(Review).where(Review.product_id == 1).order_by(Review.rating.desc(), Review.id.desc()).limit(11)),
+    ("products", select(Product).where(Product.category_id == 1)),
+    ("orders", select(Order).where(Order.status == "pending").order_by(Order.order_date, Order.id).limit(51)),
+]
+
+CANONICAL_MONGO_QUERIES = [
+    (CARTS_COLLECTION, {"customer_id": "1"}),
+    (COLLECTION, {"customer_id": "1"}),
+    (PROMO_COLLECTION, {"products": 1}),
+]
+
+
+def _find_plan_nodes(plan: dict, key: str, value: str) -> list[dict]:
+    found = [plan] if plan.get(key) == value else []
+    for child in plan.get("Plans", []) + plan.get("inputStages", []):
+        found.extend(_find_plan_nodes(child, key, value))
+    if "inputStage" in plan:
+        found.extend(_find_plan_nodes(plan["inputStage"], key, value))
+    return found
+
+
+async def verify_postgres_plans() -> list[str]:
+    failures = []
+    async with engine.connect() as conn:
+        # На маленьких таблицах планировщик всегда выберет Seq Scan,
+        # поэтому запрещаем его: если Seq Scan остался, значит индекса нет
+        await conn.execute(text("SET enable_seqscan = off"))
+        for table, stmt in CANONICAL_QUERIES:
+            sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+            result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            seq_scans = [
+                node for node in _find_plan_nodes(plan[0]["Plan"], "Node Type", "Seq Scan")
+                if node.get("Relation Name") == table
+            ]
+            if seq_scans:
+                failures.append(f"postgres: sequential scan on {table}: {sql}")
+            else:
+                logger.info(f"postgres: index scan on {table}: {sql}")
+    return failures
+
+
+def verify_mongo_plans(db: Database) -> list[str]:
+    failures = []
+    for collection, query in CANONICAL_MONGO_QUERIES:
+        explain = db[collection].find(query).explain()
+        winning_plan = explain["queryPlanner"]["winningPlan"]
+        if _find_plan_nodes(winning_plan, "stage", "COLLSCAN"):
+            failures.append(f"mongo: collection scan on {collection}: {query}")
+        else:
+            logger.info(f"mongo: index scan on {collection}: {query}")
+    return failures
+
+
+async def verify_query_plans() -> list[str]:
+    failures = await verify_postgres_plans()
+    failures += await asyncio.to_thread(verify_mongo_plans, get_mongo_db())
+    return failures
+
+
+async def main(command: str) -> int:
+    if command == "upgrade":
+        await run_migrations()
+        return 0
+    if command == "verify":
+        failures = await verify_query_plans()
+        for failure in failures:
+            logger.error(failure)
+        return 1 if failures else 0
+    logger.error(f"Unknown command: {command}. Use 'upgrade' or 'verify'")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "upgrade")))
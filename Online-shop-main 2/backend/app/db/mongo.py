@@ -3,25 +3,48 @@ from pymongo.collection import Collection
 from pymongo.database import Database
 from backend.app.schemas.user_profile import UserProfileOut, UserProfileCreate
 from backend.app.schemas.cart import CartItem, CartOut
+import asyncio
 import os
 from bson import ObjectId
+from backend.app.db.instrumentation import MongoCommandListener
 
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 MONGO_DB_NAME = "db"
 
-client = MongoClient(MONGO_URL)
-db = client[MONGO_DB_NAME]
-
-products_collection: Collection = db["products"]
+PRODUCTS_COLLECTION = "products"
 COLLECTION = "user_profiles"
 CARTS_COLLECTION = "carts"
 PROMO_COLLECTION = "promotions"
 
+# Клиент создаётся при первом обращении: импорт модуля не открывает соединений и не запускает потоки мониторинга
+_client: MongoClient | None = None
+
+def get_mongo_client() -> MongoClient:
+    global _client
+    if _client is None:
+        _client = MongoClient(MONGO_URL, event_listeners=[MongoCommandListener()])
+    return _client
+
 def get_mongo_db() -> Database:
-    return db
+    return get_mongo_client()[MONGO_DB_NAME]
+
+def get_mongo_collection() -> Collection:
+    return get_mongo_db()[PRODUCTS_COLLECTION]
+
+def ping_mongo():
+    get_mongo_client().admin.command("ping")
 
-def get_mongo_collection():
-    return products_collection
+async def init_mongo():
+    try:
+        await asyncio.to_thread(ping_mongo)
+    except Exception as e:
+        raise Exception(f"Failed to connect to MongoDB: {str(e)}")
+
+def close_mongo():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
 
 def get_user_profile(db: Database, customer_id: str) -> UserProfileOut | None:
     doc = db[COLLECTION].find_one({"customer_id": customer_id})
@@ -35,15 +58,35 @@ def update_user_profile(db: Database, customer_id: str, update_data: dict) -> Us
     db[COLLECTION].update_one({"customer_id": customer_id}, {"$set": update_data})
     return get_user_profile(db, customer_id)
 
-def push_to_list(db: Database, customer_id: str, field: str, value: int):
-    db[COLLECTION].update_one({"customer_id": customer_id}, {"$addToSet": {field: value}})
+def push_to_list(db: Database, customer_id: str, field: str, value: int, limit: int) -> bool:
+    # Условие на индекс limit-1 не даёт списку вырасти больше limit элементов
+    result = db[COLLECTION].update_one(
+        {"customer_id": customer_id, f"{field}.{limit - 1}": {"$exists": False}},
+        {"$addToSet": {field: value}}
+    )
+    if result.matched_count:
+        return True
+    if db[COLLECTION].find_one({"customer_id": customer_id}, {"_id": 1}) is None:
+        db[COLLECTION].insert_one(UserProfileCreate(customer_id=customer_id, **{field: [value]}).dict())
+        return True
+    # Профиль есть, но список заполнен: успех, только если значение уже в нём
+    return db[COLLECTION].count_documents({"customer_id": customer_id, field: value}, limit=1) > 0
+
+def get_list_page(db: Database, customer_id: str, field: str, offset: int, limit: int) -> tuple[list[int], bool]:
+    # $slice в проекции: из Mongo приходит только страница, а не весь массив
+    doc = db[COLLECTION].find_one(
+        {"customer_id": customer_id},
+        {"_id": 0, field: {"$slice": [offset, limit + 1]}}
+    )
+    values = doc.get(field, []) if doc else []
+    return values[:limit], len(values) > limit
 
 def remove_from_list(db: Database, customer_id: str, field: str, value: int):
     db[COLLECTION].update_one({"customer_id": customer_id}, {"$pull": {field: value}})
 
 def get_cart(db: Database, user_id: str) -> dict:
-    cart = db[CARTS_COLLECTION].find_one({"user_id": user_id})
-    return cart if cart else {"items": [], "user_id": user_id}
+    cart = db[CARTS_COLLECTION].find_one({"customer_id": user_id})
+    return cart if cart else {"items": [], "customer_id": user_id}
 
 def add_to_cart(db: Database, customer_id: str, item: dict):
     cart = get_cart(db, customer_id)
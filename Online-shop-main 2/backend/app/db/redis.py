@@ -2,6 +2,7 @@ import redis.asyncio as redis
 import json
 import os
 from fastapi import Depends
+from backend.app.db.instrumentation import InstrumentedRedis
 
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
@@ -9,7 +10,7 @@ POPULAR_KEY = "popular_products"
 
 # Глобальное подключение к Redis
 pool = redis.ConnectionPool(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
-redis_client = redis.Redis(connection_pool=pool)
+redis_client = InstrumentedRedis(connection_pool=pool)
 from fastapi import Depends
 from redis.asyncio import Redis
 import json
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import time
+import logging
+from fastapi import Depends, Request
+from prometheus_client import Counter, Gauge
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
+from sqlalchemy.orm import sessionmaker
+from backend.app.db.postgres import get_db, AsyncSessionLocal
+from backend.app.db.instrumentation import instrument_engine
+
+logger = logging.getLogger(__name__)
+
+# Реплика для чтения каталога и истории заказов; без DATABASE_REPLICA_URL всё идёт в основную базу
+REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# Отставание, после которого чтения возвращаются на основную базу
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", 2))
+# Сколько секунд после своей записи пользователь читает с основной базы
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 5))
+STICKY_COOKIE = "db_primary_until"
+
+replica_engine: AsyncEngine | None = create_async_engine(REPLICA_URL) if REPLICA_URL else None
+if replica_engine is not None:
+    instrument_engine(replica_engine)
+ReplicaSessionLocal = (
+    sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False) if replica_engine is not None else None
+)
+
+REPLICA_LAG = Gauge("db_replica_lag_seconds", "Replication lag of the read replica")
+DB_READS = Counter("db_read_sessions_total", "Read-only sessions by the database they were routed to", ["target"])
+
+# Реплика без новых WAL не отстаёт, даже если последняя транзакция была давно
+LAG_SQL = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReplicaMonitor:
+    def __init__(self, engine: AsyncEngine | None):
+        self.engine = engine
+        self.lag: float | None = None
+        self.healthy = False
+        self._task: asyncio.Task | None = None
+
+    async def check(self) -> bool:
+        try:
+            async with self.engine.connect() as conn:
+                result = await asyncio.wait_for(conn.execute(LAG_SQL), timeout=REPLICA_LAG_CHECK_INTERVAL)
+                self.lag = float(result.scalar() or 0)
+            REPLICA_LAG.set(self.lag)
+            healthy = self.lag <= REPLICA_MAX_LAG
+        except Exception as e:
+            logger.error(f"Replica lag check failed: {str(e)}")
+            healthy = False
+        if healthy != self.healthy:
+            logger.warning(f"Read replica {'enabled' if healthy else 'disabled'}, lag={self.lag}")
+        self.healthy = healthy
+        return healthy
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(REPLICA_LAG_CHECK_INTERVAL)
+            await self.check()
+
+    async def start(self):
+        if self.engine is None or self._task is not None:
+            return
+        # Первая проверка до приёма трафика: до неё реплика считается недоступной
+        await self.check()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.engine is not None:
+            await self.engine.dispose()
+
+
+replica_monitor = ReplicaMonitor(replica_engine)
+
+
+def replica_available() -> bool:
+    return ReplicaSessionLocal is not None and replica_monitor.healthy
+
+
+def is_sticky(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_session_factory(request: Request | None = None):
+    # Для чтений вне Depends (выгрузки, потоковые страницы): реплика, если она в порядке;
+    # с request — ещё и с учётом недавних записей пользователя, как в get_read_db
+    if not replica_available() or (request is not None and is_sticky(request)):
+        return AsyncSessionLocal
+    return ReplicaSessionLocal
+
+
+# Зависимость для чтений, которые идут уже после выхода из обработчика (потоковые страницы):
+# сессию открывает сам поток, зависимость отдаёт только фабрику
+def get_read_session_factory(request: Request):
+    return read_session_factory(request)
+
+
+# Зависимость для обработчиков, которые только читают. Сессия основной базы создаётся всегда,
+# но соединение берёт лишь при первом запросе — на реплику уходят без лишнего обращения к primary
+async def get_read_db(request: Request, db: AsyncSession = Depends(get_db)):
+    if not replica_available() or is_sticky(request):
+        DB_READS.labels("primary").inc()
+        yield db
+        return
+    DB_READS.labels("replica").inc()
+    async with ReplicaSessionLocal() as session:
+        yield session
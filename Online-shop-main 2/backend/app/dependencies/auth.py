@@ -1,8 +1,8 @@
 from fastapi import HTTPException, Depends, Cookie
 from redis.asyncio import Redis
-import json
 import logging
 from backend.app.db.redis import get_redis
+from backend.app.services.sessions import resolve_session
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -12,16 +12,12 @@ async def get_current_admin(session_id: str = Cookie(default=None), redis: Redis
     if not session_id:
         logger.debug("No admin session ID provided")
         raise HTTPException(status_code=401, detail="Missing session_id")
-    session_data = await redis.get(f"session:{session_id}")
-    logger.debug(f"Admin Session data: {session_data}")
-    if not session_data:
+    # В режиме SESSION_MODE=token сессия проверяется по подписи, без обращения к Redis
+    session = await resolve_session(redis, session_id)
+    logger.debug(f"Admin Session data: {session}")
+    if not session:
         logger.debug("Invalid or expired admin session")
         raise HTTPException(status_code=401, detail="Invalid or expired session")
-    try:
-        session = json.loads(session_data)
-    except json.JSONDecodeError:
-        logger.error("Failed to decode session data")
-        raise HTTPException(status_code=401, detail="Invalid session data")
     if "admin_id" not in session:
         raise HTTPException(status_code=403, detail="Not an admin session")
     return session
@@ -31,16 +27,11 @@ async def get_current_user(session_id: str = Cookie(default=None), redis: Redis
     if not session_id:
         logger.debug("No user session ID provided")
         raise HTTPException(status_code=401, detail="No session ID provided")
-    session_data = await redis.get(f"session:{session_id}")
-    logger.debug(f"User Session data: {session_data}")
-    if session_data is None:
+    session_info = await resolve_session(redis, session_id)
+    logger.debug(f"User Session data: {session_info}")
+    if session_info is None:
         logger.debug("Invalid user session ID")
         raise HTTPException(status_code=401, detail="Invalid session ID")
-    try:
-        session_info = json.loads(session_data)
-    except json.JSONDecodeError:
-        logger.error("Failed to decode user session data")
-        raise HTTPException(status_code=401, detail="Invalid session data")
     return {
         "id": session_info.get("customer_id"),
         "last_activity": session_info.get("last_activity"),
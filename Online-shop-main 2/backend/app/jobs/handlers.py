@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from pydantic import BaseModel
+from backend.app.db.mongo import clear_cart, PRODUCTS_COLLECTION
+from backend.app.db.redis import POPULAR_KEY
+from backend.app.jobs.queue import job_handler, JobContext
+from backend.app.services.autocomplete import bump_product
+
+logger = logging.getLogger(__name__)
+
+CLEAR_CART = "cart.clear"
+SAVE_PRODUCT_DETAILS = "product.save_details"
+DELETE_PRODUCT_DETAILS = "product.delete_details"
+PRODUCT_VIEWED = "product.viewed"
+
+
+class ClearCartJob(BaseModel):
+    customer_id: str
+
+
+class ProductDetailsJob(BaseModel):
+    product_id: int
+    description: str = ""
+    attributes: dict = {}
+
+
+class ProductJob(BaseModel):
+    product_id: int
+
+
+# pymongo синхронный — обращения к Mongo уходят в поток, чтобы не блокировать цикл воркера
+
+@job_handler(CLEAR_CART, ClearCartJob)
+async def handle_clear_cart(ctx: JobContext, job: ClearCartJob):
+    await asyncio.to_thread(clear_cart, ctx.mongo_db, job.customer_id)
+
+
+@job_handler(SAVE_PRODUCT_DETAILS, ProductDetailsJob)
+async def handle_save_product_details(ctx: JobContext, job: ProductDetailsJob):
+    # upsert, а не insert: повтор после сбоя не создаёт дубликат документа
+    await asyncio.to_thread(
+        ctx.mongo_db[PRODUCTS_COLLECTION].update_one,
+        {"product_id": job.product_id},
+        {"$set": {"description": job.description, "attributes": job.attributes}},
+        upsert=True
+    )
+
+
+@job_handler(DELETE_PRODUCT_DETAILS, ProductJob)
+async def handle_delete_product_details(ctx: JobContext, job: ProductJob):
+    await asyncio.to_thread(ctx.mongo_db[PRODUCTS_COLLECTION].delete_one, {"product_id": job.product_id})
+
+
+@job_handler(PRODUCT_VIEWED, ProductJob)
+async def handle_product_viewed(ctx: JobContext, job: ProductJob):
+    await ctx.redis.zincrby(POPULAR_KEY, 1, str(job.product_id))
+    # Вес подсказок поиска идёт следом; ошибка здесь не повторяет задачу и не удваивает счётчик
+    await bump_product(ctx.redis, job.product_id)
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+import logging
+from typing import Awaitable, Callable
+from pydantic import BaseModel, ValidationError
+from prometheus_client import Counter, Histogram
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+READY_KEY = "jobs:ready"
+# Задачи, ожидающие повтора: zset задача -> unix time запуска
+DELAYED_KEY = "jobs:delayed"
+DEAD_KEY = "jobs:dead"
+# Задачи, взятые воркером: список на каждого воркера, чтобы после падения их можно было вернуть
+PROCESSING_KEY = "jobs:processing:{worker_id}"
+# Живые воркеры: zset worker_id -> время последнего heartbeat
+WORKERS_KEY = "jobs:workers"
+
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", 1.0))
+BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", 300.0))
+DEAD_LETTER_LIMIT = int(os.getenv("JOB_DEAD_LETTER_LIMIT", 10000))
+WORKER_TIMEOUT = int(os.getenv("JOB_WORKER_TIMEOUT", 60))
+# Для разработки без отдельного процесса: воркер с такой конкурентностью внутри веб-приложения
+IN_APP_CONCURRENCY = int(os.getenv("JOB_WORKERS_IN_APP", 0))
+
+JOBS_ENQUEUED = Counter("jobs_enqueued_total", "Jobs put on the queue", ["type"])
+JOBS_PROCESSED = Counter("jobs_processed_total", "Jobs finished by workers", ["type", "outcome"])
+JOB_DURATION = Histogram("job_duration_seconds", "Job handler run time", ["type"])
+
+# Переносит наступившие повторы в очередь готовых одной атомарной операцией
+# KEYS: delayed, ready; ARGV: now, лимит
+PROMOTE_LUA = """
+local jobs = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, job in ipairs(jobs) do
+    redis.call('ZREM', KEYS[1], job)
+    redis.call('LPUSH', KEYS[2], job)
+end
+return #jobs
+"""
+
+
+class JobContext:
+    def __init__(self, redis: Redis, mongo_db, session_factory=None):
+        self.redis = redis
+        self.mongo_db = mongo_db
+        self.session_factory = session_factory
+
+
+Handler = Callable[[JobContext, BaseModel], Awaitable[None]]
+# Тип задачи -> (модель payload, обработчик)
+HANDLERS: dict[str, tuple[type[BaseModel], Handler]] = {}
+JOB_FIELDS = {"id", "type", "payload", "attempts"}
+
+
+def job_handler(job_type: str, payload_model: type[BaseModel]):
+    def register(func: Handler) -> Handler:
+        HANDLERS[job_type] = (payload_model, func)
+        return func
+    return register
+
+
+def _envelope(job_type: str, payload: BaseModel) -> dict:
+    model, _ = HANDLERS[job_type]
+    if not isinstance(payload, model):
+        raise TypeError(f"Job {job_type} expects {model.__name__}, got {type(payload).__name__}")
+    return {"id": uuid.uuid4().hex, "type": job_type, "payload": payload.model_dump(mode="json"),
+            "attempts": 0, "enqueued_at": time.time()}
+
+
+async def run_inline(ctx: JobContext, job_type: str, payload: BaseModel):
+    _, handler = HANDLERS[job_type]
+    await handler(ctx, payload)
+
+
+async def enqueue(redis: Redis, job_type: str, payload: BaseModel, fallback: JobContext | None = None) -> bool:
+    job = _envelope(job_type, payload)
+    try:
+        await redis.lpush(READY_KEY, json.dumps(job))
+        JOBS_ENQUEUED.labels(job_type).inc()
+        logger.debug(f"Enqueued job {job['id']} ({job_type})")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to enqueue {job_type}: {str(e)}")
+    # Очередь недоступна: важные задачи выполняются прямо в запросе, остальные теряются
+    if fallback is not None:
+        await run_inline(fallback, job_type, payload)
+    return False
+
+
+def backoff(attempts: int) -> float:
+    # Экспоненциальная задержка с full jitter
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempts))
+
+
+class Worker:
+    def __init__(self, ctx: JobContext, concurrency: int = 4, worker_id: str | None = None):
+        self.ctx = ctx
+        self.redis = ctx.redis
+        self.concurrency = concurrency
+        self.worker_id = worker_id or f"{os.uname().nodename}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.processing_key = PROCESSING_KEY.format(worker_id=self.worker_id)
+        self.promote = self.redis.register_script(PROMOTE_LUA)
+        self._stopping = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    async def _bury_malformed(self, raw: str, error: Exception):
+        # Запись, которую не разобрать, — сразу в dead letter как есть, для разбора руками
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.lpush(DEAD_KEY, json.dumps({"raw": raw, "error": f"{type(error).__name__}: {str(error)}"}))
+        pipe.ltrim(DEAD_KEY, 0, DEAD_LETTER_LIMIT - 1)
+        pipe.lrem(self.processing_key, 1, raw)
+        await pipe.execute()
+        JOBS_PROCESSED.labels("malformed", "dead").inc()
+        logger.error(f"Malformed job moved to dead letter: {str(error)}")
+
+    async def _handle(self, raw: str):
+        try:
+            job = json.loads(raw)
+            if not isinstance(job, dict) or not JOB_FIELDS <= job.keys() or not isinstance(job["attempts"], int):
+                raise ValueError(f"Job must be an object with {sorted(JOB_FIELDS)}")
+        except ValueError as e:
+            await self._bury_malformed(raw, e)
+            return
+        entry = HANDLERS.get(job["type"])
+        started = time.perf_counter()
+        try:
+            if entry is None:
+                raise LookupError(f"No handler for job type {job['type']}")
+            model, handler = entry
+            await handler(self.ctx, model.model_validate(job["payload"]))
+        except Exception as e:
+            job["attempts"] += 1
+            job["error"] = f"{type(e).__name__}: {str(e)}"
+            # Неизвестный тип и невалидный payload повтором не исправить — сразу в dead letter
+            permanent = entry is None or isinstance(e, ValidationError)
+            if permanent or job["attempts"] >= MAX_ATTEMPTS:
+                pipe = self.redis.pipeline(transaction=True)
+                pipe.lpush(DEAD_KEY, json.dumps(job))
+                pipe.ltrim(DEAD_KEY, 0, DEAD_LETTER_LIMIT - 1)
+                pipe.lrem(self.processing_key, 1, raw)
+                await pipe.execute()
+                JOBS_PROCESSED.labels(job["type"], "dead").inc()
+                logger.error(f"Job {job['id']} ({job['type']}) moved to dead letter: {job['error']}")
+            else:
+                delay = backoff(job["attempts"])
+                pipe = self.redis.pipeline(transaction=True)
+                pipe.zadd(DELAYED_KEY, {json.dumps(job): time.time() + delay})
+                pipe.lrem(self.processing_key, 1, raw)
+                await pipe.execute()
+                JOBS_PROCESSED.labels(job["type"], "retry").inc()
+                logger.warning(f"Job {job['id']} ({job['type']}) failed, retry {job['attempts']} in {delay:.1f}s: {job['error']}")
+            return
+        finally:
+            JOB_DURATION.labels(job["type"]).observe(time.perf_counter() - started)
+        await self.redis.lrem(self.processing_key, 1, raw)
+        JOBS_PROCESSED.labels(job["type"], "ok").inc()
+
+    async def _consume(self):
+        while not self._stopping.is_set():
+            try:
+                raw = await self.redis.blmove(READY_KEY, self.processing_key, 1, "RIGHT", "LEFT")
+            except Exception as e:
+                logger.error(f"Worker {self.worker_id} failed to fetch a job: {str(e)}")
+                await asyncio.sleep(1)
+                continue
+            if raw is None:
+                # Очередь пуста; пауза на случай клиента, который не блокируется на BLMOVE (fakeredis)
+                await asyncio.sleep(0.05)
+                continue
+            try:
+                await self._handle(raw)
+            except Exception as e:
+                # Обычно это Redis посреди повтора или подтверждения. Потребитель не должен умереть:
+                # задача остаётся в processing-списке и вернётся в очередь при остановке воркера
+                logger.error(f"Worker {self.worker_id} failed to settle a job: {type(e).__name__}: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def _maintain(self):
+        # Heartbeat, перенос наступивших повторов и возврат задач упавших воркеров
+        while not self._stopping.is_set():
+            try:
+                now = time.time()
+                await self.redis.zadd(WORKERS_KEY, {self.worker_id: now})
+                await self.promote(keys=[DELAYED_KEY, READY_KEY], args=[now, 1000])
+                for worker_id in await self.redis.zrangebyscore(WORKERS_KEY, "-inf", now - WORKER_TIMEOUT):
+                    await self.requeue_processing(worker_id)
+            except Exception as e:
+                logger.error(f"Worker {self.worker_id} maintenance failed: {str(e)}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+
+    async def requeue_processing(self, worker_id: str) -> int:
+        key = PROCESSING_KEY.format(worker_id=worker_id)
+        moved = 0
+        while await self.redis.lmove(key, READY_KEY, "RIGHT", "LEFT") is not None:
+            moved += 1
+        await self.redis.zrem(WORKERS_KEY, worker_id)
+        if moved:
+            logger.warning(f"Requeued {moved} jobs of stale worker {worker_id}")
+        return moved
+
+    def start(self):
+        self._stopping.clear()
+        self._tasks = [asyncio.create_task(self._maintain())]
+        self._tasks += [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+        logger.info(f"Job worker {self.worker_id} started with concurrency {self.concurrency}")
+
+    async def stop(self):
+        # Задачи, начатые до остановки, дорабатывают; новые не берутся
+        self._stopping.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.requeue_processing(self.worker_id)
+
+    async def run(self):
+        self.start()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def requeue_dead(redis: Redis, limit: int | None = None) -> int:
+    moved = 0
+    malformed = []
+    while limit is None or moved < limit:
+        raw = await redis.rpop(DEAD_KEY)
+        if raw is None:
+            break
+        job = json.loads(raw)
+        if "raw" in job:
+            # Неразобранные записи повтором не исправить — остаются в dead letter
+            malformed.append(raw)
+            continue
+        job["attempts"] = 0
+        await redis.lpush(READY_KEY, json.dumps(job))
+        moved += 1
+    if malformed:
+        await redis.rpush(DEAD_KEY, *malformed)
+    return moved
@@ -0,0 +1,45 @@
+import argparse
+import asyncio
+import signal
+import sys
+import logging
+from backend.app.db.mongo import get_mongo_db
+from backend.app.db.postgres import AsyncSessionLocal
+from backend.app.db.redis import redis_client, close_redis
+from backend.app.jobs.queue import JobContext, Worker, requeue_dead
+from backend.app.jobs import handlers  # noqa: F401 — регистрирует обработчики
+
+logger = logging.getLogger(__name__)
+
+
+def app_context() -> JobContext:
+    return JobContext(redis_client, get_mongo_db(), AsyncSessionLocal)
+
+
+async def serve(concurrency: int):
+    worker = Worker(app_context(), concurrency=concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(worker.stop()))
+    await worker.run()
+    await close_redis()
+
+
+async def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Воркер фоновых задач")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "requeue-dead"])
+    parser.add_argument("--concurrency", type=int, default=8, help="сколько задач выполняется одновременно")
+    parser.add_argument("--limit", type=int, default=None, help="сколько задач вернуть из dead letter")
+    args = parser.parse_args(argv)
+    if args.command == "requeue-dead":
+        moved = await requeue_dead(redis_client, args.limit)
+        logger.info(f"Requeued {moved} dead jobs")
+        await close_redis()
+        return 0
+    await serve(args.concurrency)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -1,15 +1,80 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from backend.app.db.postgres import init_db, get_db
-from backend.app.db.redis import init_redis, close_redis
-from backend.app.api import products, auth_user, auth_admin, categories, orders, reviews, order_items, user_profile, cart, promotions
-from backend.app.models.postgres_models import Product
+from backend.app.db.postgres import init_db, get_db, engine, AsyncSessionLocal
+from backend.app.db.redis import init_redis, close_redis, pool as redis_pool, redis_client
+from backend.app.db.mongo import init_mongo, close_mongo, get_mongo_db
+from backend.app.db.replica import replica_engine, replica_monitor
+from backend.app.db.migrations import run_migrations
+from backend.app.api import products, auth_user, auth_admin, categories, orders, reviews, order_items, user_profile, cart, promotions, profiler, analytics, health
+from backend.app.middleware.metrics import setup_metrics
+from backend.app.middleware.admission import setup_admission
+from backend.app.middleware.profiler import setup_profiler
+from backend.app.middleware.sessions import setup_sessions
+from backend.app.middleware.replica import setup_replica_routing
+from backend.app.middleware.compression import setup_compression
+from backend.app.services.static_assets import PrecompressedStaticFiles
+from backend.app.services.passwords import shutdown_password_hasher
+from backend.app.services.profile_views import recent_views_writer
+from backend.app.services.reservations import ReservationSweeper
+from backend.app.services.inventory import StockRebalancer
+from backend.app.services.autocomplete import ensure_index
+from backend.app.services.analytics import SalesAggregator
+from backend.app.jobs.queue import Worker, IN_APP_CONCURRENCY
+from backend.app.jobs.worker import app_context
+from backend.app.services.catalog_cache import get_home_feed
+from backend.app.services.warmup import warm_up
+from backend.app.services.invalidation import invalidation_bus
+from backend.app.services.serialization import DEFAULT_RESPONSE_CLASS
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+reservation_sweeper = ReservationSweeper(redis_client, AsyncSessionLocal)
+stock_rebalancer = StockRebalancer(AsyncSessionLocal)
+sales_aggregator = SalesAggregator(AsyncSessionLocal)
+# Фоновые задачи выполняет отдельный процесс (python -m backend.app.jobs.worker); в приложении — только по JOB_WORKERS_IN_APP
+job_worker = Worker(app_context(), concurrency=IN_APP_CONCURRENCY) if IN_APP_CONCURRENCY else None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    # Бэкенды независимы — подключаемся параллельно; миграциям нужны и Postgres, и Mongo
+    await asyncio.gather(init_redis(), init_db(), init_mongo())
+    # Реплика необязательна: недоступна или отстаёт — чтения идут в основную базу
+    await replica_monitor.start()
+    await run_migrations()
+    recent_views_writer.start()
+    reservation_sweeper.start()
+    # Дельты продаж из заказов -> дневные агрегаты /analytics
+    sales_aggregator.start()
+    # Без STOCK_SHARDS только возвращает остатки из шардов в products, если шардирование выключили
+    await stock_rebalancer.start()
+    if job_worker:
+        job_worker.start()
+    # Подписка на сбросы кешей других воркеров — до прогрева, чтобы не пропустить изменения во время него
+    await invalidation_bus.start(redis_client)
+    await warm_up(engine, AsyncSessionLocal, get_mongo_db())
+    await ensure_index(AsyncSessionLocal, redis_client)
+    # /health/ready отвечает 200 только с этого момента
+    app.state.ready = True
+    logger.info("Application is ready")
+    yield
+    app.state.ready = False
+    await asyncio.gather(recent_views_writer.stop(), reservation_sweeper.stop(), stock_rebalancer.stop(),
+                         sales_aggregator.stop(), invalidation_bus.stop(), replica_monitor.stop(), job_worker.stop() if job_worker else asyncio.sleep(0))
+    await close_redis()
+    await asyncio.to_thread(close_mongo)
+    await engine.dispose()
+    shutdown_password_hasher()
+
+
+# Класс ответа по умолчанию: ORJSONResponse при FAST_JSON=1
+app = FastAPI(lifespan=lifespan, default_response_class=DEFAULT_RESPONSE_CLASS)
 templates = Jinja2Templates(directory="templates")
 
 # Настройка CORS
@@ -21,8 +86,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Подключение статических файлов
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Подписанные токены сессий (SESSION_MODE=token): прозрачное обновление истёкшего access-токена
+setup_sessions(app, redis_client)
+
+# Реплика для чтения (DATABASE_REPLICA_URL): после своей записи клиент какое-то время читает с основной базы
+setup_replica_routing(app)
+
+# Контроль допуска (ADMISSION_CONTROL=1): лимиты по классам маршрутов и token bucket в Redis.
+# Подключается до метрик, чтобы отброшенные запросы тоже попадали в /metrics
+setup_admission(app, redis_client)
+
+# Prometheus: /metrics, латентность маршрутов, обращения к бэкендам, пулы соединений
+engines = {"primary": engine, **({"replica": replica_engine} if replica_engine is not None else {})}
+setup_metrics(app, engines=engines, redis_pools={"default": redis_pool})
+
+# Профилировщик запросов для dev/staging (QUERY_PROFILER=1): X-Query-Count, X-DB-Time, поиск N+1
+if setup_profiler(app):
+    app.include_router(profiler.router, prefix="/profiler", tags=["Profiler"])
+
+# Сжатие ответов gzip/brotli (RESPONSE_COMPRESSION=1); самый внешний слой — сжимает уже готовое тело
+setup_compression(app)
+
+# Подключение статических файлов; готовые .br/.gz копии собирает make static-precompress
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
 # Подключаем роутеры
 app.include_router(products.router, prefix="/products", tags=["Products"])
@@ -35,18 +121,10 @@ app.include_router(order_items.router, prefix="/order-items", tags=["OrderItems"
 app.include_router(user_profile.router, prefix="/user/me", tags=["User Profile"])
 app.include_router(cart.router, prefix="/cart", tags=["Cart"])
 app.include_router(promotions.router, prefix="/promotions", tags=["Promotions"])
-
-@app.on_event("startup")
-async def startup_event():
-    await init_redis()
-    await init_db()
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    await close_redis()
+app.include_router(analytics.router, prefix="/analytics", tags=["Analytics"])
+app.include_router(health.router, prefix="/health", tags=["Health"])
 
 @app.get("/")
 async def home(request: Request, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Product).limit(4))
-    products = result.scalars().all()
+    products = await get_home_feed(db)
     return templates.TemplateResponse("home.html", {"request": request, "products": products})
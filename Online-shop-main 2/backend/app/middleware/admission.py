@@ -0,0 +1,218 @@
+import asyncio
+import os
+import re
+import time
+import json
+import logging
+from prometheus_client import Counter, Gauge
+from starlette.requests import Request
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_CONTROL", "0") == "1"
+# Общая ёмкость воркера: сколько запросов одновременно выполняются во всех классах
+GLOBAL_CAPACITY = int(os.getenv("ADMISSION_CAPACITY", 64))
+QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 2.0))
+RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 1))
+TRUST_FORWARDED = os.getenv("ADMISSION_TRUST_FORWARDED", "0") == "1"
+
+SESSION_RATE = float(os.getenv("RATE_LIMIT_SESSION_RATE", 10))
+SESSION_BURST = int(os.getenv("RATE_LIMIT_SESSION_BURST", 40))
+IP_RATE = float(os.getenv("RATE_LIMIT_IP_RATE", 20))
+IP_BURST = int(os.getenv("RATE_LIMIT_IP_BURST", 100))
+
+ADMITTED = Counter("admission_admitted_total", "Requests admitted", ["route_class"])
+SHED = Counter("admission_shed_total", "Requests shed with 503", ["route_class", "reason"])
+RATE_LIMITED = Counter("admission_rate_limited_total", "Requests rejected by token buckets", ["bucket"])
+ACTIVE = Gauge("admission_active_requests", "Requests running per route class", ["route_class"],
+               multiprocess_mode="livesum")
+QUEUED = Gauge("admission_queued_requests", "Requests waiting per route class", ["route_class"],
+               multiprocess_mode="livesum")
+
+
+class RouteClass:
+    def __init__(self, name: str, patterns: list[tuple[str, str]], max_concurrent: int, max_queue: int,
+                 shed_at: float | None):
+        self.name = name
+        self.patterns = [(method, re.compile(pattern)) for method, pattern in patterns]
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        # Доля общей ёмкости, при превышении которой класс отбрасывается сразу; None — только очередь
+        self.shed_at = shed_at
+        self.active = 0
+        self.waiting = 0
+        self._released = asyncio.Condition()
+
+    def matches(self, method: str, path: str) -> bool:
+        return any((m == "*" or m == method) and p.match(path) for m, p in self.patterns)
+
+
+# Порядок = приоритет: оформление заказа и вход > корзина > карточка товара > списки и поиск
+ROUTE_CLASSES = [
+    RouteClass("checkout", [("POST", r"^/orders/?$"), ("POST", r"^/user/auth/jwt/login$"),
+                            ("POST", r"^/user/auth/admin/login$")],
+               max_concurrent=int(os.getenv("ADMISSION_CHECKOUT_CONCURRENCY", 32)), max_queue=128, shed_at=None),
+    RouteClass("cart", [("*", r"^/cart(/|$)")],
+               max_concurrent=int(os.getenv("ADMISSION_CART_CONCURRENCY", 24)), max_queue=64, shed_at=0.9),
+    RouteClass("product", [("GET", r"^/products/\d+$"), ("GET", r"^/products/\d+/reviews$")],
+               max_concurrent=int(os.getenv("ADMISSION_PRODUCT_CONCURRENCY", 24)), max_queue=32, shed_at=0.75),
+    RouteClass("listing", [("GET", r"^/$"), ("GET", r"^/products/"), ("GET", r"^/categories/"),
+                           ("GET", r"^/reviews/"), ("GET", r"^/promotions/")],
+               max_concurrent=int(os.getenv("ADMISSION_LISTING_CONCURRENCY", 16)), max_queue=16, shed_at=0.6),
+]
+SKIP_PREFIXES = ("/static", "/metrics", "/health")
+
+# Два ведра (сессия и IP) за один вызов: KEYS — ключи вёдер, ARGV — now и по паре (rate, burst) на ключ
+TOKEN_BUCKET_LUA = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    available = math.min(burst, available + math.max(0, now - ts) * rate)
+    if available < 1 then
+        return {i, tostring((1 - available) / rate)}
+    end
+    tokens[i] = available
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return {0, '0'}
+"""
+
+
+def classify(method: str, path: str) -> RouteClass | None:
+    for route_class in ROUTE_CLASSES:
+        if route_class.matches(method, path):
+            return route_class
+    return None
+
+
+def total_active() -> int:
+    return sum(route_class.active for route_class in ROUTE_CLASSES)
+
+
+async def _send_rejection(send, status_code: int, detail: str, retry_after: int):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionControlMiddleware:
+    def __init__(self, app, redis_client=None):
+        self.app = app
+        self.redis = redis_client
+        self.token_bucket = redis_client.register_script(TOKEN_BUCKET_LUA) if redis_client is not None else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(SKIP_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        retry_after = await self._check_rate_limits(request)
+        if retry_after is not None:
+            await _send_rejection(send, 429, "Too many requests", retry_after)
+            return
+
+        route_class = classify(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await self._acquire(route_class)
+        if reason is not None:
+            SHED.labels(route_class.name, reason).inc()
+            logger.warning(f"Shedding {scope['method']} {scope['path']} ({route_class.name}): {reason}")
+            await _send_rejection(send, 503, "Service overloaded, try again later", RETRY_AFTER)
+            return
+        ADMITTED.labels(route_class.name).inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await self._release(route_class)
+
+    async def _check_rate_limits(self, request: Request) -> int | None:
+        if self.token_bucket is None:
+            return None
+        keys, args = [], [time.time()]
+        session_id = request.cookies.get("session_id")
+        if session_id:
+            keys.append(f"ratelimit:session:{session_id}")
+            args += [SESSION_RATE, SESSION_BURST]
+        keys.append(f"ratelimit:ip:{self._client_ip(request)}")
+        args += [IP_RATE, IP_BURST]
+        try:
+            denied, retry_after = await self.token_bucket(keys=keys, args=args)
+        except Exception as e:
+            # Redis недоступен — не блокируем трафик из-за лимитера
+            logger.error(f"Rate limiter unavailable: {str(e)}")
+            return None
+        if int(denied) == 0:
+            return None
+        bucket = "session" if session_id and int(denied) == 1 else "ip"
+        RATE_LIMITED.labels(bucket).inc()
+        return max(1, int(float(retry_after) + 0.999))
+
+    def _client_ip(self, request: Request) -> str:
+        if TRUST_FORWARDED:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    async def _acquire(self, route_class: RouteClass) -> str | None:
+        # Выше порога насыщения низкоприоритетные классы отбрасываются сразу, не занимая очередь
+        if route_class.shed_at is not None and total_active() >= GLOBAL_CAPACITY * route_class.shed_at:
+            return "saturated"
+        if route_class.active < route_class.max_concurrent and route_class.waiting == 0:
+            route_class.active += 1
+            ACTIVE.labels(route_class.name).inc()
+            return None
+        if route_class.waiting >= route_class.max_queue:
+            return "queue_full"
+        route_class.waiting += 1
+        QUEUED.labels(route_class.name).inc()
+        try:
+            async with route_class._released:
+                await asyncio.wait_for(
+                    route_class._released.wait_for(lambda: route_class.active < route_class.max_concurrent),
+                    timeout=QUEUE_TIMEOUT
+                )
+                route_class.active += 1
+                ACTIVE.labels(route_class.name).inc()
+                return None
+        except asyncio.TimeoutError:
+            return "queue_timeout"
+        finally:
+            route_class.waiting -= 1
+            QUEUED.labels(route_class.name).dec()
+
+    async def _release(self, route_class: RouteClass):
+        route_class.active -= 1
+        ACTIVE.labels(route_class.name).dec()
+        async with route_class._released:
+            route_class._released.notify(1)
+
+
+def setup_admission(app, redis_client):
+    if not ADMISSION_ENABLED:
+        return False
+    app.add_middleware(AdmissionControlMiddleware, redis_client=redis_client)
+    logger.info(f"Admission control enabled, capacity {GLOBAL_CAPACITY}")
+    return True
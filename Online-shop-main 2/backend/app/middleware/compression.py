@@ -0,0 +1,188 @@
+import asyncio
+import gzip
+import os
+import zlib
+import logging
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "0") == "1"
+# Мелкие ответы не сжимаем: заголовки и CPU дороже выигрыша
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+# Тела крупнее этого сжимаются в потоке, чтобы не держать цикл событий
+COMPRESSION_OFFLOAD_SIZE = int(os.getenv("COMPRESSION_OFFLOAD_SIZE", 256 * 1024))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+# Качество brotli на лету: 4–5 сжимает лучше gzip-6 при сопоставимой скорости; 11 — только для статики
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 5))
+
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/javascript", "application/x-ndjson", "application/xml",
+    "image/svg+xml", "text/csv",
+}
+
+
+def supported_encodings() -> list[str]:
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def accepted_encodings(accept_encoding: str, available: list[str] | None = None) -> list[str]:
+    # Разбор Accept-Encoding с q-значениями; при равном q порядок available (brotli раньше gzip)
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            weights[name] = quality
+    available = available or supported_encodings()
+    ranked = [(weights.get(encoding, weights.get("*", 0.0)), -index, encoding) for index, encoding in enumerate(available)]
+    return [encoding for quality, _, encoding in sorted(ranked, reverse=True) if quality > 0]
+
+
+def choose_encoding(accept_encoding: str, available: list[str] | None = None) -> str | None:
+    encodings = accepted_encodings(accept_encoding, available)
+    return encodings[0] if encodings else None
+
+
+def is_compressible(content_type: str | None) -> bool:
+    if not content_type:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class StreamCompressor:
+    # Для потоковых ответов каждый кусок сбрасывается сразу: клиент получает начало страницы, не дожидаясь конца
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH)
+
+
+async def _off_loop(func, data: bytes, *args):
+    if len(data) >= COMPRESSION_OFFLOAD_SIZE:
+        return await asyncio.to_thread(func, data, *args)
+    return func(data, *args)
+
+
+class _CompressingSend:
+    def __init__(self, send, encoding: str):
+        self.send = send
+        self.encoding = encoding
+        self.start = None
+        self.mode = None  # None — решение ещё не принято, "identity" или "stream"
+        self.compressor: StreamCompressor | None = None
+
+    def _should_compress(self, headers: Headers, body: bytes, more_body: bool) -> bool:
+        if self.start["status"] < 200 or self.start["status"] in (204, 304):
+            return False
+        if "content-encoding" in headers or not is_compressible(headers.get("content-type")):
+            return False
+        if not more_body:
+            return len(body) >= COMPRESSION_MIN_SIZE
+        content_length = headers.get("content-length")
+        return content_length is None or int(content_length) >= COMPRESSION_MIN_SIZE
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            # Заголовки отправим вместе с первым куском тела, когда станет ясно, сжимать ли
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.mode is None:
+            headers = MutableHeaders(raw=list(self.start["headers"]))
+            if is_compressible(headers.get("content-type")):
+                headers.add_vary_header("Accept-Encoding")
+            if not self._should_compress(headers, body, more_body):
+                self.mode = "identity"
+                await self.send({**self.start, "headers": headers.raw})
+                await self.send(message)
+                return
+            headers["Content-Encoding"] = self.encoding
+            if not more_body:
+                compressed = await _off_loop(compress, body, self.encoding)
+                headers["Content-Length"] = str(len(compressed))
+                await self.send({**self.start, "headers": headers.raw})
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            self.mode = "stream"
+            self.compressor = StreamCompressor(self.encoding)
+            await self.send({**self.start, "headers": headers.raw})
+
+        if self.mode == "identity":
+            await self.send(message)
+            return
+        step = self.compressor.chunk if more_body else self.compressor.finish
+        await self.send({"type": "http.response.body", "body": await _off_loop(step, body), "more_body": more_body})
+
+
+def _varying_send(send):
+    # Клиент без подходящего кодирования получает несжатое тело, но ответ всё равно зависит от Accept-Encoding:
+    # без Vary общий кеш отдал бы эту копию и тем, кто умеет br/gzip
+    async def send_with_vary(message):
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(raw=list(message["headers"]))
+            if is_compressible(headers.get("content-type")):
+                headers.add_vary_header("Accept-Encoding")
+            message = {**message, "headers": headers.raw}
+        await send(message)
+    return send_with_vary
+
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, _varying_send(send))
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding))
+
+
+def setup_compression(app):
+    if not RESPONSE_COMPRESSION:
+        return False
+    app.add_middleware(CompressionMiddleware)
+    logger.info(f"Response compression enabled: {', '.join(supported_encodings())}")
+    return True
@@ -0,0 +1,149 @@
+import os
+import time
+import logging
+from contextvars import ContextVar
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from starlette.requests import Request
+from starlette.responses import Response
+from backend.app.db.instrumentation import add_backend_listener
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("postgres", "redis", "mongo")
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests currently being served",
+    ["method"], multiprocess_mode="livesum"
+)
+BACKEND_OPERATIONS_PER_REQUEST = Histogram(
+    "backend_operations_per_request", "Backend calls issued while serving one request",
+    ["backend", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+)
+BACKEND_OPERATION_DURATION = Histogram(
+    "backend_operation_duration_seconds", "Backend call latency",
+    ["backend", "operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+BACKEND_OPERATIONS = Counter(
+    "backend_operations_total", "Backend calls", ["backend"]
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "SQLAlchemy pool connections by state",
+    ["engine", "state"], multiprocess_mode="livesum"
+)
+REDIS_POOL_CONNECTIONS = Gauge(
+    "redis_pool_connections", "Redis ConnectionPool connections by state",
+    ["pool", "state"], multiprocess_mode="livesum"
+)
+
+# Счётчики обращений к бэкендам в рамках текущего запроса
+_request_operations: ContextVar[dict | None] = ContextVar("request_operations", default=None)
+
+_engines: dict = {}
+_redis_pools: dict = {}
+
+
+def _record_backend_call(backend: str, operation: str, statement: str, duration: float):
+    BACKEND_OPERATION_DURATION.labels(backend, operation).observe(duration)
+    BACKEND_OPERATIONS.labels(backend).inc()
+    counts = _request_operations.get()
+    if counts is not None:
+        counts[backend] = counts.get(backend, 0) + 1
+
+
+add_backend_listener(_record_backend_call)
+
+
+def track_sqlalchemy_pool(name: str, engine):
+    _engines[name] = engine
+
+
+def track_redis_pool(name: str, pool):
+    _redis_pools[name] = pool
+
+
+def _update_pool_gauges():
+    for name, engine in _engines.items():
+        pool = engine.pool
+        if not hasattr(pool, "checkedout"):
+            continue
+        DB_POOL_CONNECTIONS.labels(name, "size").set(pool.size())
+        DB_POOL_CONNECTIONS.labels(name, "checked_out").set(pool.checkedout())
+        DB_POOL_CONNECTIONS.labels(name, "checked_in").set(pool.checkedin())
+        DB_POOL_CONNECTIONS.labels(name, "overflow").set(max(pool.overflow(), 0))
+    for name, pool in _redis_pools.items():
+        REDIS_POOL_CONNECTIONS.labels(name, "in_use").set(len(pool._in_use_connections))
+        REDIS_POOL_CONNECTIONS.labels(name, "available").set(len(pool._available_connections))
+        REDIS_POOL_CONNECTIONS.labels(name, "max").set(pool.max_connections)
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Не подставляем сырой путь, чтобы не раздувать число временных рядов
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        counts = {}
+        token = _request_operations.set(counts)
+        # Маршрут известен только после роутинга, поэтому gauge ведём по методу
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            in_progress.dec()
+            _request_operations.reset(token)
+            route = route_label(scope)
+            REQUEST_DURATION.labels(method, route, str(status_code)).observe(duration)
+            for backend in BACKENDS:
+                BACKEND_OPERATIONS_PER_REQUEST.labels(backend, route).observe(counts.get(backend, 0))
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    _update_pool_gauges()
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Несколько воркеров uvicorn: собираем метрики из общего каталога
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def setup_metrics(app, engines: dict, redis_pools: dict):
+    for name, engine in engines.items():
+        track_sqlalchemy_pool(name, engine)
+    for name, pool in redis_pools.items():
+        track_redis_pool(name, pool)
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
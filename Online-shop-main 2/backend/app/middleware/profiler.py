@@ -0,0 +1,133 @@
+import os
+import re
+import time
+import uuid
+import logging
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from backend.app.db.instrumentation import add_backend_listener
+from backend.app.middleware.metrics import route_label
+
+logger = logging.getLogger(__name__)
+
+PROFILER_ENABLED = os.getenv("QUERY_PROFILER", "0") == "1"
+# Сколько одинаковых по форме запросов за один HTTP-запрос считаем N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_PROFILER_N_PLUS_ONE", 3))
+HISTORY_SIZE = int(os.getenv("QUERY_PROFILER_HISTORY", 200))
+SKIP_PREFIXES = ("/static", "/metrics", "/profiler")
+
+_current_queries: ContextVar[list | None] = ContextVar("profiled_queries", default=None)
+_history: deque = deque(maxlen=HISTORY_SIZE)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_UUID = re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE)
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM_LIST = re.compile(r"\((?:\s*(?:\?|\$\d+(?:::\w+)?|%\(\w+\)s|\d+)\s*,?)+\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _UUID.sub("?", shape)
+    shape = _PARAM_LIST.sub("(...)", shape)
+    shape = _NUMBER.sub("?", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def _record_query(backend: str, operation: str, statement: str, duration: float):
+    queries = _current_queries.get()
+    if queries is not None:
+        queries.append((backend, statement, duration))
+
+
+def build_report(queries: list[tuple[str, str, float]]) -> dict:
+    shapes: dict[tuple[str, str], dict] = {}
+    backends: dict[str, int] = {}
+    for backend, statement, duration in queries:
+        backends[backend] = backends.get(backend, 0) + 1
+        key = (backend, statement_shape(statement))
+        group = shapes.setdefault(key, {"backend": backend, "shape": key[1], "count": 0, "total_ms": 0.0})
+        group["count"] += 1
+        group["total_ms"] += duration * 1000
+    repeated = sorted(
+        (group for group in shapes.values() if group["count"] >= N_PLUS_ONE_THRESHOLD),
+        key=lambda group: group["count"], reverse=True
+    )
+    return {
+        "query_count": len(queries),
+        "db_time_ms": round(sum(duration for _, _, duration in queries) * 1000, 2),
+        "backends": backends,
+        "queries": [
+            {"backend": backend, "statement": statement, "duration_ms": round(duration * 1000, 3)}
+            for backend, statement, duration in queries
+        ],
+        "repeated": [{**group, "total_ms": round(group["total_ms"], 2)} for group in repeated],
+        "n_plus_one": bool(repeated),
+    }
+
+
+def get_history() -> list[dict]:
+    return list(reversed(_history))
+
+
+def get_profile(profile_id: str) -> dict | None:
+    for profile in _history:
+        if profile["id"] == profile_id:
+            return profile
+    return None
+
+
+class QueryProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(SKIP_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        queries = []
+        token = _current_queries.set(queries)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Заголовки уходят до тела ответа: запросы при стриминге тела сюда не попадут
+                db_time_ms = sum(duration for _, _, duration in queries) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-count", str(len(queries)).encode()))
+                headers.append((b"x-db-time", f"{db_time_ms:.2f}ms".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_queries.reset(token)
+            report = build_report(queries)
+            report.update({
+                "id": uuid.uuid4().hex,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_label(scope),
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                "started_at": datetime.utcnow().isoformat(),
+            })
+            _history.append(report)
+            if report["n_plus_one"]:
+                shapes = ", ".join(f"{g['count']}x {g['shape'][:80]}" for g in report["repeated"])
+                logger.warning(f"Possible N+1 in {report['method']} {report['route']}: {shapes}")
+
+
+def setup_profiler(app):
+    if not PROFILER_ENABLED:
+        return False
+    add_backend_listener(_record_query)
+    app.add_middleware(QueryProfilerMiddleware)
+    logger.info("Query profiler enabled")
+    return True
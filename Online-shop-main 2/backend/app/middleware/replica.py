@@ -0,0 +1,36 @@
+import time
+import logging
+from backend.app.db.replica import REPLICA_URL, REPLICA_STICKY_SECONDS, STICKY_COOKIE
+
+logger = logging.getLogger(__name__)
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class ReadYourWritesMiddleware:
+    # После успешной записи клиент получает cookie с моментом, до которого его чтения идут в основную базу:
+    # реплика могла ещё не получить только что сделанное изменение
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + REPLICA_STICKY_SECONDS
+                cookie = f"{STICKY_COOKIE}={until:.3f}; Max-Age={REPLICA_STICKY_SECONDS}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+def setup_replica_routing(app):
+    if not REPLICA_URL:
+        return False
+    app.add_middleware(ReadYourWritesMiddleware)
+    logger.info("Read replica routing enabled")
+    return True
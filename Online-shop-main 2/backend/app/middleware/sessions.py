@@ -0,0 +1,59 @@
+import logging
+from starlette.requests import Request
+from starlette.responses import Response
+from backend.app.services.sessions import (
+    SESSION_MODE, ACCESS_COOKIE, REFRESH_COOKIE, decode_token, refresh_access_token, set_session_cookies
+)
+
+logger = logging.getLogger(__name__)
+
+SKIP_PREFIXES = ("/static", "/metrics", "/health")
+
+
+class SessionRefreshMiddleware:
+    # Истёкший access-токен при живом refresh обновляется прозрачно: запрос идёт дальше уже с новым,
+    # а браузер получает его в Set-Cookie того же ответа
+    def __init__(self, app, redis_client):
+        self.app = app
+        self.redis = redis_client
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(SKIP_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        cookies = Request(scope).cookies
+        refresh_token = cookies.get(REFRESH_COOKIE)
+        access = cookies.get(ACCESS_COOKIE)
+        if not refresh_token or (access and decode_token(access, "access") is not None):
+            await self.app(scope, receive, send)
+            return
+        try:
+            access = await refresh_access_token(self.redis, refresh_token)
+        except Exception as e:
+            logger.error(f"Session refresh failed: {str(e)}")
+            access = None
+        if access is None:
+            await self.app(scope, receive, send)
+            return
+
+        cookies[ACCESS_COOKIE] = access
+        cookie_header = "; ".join(f"{name}={value}" for name, value in cookies.items()).encode()
+        scope = {**scope, "headers": [*(h for h in scope["headers"] if h[0] != b"cookie"), (b"cookie", cookie_header)]}
+        carrier = Response()
+        set_session_cookies(carrier, access)
+        set_cookie = [header for header in carrier.raw_headers if header[0] == b"set-cookie"]
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), *set_cookie]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+def setup_sessions(app, redis_client):
+    if SESSION_MODE != "token":
+        return False
+    app.add_middleware(SessionRefreshMiddleware, redis_client=redis_client)
+    logger.info("Signed token sessions enabled")
+    return True
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, ForeignKey, CheckConstraint
 from sqlalchemy import Numeric as Decimal
 from sqlalchemy.orm import relationship
 from backend.app.db.postgres import Base
@@ -39,10 +39,20 @@ class Product(Base):
     stock_quantity = Column(Integer, default=0)
     image = Column(String(255))
     category_id = Column(Integer, ForeignKey('categories.id'))
+    # Растёт при каждой правке цены или остатка админом; массовое обновление сверяет её для защиты от гонок
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     category = relationship("Category", back_populates="products")
     order_items = relationship("OrderItem", back_populates="product")
     reviews = relationship("Review", back_populates="product")
 
+# Доли остатка товара (services/inventory.py): заказы списывают с разных строк, а не с одной строки products
+class StockShard(Base):
+    __tablename__ = 'product_stock_shards'
+    __table_args__ = (CheckConstraint("quantity >= 0", name="ck_product_stock_shards_quantity"),)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+
 class Customer(Base):
     __tablename__ = 'customers'
     id = Column(Integer, primary_key=True, index=True)
@@ -69,4 +79,44 @@ class Admin(Base):
     __tablename__ = 'admins'
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(100), unique=True, nullable=False)
-    password = Column(String(255), nullable=False)
\ No newline at end of file
+    password = Column(String(255), nullable=False)
+
+# Продажи, ещё не свёрнутые в дневные агрегаты: заказ только дописывает сюда строки,
+# фоновый агрегатор переносит их в sales_daily* и удаляет
+class SalesDelta(Base):
+    __tablename__ = 'sales_deltas'
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    order_id = Column(Integer, nullable=False)
+    product_id = Column(Integer, nullable=False)
+    category_id = Column(Integer)
+    revenue = Column(Decimal(14, 2), nullable=False)
+    units = Column(Integer, nullable=False)
+    # Вклад строки в счётчики заказов (+1, -1 при отмене, 0): заказ учитывается один раз на день и на категорию
+    orders = Column(Integer, nullable=False, default=0)
+    day_orders = Column(Integer, nullable=False, default=0)
+    category_orders = Column(Integer, nullable=False, default=0)
+
+# Дневные агрегаты продаж: их пополняет агрегатор из sales_deltas, пересчитывает rebuild_rollups
+class SalesDaily(Base):
+    __tablename__ = 'sales_daily'
+    day = Column(Date, primary_key=True)
+    revenue = Column(Decimal(14, 2), nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    orders = Column(Integer, nullable=False, default=0)
+
+class SalesDailyProduct(Base):
+    __tablename__ = 'sales_daily_products'
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, primary_key=True, index=True)
+    revenue = Column(Decimal(14, 2), nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    orders = Column(Integer, nullable=False, default=0)
+
+class SalesDailyCategory(Base):
+    __tablename__ = 'sales_daily_categories'
+    day = Column(Date, primary_key=True)
+    category_id = Column(Integer, primary_key=True, index=True)
+    revenue = Column(Decimal(14, 2), nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    orders = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from datetime import date
+from typing import Optional
+from backend.app.schemas.money import Money
+
+class DailySales(BaseModel):
+    day: date
+    revenue: Money
+    units: int
+    orders: int
+
+class ProductSales(BaseModel):
+    product_id: int
+    name: Optional[str] = None
+    revenue: Money
+    units: int
+    orders: int
+
+class CategorySales(BaseModel):
+    category_id: int
+    name: Optional[str] = None
+    revenue: Money
+    units: int
+    orders: int
@@ -1,10 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List
+from backend.app.schemas.money import Money
 
 class CartItem(BaseModel):
     product_id: int
-    quantity: int
-    price: float
+    quantity: int = Field(..., ge=1)
+    price: Money
 
 class CartCreate(BaseModel):
     customer_id: str
@@ -0,0 +1,6 @@
+from decimal import Decimal
+from typing import Annotated
+from pydantic import PlainSerializer
+
+# Денежные суммы внутри приложения — Decimal, как Numeric(10, 2) в базе; в JSON по-прежнему число
+Money = Annotated[Decimal, PlainSerializer(float, return_type=float, when_used="json")]
@@ -1,11 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import List, Optional
+from backend.app.schemas.money import Money
 
 class OrderItemBase(BaseModel):
     product_id: int
     quantity: int
-    price: float
+    price: Money
 
 class OrderCreate(BaseModel):
     customer_id: int
@@ -15,9 +16,38 @@ class OrderOut(BaseModel):
     id: int
     customer_id: int
     order_date: datetime
-    total_amount: float
+    total_amount: Money
     status: str
     items: List[OrderItemBase] = []
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class OrderQueueItem(BaseModel):
+    id: int
+    customer_id: int
+    order_date: datetime
+    total_amount: Money
+    status: str
+
+
+class OrderQueuePage(BaseModel):
+    items: List[OrderQueueItem]
+    next_cursor: Optional[str] = None
+
+
+class OrderStatusUpdate(BaseModel):
+    order_ids: List[int] = Field(..., min_length=1)
+    status: str
+
+
+class OrderTransitionRejection(BaseModel):
+    id: int
+    status: str
+
+
+class OrderTransitionResult(BaseModel):
+    status: str
+    updated: List[int]
+    rejected: List[OrderTransitionRejection]
+    not_found: List[int]
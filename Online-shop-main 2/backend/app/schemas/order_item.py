@@ -1,22 +1,23 @@
 from pydantic import BaseModel
 from typing import Optional
+from backend.app.schemas.money import Money
 
 class OrderItemIn(BaseModel):
     order_id: int
     product_id: int
     quantity: int
-    price: float
+    price: Money
 
 class OrderItemUpdate(BaseModel):
     quantity: Optional[int] = None
-    price: Optional[float] = None
+    price: Optional[Money] = None
 
 class OrderItemOut(BaseModel):
     id: int
     order_id: int
     product_id: int
     quantity: int
-    price: float
+    price: Money
 
     class Config:
         from_attributes = True
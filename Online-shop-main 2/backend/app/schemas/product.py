@@ -1,10 +1,11 @@
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl
 from typing import Optional, List
 from backend.app.schemas.promotion import PromotionOut
+from backend.app.schemas.money import Money
 
 class ProductBase(BaseModel):
     name: str
-    price: float
+    price: Money
     category_id: int
     stock_quantity: int = 0
     image: Optional[str] = None
@@ -15,7 +16,7 @@ class ProductIn(ProductBase):
 
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
-    price: Optional[float] = None
+    price: Optional[Money] = None
     category_id: Optional[int] = None
     stock_quantity: Optional[int] = None
     image: Optional[HttpUrl] = None
@@ -25,7 +26,7 @@ class ProductUpdate(BaseModel):
 class ProductOut(BaseModel):
     id: int
     name: str
-    price: float
+    price: Money
     category_id: int
     stock_quantity: int
     image: Optional[str]
@@ -35,3 +36,24 @@ class ProductOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+class ProductBulkChange(BaseModel):
+    id: int
+    price: Optional[Money] = Field(None, ge=0, max_digits=10, decimal_places=2)
+    stock_quantity: Optional[int] = Field(None, ge=0)
+    # Ожидаемая версия товара: если его уже изменили, строка вернётся как conflict
+    version: Optional[int] = None
+
+class ProductBulkUpdate(BaseModel):
+    changes: List[ProductBulkChange] = Field(..., min_length=1)
+
+class ProductBulkResult(BaseModel):
+    id: int
+    status: str
+    price: Optional[Money] = None
+    stock_quantity: Optional[int] = None
+    version: Optional[int] = None
+
+class ProductBulkReport(BaseModel):
+    updated: int
+    results: List[ProductBulkResult]
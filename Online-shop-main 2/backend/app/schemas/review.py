@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 class ReviewIn(BaseModel):
@@ -21,3 +21,9 @@ class ReviewOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+class ReviewPage(BaseModel):
+    items: List[ReviewOut]
+    next_cursor: Optional[str] = None
+    average_rating: Optional[float] = None
+    review_count: Optional[int] = None
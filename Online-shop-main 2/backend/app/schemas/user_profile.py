@@ -16,3 +16,27 @@ class UserProfileOut(UserProfileBase):
 
 class UserProfileUpdate(BaseModel):
     preferences: Optional[Dict] = None
+
+
+class WishlistPage(BaseModel):
+    items: List[int]
+    offset: int
+    limit: int
+    has_more: bool
+
+
+class WishlistProduct(BaseModel):
+    id: int
+    name: str
+    price: float
+    image: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class WishlistProductsPage(BaseModel):
+    items: List[WishlistProduct]
+    offset: int
+    limit: int
+    has_more: bool
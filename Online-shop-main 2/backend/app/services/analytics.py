@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import func, delete, insert, cast, Date
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from backend.app.models.postgres_models import (
+    Order, OrderItem, Product, Category, SalesDaily, SalesDailyProduct, SalesDailyCategory, SalesDelta
+)
+
+logger = logging.getLogger(__name__)
+
+# Как часто и какими порциями sales_deltas сворачиваются в дневные агрегаты; /analytics отстаёт не больше интервала
+AGGREGATE_INTERVAL = float(os.getenv("SALES_AGGREGATE_INTERVAL", 5))
+AGGREGATE_BATCH = int(os.getenv("SALES_AGGREGATE_BATCH", 5000))
+
+
+def _dialect(db: AsyncSession) -> str:
+    return db.bind.dialect.name if db.bind is not None else "postgresql"
+
+
+def _insert(db: AsyncSession, table):
+    # ON CONFLICT есть и в Postgres, и в SQLite (нагрузочные тесты), но конструкторы у диалектов свои
+    return (sqlite.insert if _dialect(db) == "sqlite" else postgresql.insert)(table)
+
+
+async def _upsert(db: AsyncSession, model, key_columns: list[str], rows: list[dict]):
+    if not rows:
+        return
+    stmt = _insert(db, model.__table__).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={
+            "revenue": model.__table__.c.revenue + stmt.excluded.revenue,
+            "units": model.__table__.c.units + stmt.excluded.units,
+            "orders": model.__table__.c.orders + stmt.excluded.orders,
+        }
+    )
+    await db.execute(stmt)
+
+
+def sales_delta_rows(order_id: int, order_date: datetime, lines: list[dict], sign: int = 1) -> list[dict]:
+    # lines: [{"product_id", "category_id", "quantity", "revenue"}] одного заказа, по строке на товар;
+    # sign=-1 — отмена заказа, строки вычитаются из агрегатов
+    day = order_date.date()
+    rows, categories = [], set()
+    for index, line in enumerate(lines):
+        category_id = line.get("category_id")
+        first_in_category = category_id is not None and category_id not in categories
+        categories.add(category_id)
+        rows.append({
+            "day": day,
+            "order_id": order_id,
+            "product_id": line["product_id"],
+            "category_id": category_id,
+            "revenue": sign * Decimal(line["revenue"]),
+            "units": sign * line["quantity"],
+            "orders": sign,
+            "day_orders": sign if index == 0 else 0,
+            "category_orders": sign if first_in_category else 0,
+        })
+    return rows
+
+
+async def record_sales_deltas(db: AsyncSession, rows: list[dict]):
+    # Только INSERT новых строк: транзакция заказа не трогает общие строки агрегатов и не ждёт их блокировок
+    if rows:
+        await db.execute(insert(SalesDelta), rows)
+
+
+def _add(totals: dict, key, revenue: Decimal, units: int, orders: int):
+    row = totals.setdefault(key, {"revenue": Decimal(0), "units": 0, "orders": 0})
+    row["revenue"] += revenue
+    row["units"] += units
+    row["orders"] += orders
+
+
+async def aggregate_sales(db: AsyncSession, batch: int = AGGREGATE_BATCH) -> int:
+    # Забираем порцию дельт (SKIP LOCKED: агрегаторы разных воркеров берут разные строки), сворачиваем
+    # в памяти и пишем в агрегаты по одному upsert на ключ — в той же транзакции, что и удаление дельт
+    claimed = select(SalesDelta.id).order_by(SalesDelta.id).limit(batch).with_for_update(skip_locked=True)
+    result = await db.execute(
+        delete(SalesDelta).where(SalesDelta.id.in_(claimed))
+        .returning(SalesDelta.day, SalesDelta.product_id, SalesDelta.category_id, SalesDelta.revenue,
+                   SalesDelta.units, SalesDelta.orders, SalesDelta.day_orders, SalesDelta.category_orders)
+        .execution_options(synchronize_session=False)
+    )
+    rows = result.all()
+    if not rows:
+        await db.rollback()
+        return 0
+    daily, products, categories = {}, {}, {}
+    for row in rows:
+        revenue = Decimal(row.revenue)
+        _add(daily, row.day, revenue, row.units, row.day_orders)
+        _add(products, (row.day, row.product_id), revenue, row.units, row.orders)
+        if row.category_id is not None:
+            _add(categories, (row.day, row.category_id), revenue, row.units, row.category_orders)
+
+    def changed(totals: dict) -> list:
+        # Заказ и его отмена в одной порции дают нули — такие ключи не трогаем
+        return [(key, values) for key, values in sorted(totals.items()) if any(values.values())]
+
+    await _upsert(db, SalesDaily, ["day"], [{"day": day, **values} for day, values in changed(daily)])
+    await _upsert(db, SalesDailyProduct, ["day", "product_id"], [
+        {"day": day, "product_id": product_id, **values} for (day, product_id), values in changed(products)
+    ])
+    await _upsert(db, SalesDailyCategory, ["day", "category_id"], [
+        {"day": day, "category_id": category_id, **values} for (day, category_id), values in changed(categories)
+    ])
+    if any(row.units < 0 for row in rows):
+        # После отмен строка агрегата может обнулиться — удаляем её, как её не создал бы и rebuild_rollups
+        days = sorted({row.day for row in rows if row.units < 0})
+        for model in (SalesDaily, SalesDailyProduct, SalesDailyCategory):
+            await db.execute(delete(model).where(model.day.in_(days), model.revenue == 0, model.units == 0,
+                                                 model.orders == 0))
+    await db.commit()
+    return len(rows)
+
+
+class SalesAggregator:
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(AGGREGATE_INTERVAL)
+            try:
+                async with self.session_factory() as db:
+                    # Полная порция — значит, есть ещё: досворачиваем без паузы
+                    while await aggregate_sales(db) == AGGREGATE_BATCH:
+                        pass
+            except Exception as e:
+                logger.error(f"Sales aggregation failed: {str(e)}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def rebuild_rollups(db: AsyncSession, since: date | None = None):
+    # Полный пересчёт из orders/order_items: для начального заполнения и после ручных правок истории
+    if _dialect(db) == "postgresql":
+        # Один снимок на всю пересборку: заказ, зафиксированный между удалением дельт и выборкой заказов,
+        # не посчитается дважды
+        await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    order_day = func.date(Order.order_date) if _dialect(db) == "sqlite" else cast(Order.order_date, Date)
+    # Несвёрнутые дельты уже отражены в orders; удаляются первыми, чтобы дождаться идущего агрегатора
+    stmt = delete(SalesDelta)
+    if since:
+        stmt = stmt.where(SalesDelta.day >= since)
+    await db.execute(stmt)
+    for model in (SalesDaily, SalesDailyProduct, SalesDailyCategory):
+        stmt = delete(model)
+        if since:
+            stmt = stmt.where(model.day >= since)
+        await db.execute(stmt)
+
+    line_revenue = OrderItem.price * OrderItem.quantity
+    # Отменённые заказы не считаются — так же, как их вычитает из агрегатов отмена в очереди выполнения
+    filters = [Order.status != "cancelled", *([order_day >= since] if since else [])]
+
+    daily = (
+        select(order_day.label("day"), func.sum(line_revenue), func.sum(OrderItem.quantity),
+               func.count(func.distinct(Order.id)))
+        .join(OrderItem, OrderItem.order_id == Order.id).where(*filters).group_by(order_day)
+    )
+    by_product = (
+        select(order_day.label("day"), OrderItem.product_id, func.sum(line_revenue), func.sum(OrderItem.quantity),
+               func.count(func.distinct(Order.id)))
+        .join(OrderItem, OrderItem.order_id == Order.id).where(*filters).group_by(order_day, OrderItem.product_id)
+    )
+    by_category = (
+        select(order_day.label("day"), Product.category_id, func.sum(line_revenue), func.sum(OrderItem.quantity),
+               func.count(func.distinct(Order.id)))
+        .join(OrderItem, OrderItem.order_id == Order.id).join(Product, Product.id == OrderItem.product_id)
+        .where(Product.category_id.is_not(None), *filters).group_by(order_day, Product.category_id)
+    )
+    columns = ["revenue", "units", "orders"]
+    await db.execute(SalesDaily.__table__.insert().from_select(["day", *columns], daily))
+    await db.execute(SalesDailyProduct.__table__.insert().from_select(["day", "product_id", *columns], by_product))
+    await db.execute(SalesDailyCategory.__table__.insert().from_select(["day", "category_id", *columns], by_category))
+    await db.commit()
+    logger.info(f"Sales rollups rebuilt since {since or 'the beginning'}")
+
+
+async def revenue_by_day(db: AsyncSession, date_from: date, date_to: date) -> list[dict]:
+    result = await db.execute(
+        select(SalesDaily).where(SalesDaily.day >= date_from, SalesDaily.day <= date_to).order_by(SalesDaily.day)
+    )
+    return [
+        {"day": row.day, "revenue": row.revenue, "units": row.units, "orders": row.orders}
+        for row in result.scalars().all()
+    ]
+
+
+async def top_products(db: AsyncSession, date_from: date, date_to: date, by: str = "revenue",
+                       limit: int = 10) -> list[dict]:
+    revenue = func.sum(SalesDailyProduct.revenue).label("revenue")
+    units = func.sum(SalesDailyProduct.units).label("units")
+    orders = func.sum(SalesDailyProduct.orders).label("orders")
+    stmt = (
+        select(SalesDailyProduct.product_id, Product.name, revenue, units, orders)
+        .join(Product, Product.id == SalesDailyProduct.product_id, isouter=True)
+        .where(SalesDailyProduct.day >= date_from, SalesDailyProduct.day <= date_to)
+        .group_by(SalesDailyProduct.product_id, Product.name)
+        .order_by((units if by == "units" else revenue).desc())
+        .limit(limit)
+    )
+    result = await db.execute(stmt)
+    return [dict(row._mapping) for row in result.all()]
+
+
+async def sales_by_category(db: AsyncSession, date_from: date, date_to: date) -> list[dict]:
+    revenue = func.sum(SalesDailyCategory.revenue).label("revenue")
+    stmt = (
+        select(SalesDailyCategory.category_id, Category.name, revenue,
+               func.sum(SalesDailyCategory.units).label("units"), func.sum(SalesDailyCategory.orders).label("orders"))
+        .join(Category, Category.id == SalesDailyCategory.category_id, isouter=True)
+        .where(SalesDailyCategory.day >= date_from, SalesDailyCategory.day <= date_to)
+        .group_by(SalesDailyCategory.category_id, Category.name)
+        .order_by(revenue.desc())
+    )
+    result = await db.execute(stmt)
+    return [dict(row._mapping) for row in result.all()]
+
+
+async def main(argv: list[str]) -> int:
+    from backend.app.db.postgres import AsyncSessionLocal
+    if not argv or argv[0] != "rebuild":
+        logger.error("Usage: python -m backend.app.services.analytics rebuild [YYYY-MM-DD]")
+        return 2
+    since = date.fromisoformat(argv[1]) if len(argv) > 1 else None
+    async with AsyncSessionLocal() as db:
+        await rebuild_rollups(db, since)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
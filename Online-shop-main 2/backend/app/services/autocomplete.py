@@ -0,0 +1,222 @@
+import asyncio
+import os
+import re
+import sys
+import logging
+import unicodedata
+from collections import defaultdict
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from backend.app.db.redis import POPULAR_KEY
+from backend.app.models.postgres_models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+# Подсказки поиска: на каждый префикс нормализованного названия — sorted set записей «тип:id:название»,
+# вес — популярность из popular_products (у категории — сумма по её товарам).
+# Ответ на ввод — один ZREVRANGE по ключу префикса, без обращения к Postgres
+PREFIX_KEY = "autocomplete:prefix:{prefix}"
+# Запись (p:42, c:7) -> член sorted set'ов: по нему при правке и удалении находятся старые префиксы
+ENTRIES_KEY = "autocomplete:entries"
+MIN_PREFIX = int(os.getenv("AUTOCOMPLETE_MIN_PREFIX", 2))
+MAX_PREFIX = int(os.getenv("AUTOCOMPLETE_MAX_PREFIX", 15))
+SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+# Запрос длиннее MAX_PREFIX: берём из индекса с запасом и досматриваем полное совпадение
+LONG_QUERY_OVERFETCH = 5
+PIPELINE_BATCH = 1000
+
+PRODUCT_ENTRY = "p"
+CATEGORY_ENTRY = "c"
+ENTRY_TYPES = {PRODUCT_ENTRY: "product", CATEGORY_ENTRY: "category"}
+
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold().replace("ё", "е")
+    return " ".join(_SEPARATORS.sub(" ", text).split())
+
+
+def prefixes(name: str) -> set[str]:
+    # Префиксы от начала каждого слова: «чехол для iphone» находится и по «iph»
+    normalized = normalize(name)
+    result = set()
+    for start in [0] + [match.end() for match in re.finditer(" ", normalized)]:
+        tail = normalized[start:start + MAX_PREFIX]
+        result.update(tail[:end] for end in range(MIN_PREFIX, len(tail) + 1) if not tail[:end].endswith(" "))
+    return result
+
+
+def _member(kind: str, entry_id: int, name: str) -> str:
+    return f"{kind}:{entry_id}:{name.strip()}"
+
+
+def _label(member: str) -> str:
+    return member.split(":", 2)[2]
+
+
+def _parse(member: str) -> dict:
+    kind, entry_id, name = member.split(":", 2)
+    return {"type": ENTRY_TYPES[kind], "id": int(entry_id), "name": name}
+
+
+def _matches(member: str, query: str) -> bool:
+    return f" {query}" in f" {normalize(_label(member))}"
+
+
+async def suggest(redis: Redis, query: str, limit: int = SUGGEST_LIMIT) -> list[dict]:
+    query = normalize(query)
+    if len(query) < MIN_PREFIX:
+        return []
+    key = PREFIX_KEY.format(prefix=query[:MAX_PREFIX])
+    long_query = len(query) > MAX_PREFIX
+    try:
+        members = await redis.zrevrange(key, 0, limit * (LONG_QUERY_OVERFETCH if long_query else 1) - 1)
+    except Exception as e:
+        # Без Redis поле поиска просто работает без подсказок
+        logger.error(f"Redis error in suggest: {str(e)}")
+        return []
+    if long_query:
+        members = [member for member in members if _matches(member, query)][:limit]
+    return [_parse(member) for member in members]
+
+
+async def _replace(redis: Redis, kind: str, entry_id: int, name: str | None, score: float = 0):
+    # Старые префиксы убираются и новые добавляются в одном MULTI — читатель не увидит пустого окна.
+    # Гонку двух одновременных правок одной записи чинит rebuild
+    entry = f"{kind}:{entry_id}"
+    old = await redis.hget(ENTRIES_KEY, entry)
+    pipe = redis.pipeline(transaction=True)
+    if old:
+        for prefix in prefixes(_label(old)):
+            pipe.zrem(PREFIX_KEY.format(prefix=prefix), old)
+    if name is None:
+        pipe.hdel(ENTRIES_KEY, entry)
+    else:
+        member = _member(kind, entry_id, name)
+        for prefix in prefixes(name):
+            pipe.zadd(PREFIX_KEY.format(prefix=prefix), {member: score})
+        pipe.hset(ENTRIES_KEY, entry, member)
+    await pipe.execute()
+
+
+async def index_product(redis: Redis, product_id: int, name: str):
+    try:
+        score = await redis.zscore(POPULAR_KEY, str(product_id))
+        await _replace(redis, PRODUCT_ENTRY, product_id, name, score or 0)
+    except Exception as e:
+        # Запись в базу уже зафиксирована; подсказки догонит rebuild
+        logger.error(f"Redis error in index_product {product_id}: {str(e)}")
+
+
+async def index_category(db: AsyncSession, redis: Redis, category_id: int, name: str):
+    # Вес категории пересчитывается при её правке и при rebuild, просмотры товаров его не двигают
+    try:
+        result = await db.execute(select(Product.id).where(Product.category_id == category_id))
+        product_ids = [str(product_id) for product_id in result.scalars().all()]
+        scores = await redis.zmscore(POPULAR_KEY, product_ids) if product_ids else []
+        await _replace(redis, CATEGORY_ENTRY, category_id, name, sum(score or 0 for score in scores))
+    except Exception as e:
+        logger.error(f"Redis error in index_category {category_id}: {str(e)}")
+
+
+async def remove_entry(redis: Redis, kind: str, entry_id: int):
+    try:
+        await _replace(redis, kind, entry_id, None)
+    except Exception as e:
+        logger.error(f"Redis error in remove_entry {kind}:{entry_id}: {str(e)}")
+
+
+async def bump_product(redis: Redis, product_id: int, amount: float = 1):
+    # Просмотр товара сдвигает его вес во всех префиксах вслед за popular_products.
+    # ZADD XX: если товар успели удалить, запись не воскреснет
+    try:
+        member = await redis.hget(ENTRIES_KEY, f"{PRODUCT_ENTRY}:{product_id}")
+        if not member:
+            return
+        pipe = redis.pipeline(transaction=False)
+        for prefix in prefixes(_label(member)):
+            pipe.zadd(PREFIX_KEY.format(prefix=prefix), {member: amount}, xx=True, incr=True)
+        await pipe.execute()
+    except Exception as e:
+        logger.error(f"Redis error in bump_product {product_id}: {str(e)}")
+
+
+async def _run_pipeline(redis: Redis, commands):
+    pipe = redis.pipeline(transaction=False)
+    pending = 0
+    for command, args in commands:
+        getattr(pipe, command)(*args)
+        pending += 1
+        if pending >= PIPELINE_BATCH:
+            await pipe.execute()
+            pending = 0
+    if pending:
+        await pipe.execute()
+
+
+async def rebuild_index(db: AsyncSession, redis: Redis) -> dict:
+    # Полная пересборка из Postgres и popular_products: первичное наполнение и починка после сбоев Redis
+    popularity = {member: score for member, score in await redis.zrange(POPULAR_KEY, 0, -1, withscores=True)}
+    index: dict[str, dict[str, float]] = defaultdict(dict)
+    entries: dict[str, str] = {}
+
+    def add(kind: str, entry_id: int, name: str, score: float):
+        member = _member(kind, entry_id, name)
+        entries[f"{kind}:{entry_id}"] = member
+        for prefix in prefixes(name):
+            index[PREFIX_KEY.format(prefix=prefix)][member] = score
+
+    category_weights: dict[int, float] = defaultdict(float)
+    result = await db.execute(select(Product.id, Product.name, Product.category_id))
+    for product_id, name, category_id in result.all():
+        score = popularity.get(str(product_id), 0)
+        category_weights[category_id] += score
+        add(PRODUCT_ENTRY, product_id, name, score)
+    result = await db.execute(select(Category.id, Category.name))
+    for category_id, name in result.all():
+        add(CATEGORY_ENTRY, category_id, name, category_weights[category_id])
+
+    # Ключ заменяется целиком (DELETE + ZADD подряд в одном пакете); ключи префиксов, которых больше нет, удаляются
+    await _run_pipeline(redis, (
+        command for key, members in index.items() for command in (("delete", (key,)), ("zadd", (key, members)))
+    ))
+    stale = [key async for key in redis.scan_iter(match=PREFIX_KEY.format(prefix="*"), count=PIPELINE_BATCH)
+             if key not in index]
+    await _run_pipeline(redis, (("delete", (key,)) for key in stale))
+    await redis.delete(ENTRIES_KEY)
+    if entries:
+        await redis.hset(ENTRIES_KEY, mapping=entries)
+    stats = {"entries": len(entries), "prefixes": len(index), "stale_prefixes": len(stale)}
+    logger.info(f"Autocomplete index rebuilt: {stats}")
+    return stats
+
+
+async def ensure_index(session_factory, redis: Redis):
+    # Первый старт или пустой Redis: индекс собирается сам, дальше его ведут правки товаров и категорий
+    try:
+        if await redis.exists(ENTRIES_KEY):
+            return
+        async with session_factory() as db:
+            await rebuild_index(db, redis)
+    except Exception as e:
+        logger.error(f"Autocomplete index build failed: {str(e)}")
+
+
+async def main(argv: list[str]) -> int:
+    from backend.app.db.postgres import AsyncSessionLocal
+    from backend.app.db.redis import redis_client
+    if argv != ["rebuild"]:
+        logger.error("Usage: python -m backend.app.services.autocomplete rebuild")
+        return 2
+    async with AsyncSessionLocal() as db:
+        await rebuild_index(db, redis_client)
+    await redis_client.aclose()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main(sys.argv[1:])))
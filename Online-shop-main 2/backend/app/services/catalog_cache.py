@@ -0,0 +1,128 @@
+import asyncio
+import os
+import time
+import logging
+from typing import Any, Awaitable, Callable
+from pymongo.database import Database
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from backend.app.db.mongo import get_all_promotions
+from backend.app.models.postgres_models import Category, Product
+from backend.app.schemas.category import CategoryResponse
+from backend.app.services.invalidation import invalidation_bus
+from backend.app.services.inventory import available_stock
+
+logger = logging.getLogger(__name__)
+
+# Справочные данные и карточки товаров, которые читает почти каждая страница, держим в памяти воркера.
+# Изменения рассылаются всем воркерам через шину инвалидации (services/invalidation.py); TTL — страховка
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", 300))
+HOME_FEED_SIZE = 4
+
+CATEGORIES = "categories"
+PROMOTIONS = "promotions"
+HOME_FEED = "home_feed"
+PRODUCT_KEY = "product:{product_id}"
+
+# Сущности, изменения которых рассылаются по шине
+PRODUCT = "product"
+CATEGORY = "category"
+PROMOTION = "promotion"
+
+
+class LocalCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: dict[str, tuple[Any, float]] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        # Номер сброса на ключ: загрузка, начатая до сброса, не кладёт в кеш устаревшее значение
+        self._generations: dict[str, int] = {}
+        self._epoch = 0
+
+    def _fresh(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry
+        return None
+
+    async def get(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._fresh(key)
+        if entry is not None:
+            return entry[0]
+        # Одновременные промахи по одному ключу ждут одну загрузку, а не идут в базу каждый
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            entry = self._fresh(key)
+            if entry is not None:
+                return entry[0]
+            generation = (self._epoch, self._generations.get(key, 0))
+            value = await loader()
+            if generation == (self._epoch, self._generations.get(key, 0)):
+                self._entries[key] = (value, time.monotonic() + self.ttl)
+            return value
+
+    def invalidate(self, *keys: str):
+        if not keys:
+            self._entries.clear()
+            self._epoch += 1
+        for key in keys:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def invalidate_prefix(self, prefix: str):
+        self.invalidate(*[key for key in self._entries if key.startswith(prefix)])
+
+
+catalog_cache = LocalCache(CATALOG_CACHE_TTL)
+
+
+def evict(entity: str | None, ids: list[int] | None = None):
+    # Какие ключи зависят от сущности; entity=None — сбросить всё (пропущены события шины)
+    if entity is None:
+        catalog_cache.invalidate()
+    elif entity == CATEGORY:
+        catalog_cache.invalidate(CATEGORIES)
+    elif entity == PROMOTION:
+        catalog_cache.invalidate(PROMOTIONS)
+    elif entity == PRODUCT:
+        catalog_cache.invalidate(HOME_FEED)
+        if ids is None:
+            catalog_cache.invalidate_prefix(PRODUCT_KEY.format(product_id=""))
+        else:
+            catalog_cache.invalidate(*[PRODUCT_KEY.format(product_id=product_id) for product_id in ids])
+
+
+invalidation_bus.register(evict)
+
+
+async def get_cached_categories(db: AsyncSession) -> list[dict]:
+    async def load():
+        result = await db.execute(select(Category).order_by(Category.id))
+        return [CategoryResponse.model_validate(category).model_dump() for category in result.scalars().all()]
+    return await catalog_cache.get(CATEGORIES, load)
+
+
+async def get_cached_promotions(mongo_db: Database) -> list[dict]:
+    async def load():
+        return await asyncio.to_thread(get_all_promotions, mongo_db)
+    return await catalog_cache.get(PROMOTIONS, load)
+
+
+async def get_home_feed(db: AsyncSession) -> list[dict]:
+    async def load():
+        result = await db.execute(
+            select(Product.id, Product.name, Product.price, Product.image).order_by(Product.id).limit(HOME_FEED_SIZE)
+        )
+        return [dict(row._mapping) for row in result]
+    return await catalog_cache.get(HOME_FEED, load)
+
+
+async def get_product_card(db: AsyncSession, product_id: int) -> dict | None:
+    async def load():
+        result = await db.execute(
+            select(Product.id, Product.name, Product.price, available_stock().label("stock_quantity"), Product.image,
+                   Product.category_id)
+            .where(Product.id == product_id)
+        )
+        row = result.first()
+        return dict(row._mapping) if row else None
+    return await catalog_cache.get(PRODUCT_KEY.format(product_id=product_id), load)
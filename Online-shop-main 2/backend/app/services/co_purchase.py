@@ -0,0 +1,246 @@
+import asyncio
+import json
+import os
+import sys
+import logging
+from datetime import datetime, timedelta
+import numpy as np
+from scipy import sparse
+from redis.asyncio import Redis
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from backend.app.models.postgres_models import Order, OrderItem, Product
+from backend.app.services.recommendations import RECOMMENDATIONS_KEY, PAIRS_KEY, ORDERS_KEY, WATERMARK_KEY
+
+logger = logging.getLogger(__name__)
+
+TOP_K = int(os.getenv("FBT_TOP_K", 8))
+# Пары, купленные вместе реже этого числа заказов, в рекомендации не попадают
+MIN_SUPPORT = int(os.getenv("FBT_MIN_SUPPORT", 2))
+CHUNK_ORDERS = int(os.getenv("FBT_CHUNK_ORDERS", 5000))
+# Заказы моложе этого окна ждут следующего запуска: id выдаются до коммита, и более ранний
+# заказ может зафиксироваться после более позднего — водяной знак не должен его перепрыгнуть
+SETTLE_SECONDS = int(os.getenv("FBT_SETTLE_SECONDS", 60))
+EXCLUDED_STATUSES = ("cancelled",)
+PIPELINE_BATCH = 1000
+
+
+async def _product_space(db: AsyncSession) -> int:
+    result = await db.execute(select(func.max(Product.id), select(func.max(OrderItem.product_id)).scalar_subquery()))
+    max_product, max_ordered = result.one()
+    return max(max_product or 0, max_ordered or 0) + 1
+
+
+async def _order_chunks(db: AsyncSession, after_order_id: int, settled_before: datetime):
+    # Чанки по целым заказам: пары внутри заказа не должны разрываться границей чанка
+    while True:
+        result = await db.execute(
+            select(Order.id).where(Order.id > after_order_id, Order.order_date <= settled_before)
+            .order_by(Order.id).limit(CHUNK_ORDERS)
+        )
+        order_ids = result.scalars().all()
+        if not order_ids:
+            return
+        result = await db.execute(
+            select(OrderItem.order_id, OrderItem.product_id)
+            .join(Order, Order.id == OrderItem.order_id)
+            .where(Order.id.between(order_ids[0], order_ids[-1]), Order.status.notin_(EXCLUDED_STATUSES),
+                   OrderItem.product_id.is_not(None))
+        )
+        rows = np.array(result.all(), dtype=np.int64).reshape(-1, 2)
+        yield order_ids[-1], rows
+        after_order_id = order_ids[-1]
+
+
+def co_purchase_matrix(order_ids: np.ndarray, product_ids: np.ndarray, n_products: int):
+    # Матрица заказ × товар из нулей и единиц; B^T·B — сколько заказов содержат оба товара
+    _, order_index = np.unique(order_ids, return_inverse=True)
+    incidence = sparse.csr_matrix(
+        (np.ones(len(product_ids), dtype=np.int32), (order_index, product_ids)),
+        shape=(order_index.max() + 1 if len(order_index) else 0, n_products)
+    )
+    # Одинаковый товар двумя строками одного заказа считается одной покупкой
+    incidence.data[:] = 1
+    counts = np.asarray(incidence.sum(axis=0)).ravel()
+    co = (incidence.T @ incidence).tocsr()
+    co.setdiag(0)
+    co.eliminate_zeros()
+    return co, counts
+
+
+def _resize(matrix: sparse.csr_matrix, counts: np.ndarray, n_products: int):
+    if matrix.shape[0] < n_products:
+        matrix.resize((n_products, n_products))
+        counts = np.pad(counts, (0, n_products - len(counts)))
+    return matrix, counts
+
+
+async def _accumulate(db: AsyncSession, after_order_id: int):
+    n_products = await _product_space(db)
+    co = sparse.csr_matrix((n_products, n_products), dtype=np.int64)
+    counts = np.zeros(n_products, dtype=np.int64)
+    last_order_id, orders = after_order_id, 0
+    settled_before = datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+    async for last_order_id, rows in _order_chunks(db, after_order_id, settled_before):
+        if not len(rows):
+            continue
+        n_products = max(n_products, int(rows[:, 1].max()) + 1)
+        co, counts = _resize(co, counts, n_products)
+        chunk_co, chunk_counts = co_purchase_matrix(rows[:, 0], rows[:, 1], n_products)
+        co = co + chunk_co
+        counts = counts + chunk_counts
+        orders += len(np.unique(rows[:, 0]))
+    return co.tocsr(), counts, last_order_id, orders
+
+
+def top_neighbors(co: sparse.csr_matrix, counts: np.ndarray) -> dict[int, list[tuple[int, int, float]]]:
+    # Без цикла по строкам: сортировка всех пар по (товар, -частота) и ранг внутри строки
+    coo = co.tocoo()
+    keep = coo.data >= MIN_SUPPORT
+    rows, cols, values = coo.row[keep], coo.col[keep], coo.data[keep]
+    if not len(rows):
+        return {}
+    order = np.lexsort((cols, -values, rows))
+    rows, cols, values = rows[order], cols[order], values[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+    keep = rank < TOP_K
+    rows, cols, values = rows[keep], cols[keep], values[keep]
+    # Доля заказов с товаром A, в которых есть и B
+    confidence = values / np.maximum(counts[rows], 1)
+    neighbors: dict[int, list] = {}
+    for row, col, value, score in zip(rows.tolist(), cols.tolist(), values.tolist(), confidence.tolist()):
+        neighbors.setdefault(row, []).append((col, value, round(score, 4)))
+    return neighbors
+
+
+async def _product_cards(db: AsyncSession, product_ids: set[int]) -> dict[int, dict]:
+    cards, ids = {}, sorted(product_ids)
+    for start in range(0, len(ids), CHUNK_ORDERS):
+        result = await db.execute(
+            select(Product.id, Product.name, Product.image).where(Product.id.in_(ids[start:start + CHUNK_ORDERS]))
+        )
+        cards.update({row.id: {"product_id": row.id, "name": row.name, "image": row.image} for row in result.all()})
+    return cards
+
+
+async def _run_pipeline(redis: Redis, commands):
+    pipe = redis.pipeline(transaction=False)
+    pending = 0
+    for command, args in commands:
+        getattr(pipe, command)(*args)
+        pending += 1
+        if pending >= PIPELINE_BATCH:
+            await pipe.execute()
+            pending = 0
+    if pending:
+        await pipe.execute()
+
+
+async def _publish(db: AsyncSession, redis: Redis, neighbors: dict[int, list], product_ids):
+    # Карточки соседей кладутся в тот же JSON, чтобы странице товара хватало одного GET
+    cards = await _product_cards(db, {col for items in neighbors.values() for col, _, _ in items})
+
+    def commands():
+        for product_id in product_ids:
+            items = [{**cards[col], "orders": value, "score": score}
+                     for col, value, score in neighbors.get(product_id, []) if col in cards]
+            key = RECOMMENDATIONS_KEY.format(product_id=product_id)
+            yield ("set", (key, json.dumps(items, ensure_ascii=False))) if items else ("delete", (key,))
+
+    await _run_pipeline(redis, commands())
+
+
+async def _delete_stale(redis: Redis, pattern: str, keep: set[str]):
+    stale = [key async for key in redis.scan_iter(match=pattern, count=PIPELINE_BATCH) if key not in keep]
+    await _run_pipeline(redis, (("delete", (key,)) for key in stale))
+
+
+async def rebuild_recommendations(db: AsyncSession, redis: Redis) -> dict:
+    co, counts, last_order_id, orders = await _accumulate(db, 0)
+    coo = co.tocoo()
+    products = np.flatnonzero(counts).tolist()
+    by_row: dict[int, dict] = {}
+    for row, col, value in zip(coo.row.tolist(), coo.col.tolist(), coo.data.tolist()):
+        by_row.setdefault(row, {})[col] = value
+
+    def pair_commands():
+        for row, mapping in by_row.items():
+            key = PAIRS_KEY.format(product_id=row)
+            yield "delete", (key,)
+            yield "hset", (key, None, None, mapping)
+        yield "delete", (ORDERS_KEY,)
+        for start in range(0, len(products), PIPELINE_BATCH):
+            chunk = products[start:start + PIPELINE_BATCH]
+            yield "hset", (ORDERS_KEY, None, None, {product: int(counts[product]) for product in chunk})
+
+    await _run_pipeline(redis, pair_commands())
+    await _delete_stale(redis, PAIRS_KEY.format(product_id="*"),
+                        {PAIRS_KEY.format(product_id=row) for row in by_row})
+    neighbors = top_neighbors(co, counts)
+    await _publish(db, redis, neighbors, neighbors.keys())
+    await _delete_stale(redis, RECOMMENDATIONS_KEY.format(product_id="[0-9]*"),
+                        {RECOMMENDATIONS_KEY.format(product_id=row) for row in neighbors})
+    await redis.set(WATERMARK_KEY, last_order_id)
+    stats = {"orders": orders, "products": len(neighbors), "pairs": int(co.nnz), "last_order_id": last_order_id}
+    logger.info(f"Recommendations rebuilt: {stats}")
+    return stats
+
+
+async def update_recommendations(db: AsyncSession, redis: Redis) -> dict:
+    watermark = await redis.get(WATERMARK_KEY)
+    if watermark is None:
+        return await rebuild_recommendations(db, redis)
+    delta, delta_counts, last_order_id, orders = await _accumulate(db, int(watermark))
+    if not orders:
+        return {"orders": 0, "products": 0, "pairs": 0, "last_order_id": last_order_id}
+
+    coo = delta.tocoo()
+    affected = np.unique(np.r_[coo.row, np.flatnonzero(delta_counts)]).tolist()
+    await _run_pipeline(redis, [
+        *(("hincrby", (PAIRS_KEY.format(product_id=row), col, value))
+          for row, col, value in zip(coo.row.tolist(), coo.col.tolist(), coo.data.tolist())),
+        *(("hincrby", (ORDERS_KEY, product, int(delta_counts[product])))
+          for product in np.flatnonzero(delta_counts).tolist()),
+    ])
+
+    # Пересчёт top-K только для затронутых строк — из уже накопленных в Redis счётчиков
+    pipe = redis.pipeline(transaction=False)
+    for product_id in affected:
+        pipe.hgetall(PAIRS_KEY.format(product_id=product_id))
+    pipe.hmget(ORDERS_KEY, affected)
+    *pairs, totals = await pipe.execute()
+    n_products = max([*affected, *(int(col) for mapping in pairs for col in mapping)], default=0) + 1
+    rows, cols, values = [], [], []
+    for product_id, mapping in zip(affected, pairs):
+        rows += [product_id] * len(mapping)
+        cols += [int(col) for col in mapping]
+        values += [int(value) for value in mapping.values()]
+    co = sparse.csr_matrix((values, (rows, cols)), shape=(n_products, n_products), dtype=np.int64)
+    counts = np.zeros(n_products, dtype=np.int64)
+    counts[affected] = [int(total or 0) for total in totals]
+    neighbors = top_neighbors(co, counts)
+    await _publish(db, redis, neighbors, affected)
+    await redis.set(WATERMARK_KEY, last_order_id)
+    stats = {"orders": orders, "products": len(affected), "pairs": int(delta.nnz), "last_order_id": last_order_id}
+    logger.info(f"Recommendations updated: {stats}")
+    return stats
+
+
+async def main(argv: list[str]) -> int:
+    from backend.app.db.postgres import AsyncSessionLocal
+    from backend.app.db.redis import redis_client
+    if not argv or argv[0] not in ("rebuild", "update"):
+        logger.error("Usage: python -m backend.app.services.co_purchase rebuild|update")
+        return 2
+    job = rebuild_recommendations if argv[0] == "rebuild" else update_recommendations
+    async with AsyncSessionLocal() as db:
+        await job(db, redis_client)
+    await redis_client.aclose()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main(sys.argv[1:])))
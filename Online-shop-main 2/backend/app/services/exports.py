@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+import logging
+from datetime import datetime, date
+from decimal import Decimal
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.sql import Select
+from backend.app.db.postgres import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+# Строк на один серверный fetch и на один чанк ответа
+CHUNK_SIZE = 1000
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        # Строкой, чтобы бухгалтерия не теряла копейки на float
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+async def _stream_rows(stmt: Select, session_factory):
+    # Своя сессия: зависимости с yield закрываются до отправки тела StreamingResponse
+    async with session_factory() as session:
+        result = await session.stream(stmt.execution_options(yield_per=CHUNK_SIZE))
+        async for partition in result.partitions(CHUNK_SIZE):
+            yield partition
+
+
+async def _ndjson_chunks(stmt: Select, columns: list[str], session_factory):
+    async for rows in _stream_rows(stmt, session_factory):
+        yield "".join(
+            json.dumps({column: _plain(value) for column, value in zip(columns, row)}, ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+
+async def _csv_chunks(stmt: Select, columns: list[str], session_factory):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for rows in _stream_rows(stmt, session_factory):
+        writer.writerows([_plain(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_response(stmt: Select, columns: list[str], fmt: str, filename: str,
+                    session_factory=AsyncSessionLocal) -> StreamingResponse:
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}. Use one of {list(EXPORT_FORMATS)}")
+    chunks = _ndjson_chunks if fmt == "ndjson" else _csv_chunks
+    logger.debug(f"Streaming {fmt} export {filename}")
+    return StreamingResponse(
+        chunks(stmt, columns, session_factory),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
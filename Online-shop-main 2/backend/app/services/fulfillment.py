@@ -0,0 +1,142 @@
+import base64
+import json
+import logging
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.app.models.postgres_models import Order, OrderItem, Product
+from backend.app.schemas.order import OrderQueueItem
+from backend.app.services.serialization import IMMUTABLE_ORDER_STATUSES
+from backend.app.services.inventory import current_stock, restock_shards
+from backend.app.services.analytics import sales_delta_rows, record_sales_deltas
+
+logger = logging.getLogger(__name__)
+
+QUEUE_PAGE_SIZE = 50
+MAX_QUEUE_PAGE_SIZE = 500
+MAX_BULK_TRANSITION = 10000
+
+# Допустимые переходы статуса; из IMMUTABLE_ORDER_STATUSES выхода нет, поэтому готовый JSON
+# таких заказов в order_bytes_cache никогда не устаревает
+ORDER_TRANSITIONS = {
+    "pending": {"processing", "cancelled"},
+    "processing": {"shipped", "cancelled"},
+    "shipped": {"delivered"},
+}
+ORDER_STATUSES = set(ORDER_TRANSITIONS) | IMMUTABLE_ORDER_STATUSES
+
+
+def allowed_sources(target: str) -> set[str]:
+    return {source for source, targets in ORDER_TRANSITIONS.items() if target in targets}
+
+
+def _encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        order_date, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(order_date), int(order_id)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def fetch_queue_page(db: AsyncSession, status: str, date_from: datetime | None = None,
+                           date_to: datetime | None = None, cursor: str | None = None,
+                           limit: int = QUEUE_PAGE_SIZE) -> dict:
+    if status not in ORDER_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status: {status}")
+    # Старые заказы первыми; ключ (order_date, id) внутри статуса читается по ix_orders_status_date без сортировки
+    stmt = select(Order.id, Order.customer_id, Order.order_date, Order.total_amount, Order.status) \
+        .where(Order.status == status)
+    if date_from:
+        stmt = stmt.where(Order.order_date >= date_from)
+    if date_to:
+        stmt = stmt.where(Order.order_date < date_to)
+    if cursor:
+        stmt = stmt.where(tuple_(Order.order_date, Order.id) > _decode_cursor(cursor))
+    result = await db.execute(stmt.order_by(Order.order_date, Order.id).limit(limit + 1))
+    rows = result.all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": [OrderQueueItem.model_validate(row._mapping) for row in rows],
+        "next_cursor": _encode_cursor([rows[-1].order_date.isoformat(), rows[-1].id]) if has_more else None,
+    }
+
+
+async def _reverse_sales(db: AsyncSession, order_ids: list[int]):
+    # Отменённый заказ уходит из выручки /analytics: его строки пишутся в дельты продаж с минусом
+    result = await db.execute(
+        select(OrderItem.order_id, Order.order_date, OrderItem.product_id, Product.category_id,
+               func.sum(OrderItem.quantity).label("quantity"),
+               func.sum(OrderItem.price * OrderItem.quantity).label("revenue"))
+        .join(Order, Order.id == OrderItem.order_id)
+        .join(Product, Product.id == OrderItem.product_id, isouter=True)
+        .where(OrderItem.order_id.in_(order_ids))
+        .group_by(OrderItem.order_id, Order.order_date, OrderItem.product_id, Product.category_id)
+        .order_by(OrderItem.order_id, OrderItem.product_id)
+    )
+    orders: dict[int, tuple[datetime, list[dict]]] = {}
+    for row in result.all():
+        orders.setdefault(row.order_id, (row.order_date, []))[1].append({
+            "product_id": row.product_id, "category_id": row.category_id,
+            "quantity": int(row.quantity), "revenue": row.revenue,
+        })
+    await record_sales_deltas(db, [
+        delta for order_id, (order_date, lines) in orders.items()
+        for delta in sales_delta_rows(order_id, order_date, lines, sign=-1)
+    ])
+
+
+async def transition_orders(db: AsyncSession, order_ids: list[int], target: str) -> tuple[dict, dict[int, int]]:
+    # Один UPDATE на всю пачку: условие по текущему статусу и есть проверка перехода,
+    # поэтому параллельная смена статуса другим сотрудником не проскочит между чтением и записью.
+    # Возвращает (результат, {product_id: остаток}) — остатки меняются только при отмене
+    if target not in ORDER_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status: {target}")
+    sources = allowed_sources(target)
+    if not sources:
+        raise HTTPException(status_code=400, detail=f"Orders cannot be moved to {target}")
+    order_ids = sorted(set(order_ids))
+    if len(order_ids) > MAX_BULK_TRANSITION:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_TRANSITION} orders per request")
+
+    result = await db.execute(
+        update(Order)
+        .where(Order.id.in_(order_ids), Order.status.in_(sources))
+        .values(status=target)
+        .returning(Order.id)
+        .execution_options(synchronize_session=False)
+    )
+    updated = sorted(row[0] for row in result.all())
+
+    stocks = {}
+    if target == "cancelled" and updated:
+        # Отменить можно только неотгруженный заказ — его товар возвращается на склад тем же набором запросов
+        returned = select(OrderItem.product_id, func.sum(OrderItem.quantity).label("quantity")) \
+            .where(OrderItem.order_id.in_(updated)).group_by(OrderItem.product_id).subquery()
+        result = await db.execute(
+            update(Product)
+            .where(Product.id == returned.c.product_id)
+            .values(stock_quantity=Product.stock_quantity + returned.c.quantity)
+            .returning(Product.id)
+            .execution_options(synchronize_session=False)
+        )
+        restocked = result.scalars().all()
+        await restock_shards(db, returned)
+        stocks = await current_stock(db, restocked)
+        await _reverse_sales(db, updated)
+
+    rejected, not_found = [], []
+    skipped = sorted(set(order_ids) - set(updated))
+    if skipped:
+        result = await db.execute(select(Order.id, Order.status).where(Order.id.in_(skipped)))
+        current = dict(result.all())
+        not_found = [order_id for order_id in skipped if order_id not in current]
+        rejected = [{"id": order_id, "status": current[order_id]} for order_id in skipped if order_id in current]
+    logger.info(f"Order transition to {target}: {len(updated)} updated, {len(rejected)} rejected, "
+                f"{len(not_found)} not found, {len(stocks)} products restocked")
+    return {"status": target, "updated": updated, "rejected": rejected, "not_found": not_found}, stocks
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import logging
+from typing import Callable
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cache:invalidation"
+# Сквозная версия изменений: каждое событие получает следующий номер, пропуск номера = потерянное событие
+VERSION_KEY = "cache:invalidation:version"
+
+# Номер и рассылка одной операцией: порядок версий совпадает с порядком сообщений в канале
+# KEYS: версия; ARGV: канал, сущность, id в JSON (null — все)
+PUBLISH_LUA = """
+local version = redis.call('INCR', KEYS[1])
+redis.call('PUBLISH', ARGV[1], version .. ' ' .. ARGV[2] .. ' ' .. ARGV[3])
+return version
+"""
+
+# Обработчик получает сущность и список id; (None, None) — сбросить всё
+Evictor = Callable[[str | None, list[int] | None], None]
+
+
+class InvalidationBus:
+    def __init__(self):
+        self._evictors: list[Evictor] = []
+        self.version: int | None = None
+        self._pubsub = None
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+
+    def register(self, evictor: Evictor):
+        self._evictors.append(evictor)
+
+    def evict(self, entity: str | None, ids: list[int] | None = None):
+        for evictor in self._evictors:
+            try:
+                evictor(entity, ids)
+            except Exception as e:
+                logger.error(f"Cache evictor failed for {entity}: {str(e)}")
+
+    def _evict_all(self, reason: str):
+        logger.warning(f"Dropping all local caches: {reason}")
+        self.evict(None)
+
+    def _apply(self, data: str):
+        version, entity, ids = data.split(" ", 2)
+        version = int(version)
+        if self.version is not None and version > self.version + 1:
+            # Между событиями дыра — какие-то сбросы не дошли, доверять локальным кешам нельзя
+            self._evict_all(f"missed invalidations {self.version + 1}..{version - 1}")
+        else:
+            self.evict(entity, json.loads(ids))
+        self.version = version if self.version is None else max(self.version, version)
+
+    async def _connect(self, redis: Redis):
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(CHANNEL)
+        # Версия читается уже после подписки: всё, что опубликовано позже, придёт сообщением
+        current = int(await redis.get(VERSION_KEY) or 0)
+        if self.version is not None and current != self.version:
+            self._evict_all(f"version moved {self.version} -> {current} while disconnected")
+        self.version = current
+        self._pubsub = pubsub
+
+    async def _listen(self, redis: Redis):
+        while not self._stopping.is_set():
+            try:
+                if self._pubsub is None:
+                    await self._connect(redis)
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    self._apply(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Invalidation bus connection lost: {str(e)}")
+                await self._close()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _close(self):
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+
+    async def start(self, redis: Redis):
+        # Подписка до прогрева кешей: событие во время прогрева не потеряется
+        self._stopping.clear()
+        try:
+            await self._connect(redis)
+        except Exception as e:
+            logger.error(f"Invalidation bus failed to subscribe, will retry: {str(e)}")
+        self._task = asyncio.create_task(self._listen(redis))
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._close()
+
+
+invalidation_bus = InvalidationBus()
+
+
+async def publish_invalidation(redis: Redis, entity: str, ids: list[int] | None = None) -> int | None:
+    # Свой воркер сбрасывает сразу, не дожидаясь своего же сообщения
+    invalidation_bus.evict(entity, ids)
+    try:
+        return int(await redis.register_script(PUBLISH_LUA)(
+            keys=[VERSION_KEY], args=[CHANNEL, entity, json.dumps(ids)]
+        ))
+    except Exception as e:
+        # Остальные воркеры увидят изменение по истечении TTL своих кешей
+        logger.error(f"Failed to publish invalidation for {entity} {ids}: {str(e)}")
+        return None
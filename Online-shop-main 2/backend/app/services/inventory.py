@@ -0,0 +1,251 @@
+import asyncio
+import os
+import logging
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from backend.app.models.postgres_models import Product, StockShard
+
+logger = logging.getLogger(__name__)
+
+# Шардирование остатков (STOCK_SHARDS > 1): остаток товара раскладывается по N строкам product_stock_shards,
+# и параллельные заказы одного хита списывают с разных строк, а не ждут блокировку одной строки products.
+# Для товара с шардами остаток — их сумма; products.stock_quantity остаётся копией для витрины,
+# её догоняет фоновый ребалансировщик
+STOCK_SHARDS = int(os.getenv("STOCK_SHARDS", 0))
+SHARDING_ENABLED = STOCK_SHARDS > 1
+REBALANCE_INTERVAL = float(os.getenv("STOCK_REBALANCE_INTERVAL", 5))
+REBALANCE_BATCH = int(os.getenv("STOCK_REBALANCE_BATCH", 100))
+
+# Товары, шарды которых уже видны в базе, — чтобы не проверять это на каждом заказе
+_sharded: set[int] = set()
+
+
+def split_stock(total: int, shards: int = STOCK_SHARDS) -> list[int]:
+    return [total // shards + (1 if shard < total % shards else 0) for shard in range(shards)]
+
+
+def available_stock():
+    # Выражение остатка для SELECT по products: сумма шардов, если они есть, иначе сама колонка
+    shards = select(func.sum(StockShard.quantity)).where(StockShard.product_id == Product.id).scalar_subquery()
+    return func.coalesce(shards, Product.stock_quantity)
+
+
+async def current_stock(db: AsyncSession, product_ids) -> dict[int, int]:
+    result = await db.execute(select(Product.id, available_stock()).where(Product.id.in_(list(product_ids))))
+    return {product_id: int(stock) for product_id, stock in result.all()}
+
+
+async def _ensure_shards(db: AsyncSession, product_id: int):
+    if product_id in _sharded:
+        return
+    # Первый заказ товара: строка products блокируется один раз, остаток раскладывается по шардам
+    result = await db.execute(select(Product.stock_quantity).where(Product.id == product_id).with_for_update())
+    stock = result.scalar_one_or_none()
+    if stock is None:
+        return
+    existing = await db.execute(select(StockShard.shard).where(StockShard.product_id == product_id).limit(1))
+    if existing.first() is not None:
+        # В кеш — только уже закоммиченные шарды: созданные здесь исчезнут, если заказ откатится
+        _sharded.add(product_id)
+        return
+    await db.execute(insert(StockShard), [
+        {"product_id": product_id, "shard": shard, "quantity": quantity}
+        for shard, quantity in enumerate(split_stock(stock))
+    ])
+
+
+async def _take_spread(db: AsyncSession, product_id: int, quantity: int) -> bool:
+    # Ни в одном свободном шарде не хватает: блокируем все шарды товара по порядку и собираем из нескольких
+    result = await db.execute(
+        select(StockShard.shard, StockShard.quantity)
+        .where(StockShard.product_id == product_id)
+        .order_by(StockShard.shard)
+        .with_for_update()
+    )
+    shards = result.all()
+    if sum(available for _, available in shards) < quantity:
+        return False
+    remaining = quantity
+    for shard, available in sorted(shards, key=lambda row: row.quantity, reverse=True):
+        if remaining == 0:
+            break
+        taken = min(available, remaining)
+        await db.execute(
+            update(StockShard)
+            .where(StockShard.product_id == product_id, StockShard.shard == shard)
+            .values(quantity=StockShard.quantity - taken)
+            .execution_options(synchronize_session=False)
+        )
+        remaining -= taken
+    return True
+
+
+async def take_stock(db: AsyncSession, product_id: int, quantity: int) -> int | None:
+    # Списание в транзакции заказа; возвращает остаток после списания или None, если не хватает
+    if not SHARDING_ENABLED:
+        # Условный UPDATE вместо чтения и записи: остаток не уйдёт в минус даже без Redis
+        result = await db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.stock_quantity >= quantity)
+            .values(stock_quantity=Product.stock_quantity - quantity)
+            .returning(Product.stock_quantity)
+            .execution_options(synchronize_session=False)
+        )
+        return result.scalar_one_or_none()
+
+    await _ensure_shards(db, product_id)
+    # Случайный шард, где хватает остатка; шарды, занятые параллельными заказами, пропускаются, а не ждут
+    candidates = aliased(StockShard)
+    shard = (
+        select(candidates.shard)
+        .where(candidates.product_id == product_id, candidates.quantity >= quantity)
+        .order_by(func.random())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(StockShard)
+        .where(StockShard.product_id == product_id, StockShard.shard == shard, StockShard.quantity >= quantity)
+        .values(quantity=StockShard.quantity - quantity)
+        .returning(StockShard.shard)
+        .execution_options(synchronize_session=False)
+    )
+    if result.first() is None and not await _take_spread(db, product_id, quantity):
+        return None
+    return (await current_stock(db, [product_id])).get(product_id)
+
+
+async def set_stock(db: AsyncSession, stocks: dict[int, int]):
+    # Новый остаток от админа (products.stock_quantity уже записан вызывающим): шарды раскладываются заново
+    if not stocks:
+        return
+    result = await db.execute(
+        delete(StockShard).where(StockShard.product_id.in_(list(stocks))).returning(StockShard.product_id)
+    )
+    sharded = set(result.scalars().all())
+    if sharded and SHARDING_ENABLED:
+        await db.execute(insert(StockShard), [
+            {"product_id": product_id, "shard": shard, "quantity": quantity}
+            for product_id in sorted(sharded)
+            for shard, quantity in enumerate(split_stock(stocks[product_id]))
+        ])
+    _sharded.difference_update(sharded)
+
+
+async def restock_shards(db: AsyncSession, returned):
+    # Возврат на склад для товаров с шардами (returned: подзапрос product_id, quantity) — в нулевой шард,
+    # ровное распределение вернёт ребалансировщик
+    await db.execute(
+        update(StockShard)
+        .where(StockShard.product_id == returned.c.product_id, StockShard.shard == 0)
+        .values(quantity=StockShard.quantity + returned.c.quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def sync_display_stock(db: AsyncSession) -> int:
+    # products.stock_quantity догоняет сумму шардов одним UPDATE — только там, где разошлось
+    totals = select(StockShard.product_id, func.sum(StockShard.quantity).label("total")) \
+        .group_by(StockShard.product_id).subquery()
+    result = await db.execute(
+        update(Product)
+        .where(Product.id == totals.c.product_id, Product.stock_quantity != totals.c.total)
+        .values(stock_quantity=totals.c.total)
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    )
+    synced = len(result.all())
+    await db.commit()
+    return synced
+
+
+async def _reshard(db: AsyncSession, product_id: int) -> bool:
+    total_rows = await db.scalar(select(func.count()).select_from(StockShard).where(StockShard.product_id == product_id))
+    result = await db.execute(
+        select(StockShard.shard, StockShard.quantity)
+        .where(StockShard.product_id == product_id)
+        .with_for_update(skip_locked=True)
+    )
+    shards = result.all()
+    if len(shards) < total_rows:
+        # Часть шардов держат идущие заказы — не ждём их, разложим в следующий проход
+        await db.rollback()
+        return False
+    await db.execute(delete(StockShard).where(StockShard.product_id == product_id))
+    await db.execute(insert(StockShard), [
+        {"product_id": product_id, "shard": shard, "quantity": quantity}
+        for shard, quantity in enumerate(split_stock(sum(available for _, available in shards)))
+    ])
+    await db.commit()
+    return True
+
+
+async def rebalance(db: AsyncSession) -> int:
+    # Перекос: самый пустой шард меньше половины ровной доли (заказы с него уже уходят в медленный путь)
+    # или число шардов не совпадает с STOCK_SHARDS после смены настройки
+    result = await db.execute(
+        select(StockShard.product_id)
+        .group_by(StockShard.product_id)
+        .having(or_(
+            func.count() != STOCK_SHARDS,
+            (func.max(StockShard.quantity) - func.min(StockShard.quantity) > 1)
+            & (func.min(StockShard.quantity) * STOCK_SHARDS * 2 < func.sum(StockShard.quantity))
+        ))
+        .limit(REBALANCE_BATCH)
+    )
+    product_ids = result.scalars().all()
+    await db.rollback()
+    rebalanced = 0
+    for product_id in product_ids:
+        rebalanced += await _reshard(db, product_id)
+    return rebalanced
+
+
+async def fold_shards(db: AsyncSession) -> int:
+    # Шардирование выключили: остаток из шардов возвращается в products.stock_quantity, шарды удаляются
+    synced = await sync_display_stock(db)
+    result = await db.execute(delete(StockShard).returning(StockShard.product_id))
+    folded = len(set(result.scalars().all()))
+    await db.commit()
+    _sharded.clear()
+    if folded:
+        logger.info(f"Stock sharding is disabled, folded shards of {folded} products ({synced} stocks updated)")
+    return folded
+
+
+class StockRebalancer:
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(REBALANCE_INTERVAL)
+            try:
+                async with self.session_factory() as db:
+                    rebalanced = await rebalance(db)
+                    synced = await sync_display_stock(db)
+                if rebalanced or synced:
+                    logger.debug(f"Stock shards: {rebalanced} products rebalanced, {synced} display stocks synced")
+            except Exception as e:
+                logger.error(f"Stock rebalance failed: {str(e)}")
+
+    async def start(self):
+        if not SHARDING_ENABLED:
+            async with self.session_factory() as db:
+                await fold_shards(db)
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Stock sharding enabled: {STOCK_SHARDS} shards per product")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
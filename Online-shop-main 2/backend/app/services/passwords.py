@@ -0,0 +1,75 @@
+import asyncio
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", 12))
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+# Сколько операций может ждать пула, прежде чем новые логины получат 503
+HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", 64))
+HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", 2))
+
+# deprecated="auto" + bcrypt__rounds: хеши с другой стоимостью считаются устаревшими
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt отпускает GIL, поэтому потоков достаточно и процессы не нужны
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+_pending = 0
+
+HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth", "Password hash operations queued or running", multiprocess_mode="livesum"
+)
+HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "Password hash operation latency including queueing",
+    ["operation"], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+HASH_REJECTED = Counter(
+    "password_hash_rejected_total", "Password hash operations rejected because the pool was saturated",
+    ["operation"]
+)
+HASH_REHASHED = Counter(
+    "password_rehash_total", "Passwords transparently rehashed on login with current cost parameters"
+)
+
+
+async def _run(operation: str, func, *args):
+    global _pending
+    if _pending >= HASH_QUEUE_LIMIT:
+        HASH_REJECTED.labels(operation).inc()
+        logger.warning(f"Password hash pool saturated ({_pending} pending), rejecting {operation}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(HASH_RETRY_AFTER)}
+        )
+    _pending += 1
+    HASH_QUEUE_DEPTH.inc()
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+    finally:
+        _pending -= 1
+        HASH_QUEUE_DEPTH.dec()
+        HASH_DURATION.labels(operation).observe(time.perf_counter() - start)
+
+
+async def hash_password(password: str) -> str:
+    return await _run("hash", pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> tuple[bool, str | None]:
+    # Возвращает (пароль верен, новый хеш или None, если пересчитывать не нужно)
+    valid, new_hash = await _run("verify", pwd_context.verify_and_update, password, hashed)
+    if valid and new_hash:
+        HASH_REHASHED.inc()
+    return valid, new_hash
+
+
+def shutdown_password_hasher():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,140 @@
+import os
+import logging
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Iterable
+import numpy as np
+from pymongo.database import Database
+from backend.app.services.catalog_cache import get_cached_promotions
+
+logger = logging.getLogger(__name__)
+
+# Суммы считаются в целых копейках, скидка акции — в базисных пунктах (1/10000).
+# Округление одно — до копейки в цене единицы товара, половина вверх; итоги складываются без потерь
+MINOR_UNITS = 100
+BASIS_POINTS = 10000
+CENT = Decimal("0.01")
+PRICE_MEMO_SIZE = int(os.getenv("PRICE_MEMO_SIZE", 50000))
+
+
+def to_minor(amount: Any) -> int:
+    # str(): float из формы или SQLite не должен тащить двоичный хвост (0.1 + 0.2)
+    return int((Decimal(str(amount)) * MINOR_UNITS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor(amount: int) -> Decimal:
+    return (Decimal(int(amount)) / MINOR_UNITS).quantize(CENT)
+
+
+def discount_points(discount: Any) -> int:
+    points = int((Decimal(str(discount)) * BASIS_POINTS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    return min(max(points, 0), BASIS_POINTS)
+
+
+def apply_discounts(prices: np.ndarray, points: np.ndarray) -> np.ndarray:
+    # Округляется сама цена со скидкой, половина вверх: 1.01 со скидкой 50% — 0.51, а не 0.50
+    return (prices * (BASIS_POINTS - points) + BASIS_POINTS // 2) // BASIS_POINTS
+
+
+@dataclass
+class PricedLine:
+    product_id: int
+    quantity: int
+    unit_price: Decimal
+    price: Decimal
+    total: Decimal
+
+    @property
+    def discounted(self) -> bool:
+        return self.price < self.unit_price
+
+
+@dataclass
+class PricedCart:
+    lines: list[PricedLine]
+    subtotal: Decimal
+    discount: Decimal
+    total: Decimal
+
+
+class PricingEngine:
+    # Акции не суммируются: на товар действует наибольшая скидка.
+    # Цена со скидкой запоминается по (товар, цена); набор акций — версия: новый список из catalog_cache
+    # (после сброса по шине или по TTL) сбрасывает и индекс скидок, и запомненные цены
+    def __init__(self, memo_size: int):
+        self.memo_size = memo_size
+        self.version = 0
+        self._source = None
+        self._points: dict[int, int] = {}
+        self._memo: dict[tuple[int, int], int] = {}
+
+    async def _discounts(self, mongo_db: Database) -> dict[int, int]:
+        promotions = await get_cached_promotions(mongo_db)
+        if promotions is not self._source:
+            points = {}
+            for promotion in promotions:
+                value = discount_points(promotion["discount"])
+                for product_id in promotion.get("products") or []:
+                    if value > points.get(product_id, 0):
+                        points[product_id] = value
+            self._source = promotions
+            self._points = points
+            self._memo.clear()
+            self.version += 1
+        return self._points
+
+    async def price_lines(self, mongo_db: Database, lines: Iterable[tuple[int, Any, int]]) -> PricedCart:
+        lines = list(lines)
+        if not lines:
+            zero = from_minor(0)
+            return PricedCart(lines=[], subtotal=zero, discount=zero, total=zero)
+        points = await self._discounts(mongo_db)
+        product_ids = [product_id for product_id, _, _ in lines]
+        base = np.fromiter((to_minor(price) for _, price, _ in lines), dtype=np.int64, count=len(lines))
+        quantities = np.fromiter((quantity for _, _, quantity in lines), dtype=np.int64, count=len(lines))
+
+        keys = list(zip(product_ids, base.tolist()))
+        effective = [self._memo.get(key) for key in keys]
+        missing = [index for index, value in enumerate(effective) if value is None]
+        if missing:
+            # Промахи считаются одним проходом по массиву, а не построчно
+            computed = apply_discounts(
+                base[missing], np.fromiter((points.get(product_ids[index], 0) for index in missing), dtype=np.int64)
+            )
+            if len(self._memo) + len(missing) > self.memo_size:
+                self._memo.clear()
+            for index, value in zip(missing, computed.tolist()):
+                self._memo[keys[index]] = value
+                effective[index] = value
+        effective = np.array(effective, dtype=np.int64)
+        totals = effective * quantities
+        subtotal = int((base * quantities).sum())
+        total = int(totals.sum())
+
+        priced = [
+            PricedLine(product_id=product_id, quantity=quantity, unit_price=from_minor(unit), price=from_minor(price),
+                       total=from_minor(line_total))
+            for product_id, quantity, unit, price, line_total
+            in zip(product_ids, quantities.tolist(), base.tolist(), effective.tolist(), totals.tolist())
+        ]
+        return PricedCart(lines=priced, subtotal=from_minor(subtotal), discount=from_minor(subtotal - total),
+                          total=from_minor(total))
+
+
+pricing_engine = PricingEngine(PRICE_MEMO_SIZE)
+
+
+def _field(product, name: str):
+    return product[name] if isinstance(product, dict) else getattr(product, name)
+
+
+async def price_cart(mongo_db: Database, lines: Iterable[tuple[Any, int]]) -> PricedCart:
+    # lines: (товар — ORM-объект или dict карточки, количество)
+    return await pricing_engine.price_lines(
+        mongo_db, ((_field(product, "id"), _field(product, "price"), quantity) for product, quantity in lines)
+    )
+
+
+async def price_products(mongo_db: Database, products: Iterable[Any]) -> dict[int, PricedLine]:
+    priced = await price_cart(mongo_db, ((product, 1) for product in products))
+    return {line.product_id: line for line in priced.lines}
@@ -0,0 +1,76 @@
+import os
+import logging
+from collections import Counter
+from fastapi import HTTPException
+from sqlalchemy import Integer, Numeric, cast, column, func, or_, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.app.models.postgres_models import Product
+from backend.app.schemas.product import ProductBulkChange
+from backend.app.services.inventory import set_stock
+
+logger = logging.getLogger(__name__)
+
+# Строк VALUES на один UPDATE: 4 параметра на строку, asyncpg допускает до 32767 параметров в запросе
+BULK_CHUNK_SIZE = int(os.getenv("PRODUCT_BULK_CHUNK_SIZE", 1000))
+MAX_BULK_CHANGES = 10000
+
+UPDATED = "updated"
+NOT_FOUND = "not_found"
+CONFLICT = "conflict"
+
+
+def _changes(chunk: list[ProductBulkChange]):
+    return values(
+        column("id", Integer), column("price", Numeric(10, 2)), column("stock_quantity", Integer),
+        column("version", Integer), name="changes"
+    ).data([(change.id, change.price, change.stock_quantity, change.version) for change in chunk])
+
+
+async def apply_product_changes(db: AsyncSession, changes: list[ProductBulkChange]) -> tuple[list[dict], dict[int, int]]:
+    # Возвращает (результат по каждому id в порядке запроса, {product_id: новый остаток})
+    ids = [change.id for change in changes]
+    if len(ids) > MAX_BULK_CHANGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_CHANGES} changes per request")
+    duplicates = sorted(product_id for product_id, count in Counter(ids).items() if count > 1)
+    if duplicates:
+        raise HTTPException(status_code=400, detail=f"Duplicate product ids: {duplicates}")
+
+    results = {}
+    # По возрастанию id — тот же порядок блокировок строк, что у create_order
+    ordered = sorted(changes, key=lambda change: change.id)
+    for start in range(0, len(ordered), BULK_CHUNK_SIZE):
+        data = _changes(ordered[start:start + BULK_CHUNK_SIZE])
+        # NULL в строке VALUES — «поле не меняется». cast обязателен: колонка из одних NULL в Postgres имеет тип text
+        price = cast(data.c.price, Numeric(10, 2))
+        stock = cast(data.c.stock_quantity, Integer)
+        version = cast(data.c.version, Integer)
+        result = await db.execute(
+            update(Product)
+            .where(Product.id == data.c.id, or_(version.is_(None), Product.version == version))
+            .values(
+                price=func.coalesce(price, Product.price),
+                stock_quantity=func.coalesce(stock, Product.stock_quantity),
+                version=Product.version + 1
+            )
+            .returning(Product.id, Product.price, Product.stock_quantity, Product.version)
+            .execution_options(synchronize_session=False)
+        )
+        for row in result.all():
+            results[row.id] = {"id": row.id, "status": UPDATED, "price": row.price,
+                               "stock_quantity": row.stock_quantity, "version": row.version}
+
+    # Не попавшие в RETURNING: либо товара нет, либо версия уже другая (его успели изменить)
+    skipped = [product_id for product_id in ids if product_id not in results]
+    if skipped:
+        result = await db.execute(select(Product.id, Product.version).where(Product.id.in_(skipped)))
+        current = dict(result.all())
+        for product_id in skipped:
+            results[product_id] = {"id": product_id, "status": CONFLICT, "version": current[product_id]} \
+                if product_id in current else {"id": product_id, "status": NOT_FOUND}
+
+    stocks = {change.id: results[change.id]["stock_quantity"]
+              for change in changes if change.stock_quantity is not None and results[change.id]["status"] == UPDATED}
+    # Шарды остатка раскладываются заново под новые значения — в той же транзакции
+    await set_stock(db, stocks)
+    logger.info(f"Bulk product update: {sum(r['status'] == UPDATED for r in results.values())} of {len(ids)} updated")
+    return [results[product_id] for product_id in ids], stocks
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import logging
+from pymongo import UpdateOne
+from backend.app.db.mongo import get_mongo_db, COLLECTION
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних просмотров хранится в профиле (кольцевой буфер)
+RECENT_VIEWS_LIMIT = int(os.getenv("RECENT_VIEWS_LIMIT", 20))
+WISHLIST_LIMIT = int(os.getenv("WISHLIST_LIMIT", 200))
+FLUSH_INTERVAL = float(os.getenv("PROFILE_VIEWS_FLUSH_INTERVAL", 2.0))
+# Сброс раньше интервала, если в буфере накопилось столько покупателей
+FLUSH_BATCH = int(os.getenv("PROFILE_VIEWS_FLUSH_BATCH", 500))
+
+
+class RecentViewsWriter:
+    def __init__(self, db_factory=get_mongo_db):
+        self.db_factory = db_factory
+        # customer_id -> просмотренные товары, от старых к новым, без повторов
+        self._pending: dict[str, list[int]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def record(self, customer_id: str, product_id: int):
+        # Только запись в память: на пути запроса нет обращения к Mongo
+        views = self._pending.setdefault(customer_id, [])
+        if product_id in views:
+            views.remove(product_id)
+        views.append(product_id)
+        del views[:-RECENT_VIEWS_LIMIT]
+        if len(self._pending) >= FLUSH_BATCH:
+            self._wakeup.set()
+
+    def _operations(self, pending: dict[str, list[int]]) -> list[UpdateOne]:
+        operations = []
+        for customer_id, views in pending.items():
+            newest_first = views[::-1]
+            # $pull и $push одного поля нельзя совместить в одном update, поэтому две операции подряд
+            operations.append(UpdateOne({"customer_id": customer_id},
+                                        {"$pull": {"recent_views": {"$in": newest_first}}}))
+            operations.append(UpdateOne(
+                {"customer_id": customer_id},
+                {"$push": {"recent_views": {"$each": newest_first, "$position": 0, "$slice": RECENT_VIEWS_LIMIT}}},
+                upsert=True
+            ))
+        return operations
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        operations = self._operations(pending)
+        try:
+            # pymongo синхронный — bulk_write уходит в поток, чтобы не блокировать event loop
+            await asyncio.to_thread(self.db_factory()[COLLECTION].bulk_write, operations, ordered=True)
+            logger.debug(f"Flushed recent views for {len(pending)} customers")
+        except Exception as e:
+            # Просмотры — некритичные данные: при ошибке пачка теряется, а не копится в памяти
+            logger.error(f"Failed to flush recent views: {str(e)}")
+        return len(pending)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+recent_views_writer = RecentViewsWriter()
+
+
+def record_view(customer_id, product_id: int):
+    if customer_id is not None:
+        recent_views_writer.record(str(customer_id), product_id)
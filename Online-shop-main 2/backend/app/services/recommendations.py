@@ -0,0 +1,24 @@
+import json
+import logging
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+# Готовый список «часто покупают вместе» для карточки товара (JSON) — пишет только пакетная задача
+RECOMMENDATIONS_KEY = "fbt:{product_id}"
+# Счётчики совместных покупок (hash: product_id -> число заказов) для инкрементального пересчёта
+PAIRS_KEY = "fbt:pairs:{product_id}"
+# Сколько заказов содержат товар (hash: product_id -> число заказов)
+ORDERS_KEY = "fbt:orders"
+# id последнего учтённого заказа
+WATERMARK_KEY = "fbt:last_order_id"
+
+
+async def get_recommendations(redis: Redis, product_id: int) -> list[dict]:
+    # Одно чтение из кеша; при промахе или ошибке Redis просто нет блока рекомендаций
+    try:
+        cached = await redis.get(RECOMMENDATIONS_KEY.format(product_id=product_id))
+    except Exception as e:
+        logger.error(f"Redis error in get_recommendations: {str(e)}")
+        return []
+    return json.loads(cached) if cached else []
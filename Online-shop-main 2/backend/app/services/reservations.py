@@ -0,0 +1,241 @@
+import asyncio
+import os
+import time
+import logging
+from fastapi import HTTPException
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.app.models.postgres_models import Product
+from backend.app.services.inventory import current_stock
+
+logger = logging.getLogger(__name__)
+
+# Сколько живёт резерв строки корзины без новых добавлений
+RESERVATION_TTL = int(os.getenv("STOCK_RESERVATION_TTL", 900))
+SWEEP_INTERVAL = float(os.getenv("STOCK_SWEEP_INTERVAL", 30))
+SWEEP_BATCH = int(os.getenv("STOCK_SWEEP_BATCH", 500))
+
+# Сколько ещё можно зарезервировать: остаток в Postgres минус активные резервы
+AVAILABLE_KEY = "stock:available:{product_id}"
+# Сумма активных резервов по товару
+HELD_KEY = "stock:held:{product_id}"
+# Резервы строк корзины: hash "customer_id:product_id" -> количество
+HOLDS_KEY = "stock:holds"
+# Когда истекает резерв строки: zset "customer_id:product_id" -> unix time
+EXPIRY_KEY = "stock:hold_expiry"
+
+# KEYS: available, held, holds, expiry; ARGV: строка, количество, срок, остаток в Postgres.
+# Неположительное количество отвергается здесь же ({-1, ...}): иначе DECRBY/INCRBY увеличили бы общий остаток
+RESERVE_LUA = """
+local quantity = tonumber(ARGV[2])
+if not quantity or quantity <= 0 then
+    return {-1, 0}
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('SET', KEYS[1], tonumber(ARGV[4]) - tonumber(redis.call('GET', KEYS[2]) or '0'))
+end
+local available = tonumber(redis.call('GET', KEYS[1]))
+if available < quantity then
+    return {0, available}
+end
+redis.call('DECRBY', KEYS[1], quantity)
+redis.call('INCRBY', KEYS[2], quantity)
+redis.call('HINCRBY', KEYS[3], ARGV[1], quantity)
+redis.call('ZADD', KEYS[4], ARGV[3], ARGV[1])
+return {1, available - quantity}
+"""
+
+# KEYS: available, held, holds, expiry; ARGV: строка
+RELEASE_LUA = """
+local quantity = tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or '0')
+if quantity > 0 then
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        redis.call('INCRBY', KEYS[1], quantity)
+    end
+    redis.call('DECRBY', KEYS[2], quantity)
+end
+redis.call('HDEL', KEYS[3], ARGV[1])
+redis.call('ZREM', KEYS[4], ARGV[1])
+return quantity
+"""
+
+# Резервы строк превращаются в продажу; чего не хватает (резерв истёк или меньше заказа) —
+# берётся из свободного остатка. Всё или ничего: сначала проверка всех строк, потом запись.
+# KEYS: holds, expiry, затем по паре available, held на строку; ARGV: n, затем по тройке строка, количество, остаток.
+# Возвращает 0, номер строки без остатка или минус номер строки с неположительным количеством
+CHECKOUT_LUA = """
+local n = tonumber(ARGV[1])
+local held, need = {}, {}
+for i = 1, n do
+    local available_key, held_key = KEYS[i * 2 + 1], KEYS[i * 2 + 2]
+    local line, quantity, stock = ARGV[i * 3 - 1], tonumber(ARGV[i * 3]), tonumber(ARGV[i * 3 + 1])
+    if not quantity or quantity <= 0 then
+        return -i
+    end
+    if redis.call('EXISTS', available_key) == 0 then
+        redis.call('SET', available_key, stock - tonumber(redis.call('GET', held_key) or '0'))
+    end
+    held[i] = tonumber(redis.call('HGET', KEYS[1], line) or '0')
+    need[i] = quantity - held[i]
+    if need[i] > tonumber(redis.call('GET', available_key)) then
+        return i
+    end
+end
+for i = 1, n do
+    local line = ARGV[i * 3 - 1]
+    redis.call('DECRBY', KEYS[i * 2 + 1], need[i])
+    redis.call('DECRBY', KEYS[i * 2 + 2], held[i])
+    redis.call('HDEL', KEYS[1], line)
+    redis.call('ZREM', KEYS[2], line)
+end
+return 0
+"""
+
+# KEYS: available, held; ARGV: остаток в Postgres
+RECONCILE_LUA = """
+local available = tonumber(ARGV[1]) - tonumber(redis.call('GET', KEYS[2]) or '0')
+redis.call('SET', KEYS[1], math.max(0, available))
+return available
+"""
+
+# Имена ключей товара собираются внутри скрипта (заранее неизвестно, какие строки истекли),
+# поэтому скрипт рассчитан на один инстанс Redis, а не на кластер.
+# KEYS: holds, expiry; ARGV: now, лимит; возвращает плоский список product_id, количество
+SWEEP_LUA = """
+local lines = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local released = {}
+for _, line in ipairs(lines) do
+    local product_id = string.match(line, ':(%d+)$')
+    local quantity = tonumber(redis.call('HGET', KEYS[1], line) or '0')
+    if quantity > 0 then
+        if redis.call('EXISTS', 'stock:available:' .. product_id) == 1 then
+            redis.call('INCRBY', 'stock:available:' .. product_id, quantity)
+        end
+        redis.call('DECRBY', 'stock:held:' .. product_id, quantity)
+    end
+    redis.call('HDEL', KEYS[1], line)
+    redis.call('ZREM', KEYS[2], line)
+    table.insert(released, product_id)
+    table.insert(released, quantity)
+end
+return released
+"""
+
+
+def _line(customer_id, product_id: int) -> str:
+    return f"{customer_id}:{product_id}"
+
+
+def _product_keys(product_id: int) -> list[str]:
+    return [AVAILABLE_KEY.format(product_id=product_id), HELD_KEY.format(product_id=product_id)]
+
+
+async def reserve_stock(redis: Redis, customer_id, product: Product, quantity: int):
+    try:
+        reserved, available = await redis.register_script(RESERVE_LUA)(
+            keys=[*_product_keys(product.id), HOLDS_KEY, EXPIRY_KEY],
+            args=[_line(customer_id, product.id), quantity, time.time() + RESERVATION_TTL, product.stock_quantity or 0]
+        )
+    except Exception as e:
+        # Без Redis проверяем только остаток в Postgres; окончательно его защищает create_order
+        logger.error(f"Redis error in reserve_stock: {str(e)}")
+        if quantity <= 0:
+            raise HTTPException(status_code=400, detail="Quantity must be positive")
+        if quantity > (product.stock_quantity or 0):
+            raise HTTPException(status_code=400, detail="Requested quantity exceeds stock")
+        return
+    if int(reserved) < 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+    if not int(reserved):
+        raise HTTPException(status_code=400, detail=f"Requested quantity exceeds stock, available: {max(0, int(available))}")
+    logger.debug(f"Reserved {quantity} of product {product.id} for customer {customer_id}")
+
+
+async def release_stock(redis: Redis, customer_id, product_ids: list[int]):
+    try:
+        release = redis.register_script(RELEASE_LUA)
+        for product_id in product_ids:
+            await release(keys=[*_product_keys(product_id), HOLDS_KEY, EXPIRY_KEY],
+                          args=[_line(customer_id, product_id)])
+    except Exception as e:
+        # Не снятый резерв всё равно вернётся в остаток по истечении срока
+        logger.error(f"Redis error in release_stock: {str(e)}")
+
+
+async def checkout_stock(redis: Redis, customer_id, lines: list[tuple[Product, int]]) -> bool:
+    # Возвращает False, если Redis недоступен: тогда остаток защищает только условный UPDATE в Postgres
+    keys, args = [HOLDS_KEY, EXPIRY_KEY], [len(lines)]
+    for product, quantity in lines:
+        keys += _product_keys(product.id)
+        args += [_line(customer_id, product.id), quantity, product.stock_quantity or 0]
+    try:
+        failed = int(await redis.register_script(CHECKOUT_LUA)(keys=keys, args=args))
+    except Exception as e:
+        logger.error(f"Redis error in checkout_stock: {str(e)}")
+        return False
+    if failed < 0:
+        raise HTTPException(status_code=400, detail=f"Invalid quantity for product {lines[-failed - 1][0].name}")
+    if failed:
+        raise HTTPException(status_code=400, detail=f"Not enough stock for product {lines[failed - 1][0].name}")
+    return True
+
+
+async def restock(redis: Redis, lines: list[tuple[int, int]]):
+    # Компенсация, если после checkout_stock не удалась транзакция в Postgres
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for product_id, quantity in lines:
+            pipe.incrby(AVAILABLE_KEY.format(product_id=product_id), quantity)
+        await pipe.execute()
+    except Exception as e:
+        logger.error(f"Redis error in restock: {str(e)}")
+
+
+async def reconcile_stock(redis: Redis, stocks: dict[int, int]):
+    # Счётчик приводится к остатку из Postgres за вычетом активных резервов
+    try:
+        reconcile = redis.register_script(RECONCILE_LUA)
+        for product_id, stock in stocks.items():
+            await reconcile(keys=_product_keys(product_id), args=[stock])
+    except Exception as e:
+        logger.error(f"Redis error in reconcile_stock: {str(e)}")
+
+
+async def sweep_expired(redis: Redis, db: AsyncSession) -> int:
+    released = await redis.register_script(SWEEP_LUA)(keys=[HOLDS_KEY, EXPIRY_KEY], args=[time.time(), SWEEP_BATCH])
+    product_ids = {int(product_id) for product_id in released[::2]}
+    if product_ids:
+        await reconcile_stock(redis, await current_stock(db, product_ids))
+        logger.info(f"Released {len(released) // 2} expired stock reservations")
+    return len(released) // 2
+
+
+class ReservationSweeper:
+    def __init__(self, redis: Redis, session_factory):
+        self.redis = redis
+        self.session_factory = session_factory
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            try:
+                async with self.session_factory() as db:
+                    # Полная пачка — возможно, истекло больше; добираем без паузы
+                    while await sweep_expired(self.redis, db) >= SWEEP_BATCH:
+                        pass
+            except Exception as e:
+                logger.error(f"Stock reservation sweep failed: {str(e)}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,104 @@
+import base64
+import json
+import logging
+from datetime import datetime
+from fastapi import HTTPException
+from redis.asyncio import Redis
+from sqlalchemy import func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from backend.app.models.postgres_models import Review
+from backend.app.schemas.review import ReviewOut
+
+logger = logging.getLogger(__name__)
+
+FIRST_PAGE_SIZE = 10
+FIRST_PAGE_TTL = 300
+REVIEW_SORTS = ("newest", "highest", "lowest")
+
+
+def _first_page_key(product_id: int, sort: str) -> str:
+    return f"product_reviews:{product_id}:{sort}"
+
+
+def _encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _decode_cursor(cursor: str, sort: str) -> tuple:
+    # Форма курсора зависит от сортировки: [created_at, id] или [rating, id]
+    try:
+        first, review_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        first = datetime.fromisoformat(first) if sort == "newest" else int(first)
+        return first, int(review_id)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _keyset(sort: str):
+    # (колонки ключа, направление, как достать значения курсора из строки)
+    if sort == "newest":
+        return (Review.created_at, Review.id), "desc", lambda r: [r.created_at.isoformat(), r.id]
+    if sort == "highest":
+        return (Review.rating, Review.id), "desc", lambda r: [r.rating, r.id]
+    return (Review.rating, Review.id), "asc", lambda r: [r.rating, r.id]
+
+
+async def _summary(db: AsyncSession, product_id: int) -> tuple[float, int]:
+    result = await db.execute(
+        select(func.avg(Review.rating), func.count(Review.id)).where(Review.product_id == product_id)
+    )
+    average, count = result.one()
+    return round(float(average), 2) if average is not None else 0, count
+
+
+async def fetch_review_page(db: AsyncSession, product_id: int, sort: str = "newest",
+                            cursor: str | None = None, limit: int = FIRST_PAGE_SIZE) -> dict:
+    if sort not in REVIEW_SORTS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort: {sort}. Use one of {list(REVIEW_SORTS)}")
+    columns, direction, cursor_values = _keyset(sort)
+    stmt = select(Review).where(Review.product_id == product_id)
+    if cursor:
+        values = _decode_cursor(cursor, sort)
+        key = tuple_(*columns)
+        stmt = stmt.where(key < values if direction == "desc" else key > values)
+    order = [column.desc() if direction == "desc" else column.asc() for column in columns]
+    # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+    result = await db.execute(stmt.order_by(*order).limit(limit + 1))
+    reviews = result.scalars().all()
+    has_more = len(reviews) > limit
+    reviews = reviews[:limit]
+    page = {
+        "items": [ReviewOut.model_validate(review).model_dump(mode="json") for review in reviews],
+        "next_cursor": _encode_cursor(cursor_values(reviews[-1])) if has_more else None,
+    }
+    if cursor is None:
+        page["average_rating"], page["review_count"] = await _summary(db, product_id)
+    return page
+
+
+async def get_review_page(db: AsyncSession, redis: Redis, product_id: int, sort: str = "newest",
+                          cursor: str | None = None, limit: int = FIRST_PAGE_SIZE) -> dict:
+    cacheable = cursor is None and limit == FIRST_PAGE_SIZE
+    if cacheable:
+        try:
+            cached = await redis.get(_first_page_key(product_id, sort))
+            if cached:
+                return json.loads(cached)
+        except Exception as e:
+            logger.error(f"Redis error in get_review_page: {str(e)}")
+    page = await fetch_review_page(db, product_id, sort, cursor, limit)
+    if cacheable:
+        try:
+            await redis.set(_first_page_key(product_id, sort), json.dumps(page), ex=FIRST_PAGE_TTL)
+        except Exception as e:
+            logger.error(f"Redis error in get_review_page: {str(e)}")
+    return page
+
+
+async def invalidate_review_pages(redis: Redis, product_id: int):
+    try:
+        await redis.delete(*[_first_page_key(product_id, sort) for sort in REVIEW_SORTS])
+        logger.debug(f"Invalidated cached review pages for product {product_id}")
+    except Exception as e:
+        logger.error(f"Redis error in invalidate_review_pages: {str(e)}")
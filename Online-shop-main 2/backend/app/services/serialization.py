@@ -0,0 +1,118 @@
+import json
+import os
+import logging
+import typing
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+from backend.app.schemas.money import Money
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:
+    orjson = None
+    ORJSONResponse = None
+
+logger = logging.getLogger(__name__)
+
+# Быстрый путь JSON (FAST_JSON=1): orjson по умолчанию, а списковые эндпоинты сериализуют строки
+# заранее собранными функциями прямо в байты, без создания моделей Pydantic и повторной валидации
+FAST_JSON = os.getenv("FAST_JSON", "0") == "1"
+if FAST_JSON and orjson is None:
+    logger.warning("FAST_JSON=1 but orjson is not installed, falling back to the standard JSON path")
+    FAST_JSON = False
+DEFAULT_RESPONSE_CLASS = ORJSONResponse if FAST_JSON else JSONResponse
+
+# Заказы в этих статусах больше не меняются — их JSON можно держать готовым
+IMMUTABLE_ORDER_STATUSES = {"completed", "delivered", "cancelled"}
+ORDER_BYTES_CACHE_SIZE = int(os.getenv("ORDER_BYTES_CACHE_SIZE", 10000))
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, default=lambda v: v.isoformat() if isinstance(v, (date, datetime)) else _default(v),
+                      ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _cast_for(annotation) -> Callable | None:
+    # float и Money в схеме: Decimal из Numeric и int из SQLite должны дать то же, что выдал бы Pydantic
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    if annotation in (float, Money) or (typing.get_origin(annotation) is typing.Union and args in ([float], [Money])):
+        return float
+    if typing.get_origin(annotation) in (list, typing.List) and args and isinstance(args[0], type) \
+            and issubclass(args[0], BaseModel):
+        item = compile_serializer(args[0])
+        return lambda values: [item(value) for value in values]
+    return None
+
+
+_serializers: dict[type[BaseModel], Callable[[Any], dict]] = {}
+
+
+def compile_serializer(schema: type[BaseModel]) -> Callable[[Any], dict]:
+    # Один раз на схему: список (поле, значение по умолчанию, приведение); дальше — только чтение атрибутов
+    if schema in _serializers:
+        return _serializers[schema]
+    plan = []
+    for name, field in schema.model_fields.items():
+        default = None if field.is_required() else field.get_default(call_default_factory=True)
+        plan.append((name, default, _cast_for(field.annotation)))
+    plan = tuple(plan)
+
+    def serialize(obj) -> dict:
+        get = obj.get if isinstance(obj, dict) else (lambda name, default: getattr(obj, name, default))
+        out = {}
+        for name, default, cast in plan:
+            value = get(name, default)
+            out[name] = cast(value) if cast is not None and value is not None else value
+        return out
+
+    _serializers[schema] = serialize
+    return serialize
+
+
+def json_bytes(value: Any, schema: type[BaseModel]) -> bytes:
+    serialize = compile_serializer(schema)
+    if isinstance(value, (list, tuple)):
+        return dumps([serialize(item) for item in value])
+    return dumps(serialize(value))
+
+
+def fast_json(value: Any, schema: type[BaseModel]):
+    # Без FAST_JSON возвращаем объект как есть — его обработает response_model обычным путём
+    if not FAST_JSON:
+        return value
+    return Response(content=json_bytes(value, schema), media_type="application/json")
+
+
+class BytesLRU:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries: OrderedDict[Any, Any] = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+
+# order_id -> (customer_id, готовый JSON); только завершённые заказы, поэтому сбрасывать нечего
+order_bytes_cache = BytesLRU(ORDER_BYTES_CACHE_SIZE)
@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import secrets
+import time
+import uuid
+import logging
+from fastapi import HTTPException, Request, Response
+from jose import jwt, JWTError, ExpiredSignatureError
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+# redis — сессия в Redis (session:{id}), token — подписанный токен, проверяемый локально
+SESSION_MODE = os.getenv("SESSION_MODE", "redis")
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+if SESSION_MODE == "token" and not SESSION_SECRET:
+    # Без общего секрета токены одного воркера не примет другой и всё сбросится при перезапуске
+    logger.warning("SESSION_SECRET is not set, using a random per-process secret")
+    SESSION_SECRET = secrets.token_urlsafe(32)
+ALGORITHM = "HS256"
+ACCESS_TTL = int(os.getenv("SESSION_ACCESS_TTL", 900))
+REFRESH_TTL = int(os.getenv("SESSION_REFRESH_TTL", 7 * 24 * 3600))
+
+ACCESS_COOKIE = "session_id"
+REFRESH_COOKIE = "refresh_token"
+# Отозванные access-токены: zset jti -> exp; живут не дольше ACCESS_TTL, поэтому список короткий.
+# Вне пространства session:*, которое вход администратора перебирает через SCAN
+REVOKED_KEY = "revoked_sessions"
+# Отозванные refresh-токены проверяются прямо в Redis: обновление редкое
+REVOKED_REFRESH_KEY = "revoked_refresh:{jti}"
+REVOCATION_SYNC_INTERVAL = float(os.getenv("SESSION_REVOCATION_SYNC_INTERVAL", 5))
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str):
+        # Двойное хеширование: k позиций из двух половин одного blake2b
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value: str):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevocationList:
+    def __init__(self):
+        self.bloom = BloomFilter(1024)
+        self.synced_at = 0.0
+        self._sync_task: asyncio.Task | None = None
+
+    async def sync(self, redis: Redis):
+        try:
+            now = time.time()
+            # Истёкшие токены и так не пройдут проверку подписи — выбрасываем их из списка
+            await redis.zremrangebyscore(REVOKED_KEY, "-inf", now)
+            revoked = await redis.zrangebyscore(REVOKED_KEY, now, "+inf")
+            bloom = BloomFilter(max(1024, len(revoked) * 2))
+            for jti in revoked:
+                bloom.add(jti)
+            self.bloom = bloom
+            self.synced_at = now
+        except Exception as e:
+            logger.error(f"Failed to sync session revocations: {str(e)}")
+
+    def _schedule_sync(self, redis: Redis):
+        # Синхронизация в фоне: запрос не ждёт Redis
+        if time.time() - self.synced_at < REVOCATION_SYNC_INTERVAL:
+            return
+        if self._sync_task is None or self._sync_task.done():
+            self.synced_at = time.time()
+            self._sync_task = asyncio.create_task(self.sync(redis))
+
+    async def is_revoked(self, redis: Redis, jti: str) -> bool:
+        self._schedule_sync(redis)
+        if jti not in self.bloom:
+            return False
+        # Срабатывание фильтра (возможно ложное) подтверждаем в Redis
+        try:
+            return await redis.zscore(REVOKED_KEY, jti) is not None
+        except Exception as e:
+            logger.error(f"Redis error in is_revoked: {str(e)}")
+            return True
+
+    async def revoke(self, redis: Redis, jti: str, expires_at: float):
+        await redis.zadd(REVOKED_KEY, {jti: expires_at})
+        self.bloom.add(jti)
+
+
+revocations = RevocationList()
+
+
+def _encode(identity: dict, token_type: str, ttl: int) -> tuple[str, dict]:
+    now = int(time.time())
+    claims = {**identity, "type": token_type, "jti": uuid.uuid4().hex, "iat": now, "exp": now + ttl}
+    return jwt.encode(claims, SESSION_SECRET, algorithm=ALGORITHM), claims
+
+
+def issue_tokens(identity: dict) -> tuple[str, str]:
+    # identity: {"customer_id": ...} или {"admin_id": ...}
+    access, _ = _encode(identity, "access", ACCESS_TTL)
+    refresh, _ = _encode(identity, "refresh", REFRESH_TTL)
+    return access, refresh
+
+
+def decode_token(token: str, token_type: str) -> dict | None:
+    try:
+        claims = jwt.decode(token, SESSION_SECRET, algorithms=[ALGORITHM])
+    except ExpiredSignatureError:
+        return None
+    except JWTError as e:
+        logger.debug(f"Rejected session token: {str(e)}")
+        return None
+    return claims if claims.get("type") == token_type else None
+
+
+def _session_from_claims(claims: dict) -> dict:
+    session = {"last_activity": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(claims["iat"]))}
+    for key in ("customer_id", "admin_id"):
+        if key in claims:
+            session[key] = claims[key]
+    return session
+
+
+async def resolve_session(redis: Redis, session_id: str | None) -> dict | None:
+    if not session_id:
+        return None
+    if SESSION_MODE == "token":
+        claims = decode_token(session_id, "access")
+        if claims is None or await revocations.is_revoked(redis, claims["jti"]):
+            return None
+        return _session_from_claims(claims)
+    session_data = await redis.get(f"session:{session_id}")
+    if not session_data:
+        return None
+    try:
+        return json.loads(session_data)
+    except json.JSONDecodeError:
+        logger.error("Failed to decode session data")
+        return None
+
+
+async def start_session(redis: Redis, identity: dict) -> tuple[str, str | None]:
+    # Возвращает значение cookie session_id и refresh-токен (только в режиме token)
+    if SESSION_MODE == "token":
+        return issue_tokens(identity)
+    session_id = str(uuid.uuid4())
+    session_data = {**identity, "last_activity": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())}
+    await redis.set(f"session:{session_id}", json.dumps(session_data), ex=3600)
+    return session_id, None
+
+
+def set_session_cookies(response, access: str, refresh: str | None = None):
+    max_age = ACCESS_TTL if SESSION_MODE == "token" else None
+    response.set_cookie(key=ACCESS_COOKIE, value=access, httponly=True, samesite="lax", path="/", max_age=max_age)
+    if refresh is not None:
+        response.set_cookie(key=REFRESH_COOKIE, value=refresh, httponly=True, samesite="lax", path="/",
+                            max_age=REFRESH_TTL)
+
+
+async def refresh_access_token(redis: Redis, refresh_token: str | None) -> str | None:
+    claims = decode_token(refresh_token, "refresh") if refresh_token else None
+    if claims is None:
+        return None
+    # Refresh-токен не одноразовый: параллельные запросы с истёкшим access обновляются независимо.
+    # Отзывается он только при выходе — здесь проверка прямо в Redis, обновление бывает раз в ACCESS_TTL
+    if await redis.exists(REVOKED_REFRESH_KEY.format(jti=claims["jti"])):
+        return None
+    access, _ = _encode({key: claims[key] for key in ("customer_id", "admin_id") if key in claims}, "access", ACCESS_TTL)
+    return access
+
+
+async def refresh_session(request: Request, response: Response, redis: Redis) -> dict:
+    if SESSION_MODE != "token":
+        raise HTTPException(status_code=400, detail="Token sessions are disabled")
+    access = await refresh_access_token(redis, request.cookies.get(REFRESH_COOKIE))
+    if access is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    set_session_cookies(response, access)
+    return {"session_id": access}
+
+
+def clear_session_cookies(response):
+    response.delete_cookie(ACCESS_COOKIE, path="/")
+    response.delete_cookie(REFRESH_COOKIE, path="/")
+
+
+async def end_session(redis: Redis, session_id: str | None, refresh_token: str | None = None):
+    if not session_id:
+        return
+    if SESSION_MODE != "token":
+        await redis.delete(f"session:{session_id}")
+        return
+    claims = decode_token(session_id, "access")
+    if claims is not None:
+        await revocations.revoke(redis, claims["jti"], claims["exp"])
+    refresh_claims = decode_token(refresh_token, "refresh") if refresh_token else None
+    if refresh_claims is not None:
+        await redis.set(REVOKED_REFRESH_KEY.format(jti=refresh_claims["jti"]), 1,
+                        ex=max(1, refresh_claims["exp"] - int(time.time())))
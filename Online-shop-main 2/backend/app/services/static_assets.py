@@ -0,0 +1,100 @@
+import argparse
+import os
+import stat
+import sys
+import logging
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+from backend.app.middleware.compression import (
+    accepted_encodings, brotli, compress, is_compressible, COMPRESSION_MIN_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# Готовые сжатые копии лежат рядом с файлом: style.css -> style.css.br, style.css.gz
+SIBLING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+PRECOMPRESS_EXTENSIONS = {".css", ".js", ".mjs", ".map", ".svg", ".html", ".json", ".txt", ".xml", ".csv"}
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    # Если клиент принимает br/gzip и рядом есть свежая сжатая копия — отдаём её как есть, без сжатия на запрос
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse) or response.status_code != 200:
+            return response
+        if not is_compressible(response.media_type):
+            return response
+        response.headers.add_vary_header("Accept-Encoding")
+        request_headers = Headers(scope=scope)
+        for encoding in accepted_encodings(request_headers.get("accept-encoding", ""), list(SIBLING_SUFFIXES)):
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + SIBLING_SUFFIXES[encoding])
+            # Копия старше исходника — после правки файла сборку не перезапускали
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode) \
+                    or stat_result.st_mtime < response.stat_result.st_mtime:
+                continue
+            compressed = FileResponse(
+                full_path, stat_result=stat_result, media_type=response.media_type,
+                headers={"content-encoding": encoding, "vary": "Accept-Encoding"}
+            )
+            if self.is_not_modified(compressed.headers, request_headers):
+                return NotModifiedResponse(compressed.headers)
+            return compressed
+        return response
+
+
+def precompress(directory: str, min_size: int = COMPRESSION_MIN_SIZE, force: bool = False) -> tuple[int, int]:
+    # Максимальные уровни: сжимаем один раз при сборке, а не на каждый запрос
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    written = skipped = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            source = os.path.join(root, name)
+            if os.path.splitext(name)[1].lower() not in PRECOMPRESS_EXTENSIONS:
+                continue
+            source_stat = os.stat(source)
+            if source_stat.st_size < min_size:
+                continue
+            data = None
+            for encoding in encodings:
+                target = source + SIBLING_SUFFIXES[encoding]
+                if not force and os.path.exists(target) and os.stat(target).st_mtime >= source_stat.st_mtime:
+                    skipped += 1
+                    continue
+                if data is None:
+                    with open(source, "rb") as f:
+                        data = f.read()
+                compressed = compress(data, encoding, gzip_level=9, brotli_quality=11)
+                if len(compressed) >= len(data):
+                    # Не сжимается — устаревшую копию убираем, чтобы её не отдали вместо нового файла
+                    if os.path.exists(target):
+                        os.remove(target)
+                    continue
+                tmp = target + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(compressed)
+                os.replace(tmp, target)
+                written += 1
+                logger.info(f"{target}: {len(data)} -> {len(compressed)} bytes")
+    return written, skipped
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Сжатые копии статики (.br/.gz) для PrecompressedStaticFiles")
+    parser.add_argument("command", choices=["precompress"])
+    parser.add_argument("--directory", default="static")
+    parser.add_argument("--min-size", type=int, default=COMPRESSION_MIN_SIZE)
+    parser.add_argument("--force", action="store_true", help="пересжать даже свежие копии")
+    args = parser.parse_args(argv)
+    written, skipped = precompress(args.directory, args.min_size, args.force)
+    if brotli is None:
+        logger.warning("brotli is not installed, only .gz copies were written")
+    logger.info(f"Precompressed {written} files, {skipped} up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import logging
+import jinja2
+from fastapi.responses import StreamingResponse
+from sqlalchemy.sql import Select
+
+logger = logging.getLogger(__name__)
+
+# Сколько HTML может накопиться, прежде чем рендер подождёт отправки клиенту: ограничивает память запроса
+STREAM_CHUNK_SIZE = int(os.getenv("HTML_STREAM_CHUNK_SIZE", 16 * 1024))
+# Строк на один серверный fetch для потоковых страниц
+STREAM_BATCH_SIZE = int(os.getenv("HTML_STREAM_BATCH_SIZE", 200))
+
+
+class _RenderStream:
+    # Шаблон рендерится в отдельной задаче и складывает куски в буфер. Пока рендер идёт без ожиданий,
+    # отправка не вмешивается; как только шаблон ждёт строки из базы или буфер заполнился —
+    # накопленное уходит клиенту. Так шапка страницы отправляется до первой пачки строк
+    def __init__(self, template: jinja2.Template, context: dict):
+        self.template = template
+        self.context = context
+        self._pieces: list[str] = []
+        self._size = 0
+        self._done = False
+        self._ready = asyncio.Event()
+        self._drained = asyncio.Event()
+
+    async def _render(self):
+        try:
+            async for piece in self.template.generate_async(self.context):
+                self._pieces.append(piece)
+                self._size += len(piece)
+                self._ready.set()
+                if self._size >= STREAM_CHUNK_SIZE:
+                    self._drained.clear()
+                    await self._drained.wait()
+        finally:
+            self._done = True
+            self._ready.set()
+
+    async def chunks(self):
+        task = asyncio.create_task(self._render())
+        try:
+            while True:
+                # Ждём, только если отдавать нечего: рендер мог дописать хвост и завершиться, пока шла отправка
+                if not self._pieces and not self._done:
+                    self._ready.clear()
+                    await self._ready.wait()
+                if self._pieces:
+                    chunk = "".join(self._pieces)
+                    self._pieces.clear()
+                    self._size = 0
+                    self._drained.set()
+                    yield chunk.encode()
+                elif self._done:
+                    break
+            # Ошибка посреди страницы: заголовки уже ушли, клиент получит оборванный ответ
+            await task
+        except Exception as e:
+            logger.error(f"Streaming render of {self.template.name} failed: {str(e)}")
+            raise
+        finally:
+            # Клиент ушёл — рендер и его сессия с базой больше не нужны
+            if not task.done():
+                task.cancel()
+
+
+class StreamingTemplates:
+    # Как Jinja2Templates, но ответ уходит по мере рендера; в контекст можно класть асинхронные итераторы строк
+    def __init__(self, directory: str):
+        self.env = jinja2.Environment(loader=jinja2.FileSystemLoader(directory), autoescape=True, enable_async=True)
+
+    def TemplateResponse(self, name: str, context: dict, status_code: int = 200, headers: dict | None = None):
+        template = self.env.get_template(name)
+        return StreamingResponse(_RenderStream(template, context).chunks(), status_code=status_code,
+                                 headers=headers, media_type="text/html; charset=utf-8")
+
+
+async def stream_partitions(session_factory, stmt: Select, batch_size: int = STREAM_BATCH_SIZE):
+    # Своя сессия: зависимости с yield закрываются до отправки тела StreamingResponse
+    async with session_factory() as session:
+        result = await session.stream_scalars(stmt.execution_options(yield_per=batch_size))
+        async for partition in result.partitions(batch_size):
+            yield partition
+
+
+async def stream_scalars(session_factory, stmt: Select, batch_size: int = STREAM_BATCH_SIZE):
+    async for partition in stream_partitions(session_factory, stmt, batch_size):
+        for row in partition:
+            yield row
\ No newline at end of file
@@ -0,0 +1,58 @@
+import asyncio
+import os
+import time
+import logging
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.future import select
+from backend.app.models.postgres_models import Product, Category, Review
+from backend.app.services.catalog_cache import get_cached_categories, get_cached_promotions, get_home_feed
+
+logger = logging.getLogger(__name__)
+
+# Сколько соединений пула прогреть; по умолчанию — весь постоянный пул
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", 0))
+
+# Самые частые запросы: asyncpg готовит выражение на каждом соединении отдельно,
+# а SQLAlchemy кеширует их компиляцию — первый запрос после старта не платит ни за то, ни за другое.
+# Прогрев выполняет запросы, поэтому здесь только дешёвые: выборки по индексу и небольшой справочник категорий.
+# Поиск по ILIKE без индекса прочитал бы всю таблицу на каждом соединении пула — его подготовку оплачивает первый поиск
+HOT_STATEMENTS = [
+    select(Product).where(Product.id == 0),
+    select(Product).where(Product.id.in_([0])),
+    select(Category),
+    select(Review).where(Review.product_id == 0).order_by(Review.created_at.desc(), Review.id.desc()).limit(11),
+]
+
+
+async def warm_statements(engine: AsyncEngine) -> int:
+    size = getattr(engine.pool, "size", None)
+    connections = WARMUP_CONNECTIONS or (size() if callable(size) else 1)
+
+    async def prepare():
+        async with engine.connect() as conn:
+            for stmt in HOT_STATEMENTS:
+                await conn.execute(stmt)
+
+    # Соединения берутся одновременно, иначе пул раз за разом выдавал бы одно и то же
+    await asyncio.gather(*(prepare() for _ in range(connections)))
+    return connections
+
+
+async def warm_caches(session_factory, mongo_db):
+    async with session_factory() as db:
+        await get_cached_categories(db)
+        await get_home_feed(db)
+    await get_cached_promotions(mongo_db)
+
+
+async def warm_up(engine: AsyncEngine, session_factory, mongo_db) -> bool:
+    # Ошибка прогрева не валит старт: холодный воркер всё равно лучше, чем никакой
+    started = time.perf_counter()
+    results = await asyncio.gather(warm_statements(engine), warm_caches(session_factory, mongo_db),
+                                   return_exceptions=True)
+    failed = [result for result in results if isinstance(result, BaseException)]
+    for error in failed:
+        logger.error(f"Warm-up step failed: {type(error).__name__}: {str(error)}")
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s, "
+                f"{results[0] if not isinstance(results[0], BaseException) else 0} connections prepared")
+    return not failed
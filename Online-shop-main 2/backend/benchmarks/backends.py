@@ -0,0 +1,93 @@
+import os
+import tempfile
+import logging
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from backend.app.db.postgres import Base, get_db
+from backend.app.db.replica import get_read_session_factory
+from backend.app.db import postgres, redis as redis_module, mongo as mongo_module
+from backend.app.db.redis import get_redis
+from backend.app.db.mongo import get_mongo_db, get_mongo_collection
+from backend.app.db.instrumentation import instrument_engine
+from backend.app.jobs.queue import JobContext, Worker
+from backend.app.jobs import handlers  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+
+class Backends:
+    def __init__(self, session_factory, redis, mongo_db, cleanup):
+        self.session_factory = session_factory
+        self.redis = redis
+        self.mongo_db = mongo_db
+        self._cleanup = cleanup
+        # Воркер фоновых задач в том же процессе: иначе побочные эффекты запросов копятся в очереди
+        self.worker = Worker(JobContext(redis, mongo_db, session_factory), concurrency=4)
+        self.worker.start()
+
+    async def close(self):
+        await self.worker.stop()
+        await self._cleanup()
+
+
+async def use_containers(app) -> Backends:
+    # Те же Postgres/Redis/MongoDB, что поднимает docker-compose
+    from backend.app.db.migrations import run_migrations
+    await redis_module.init_redis()
+    await postgres.init_db()
+    await run_migrations()
+
+    async def cleanup():
+        await redis_module.close_redis()
+        await postgres.engine.dispose()
+
+    return Backends(postgres.AsyncSessionLocal, redis_module.redis_client, mongo_module.get_mongo_db(), cleanup)
+
+
+async def use_fakes(app) -> Backends:
+    # Внутрипроцессные заглушки: SQLite вместо Postgres, fakeredis, mongomock
+    try:
+        import fakeredis
+        import mongomock
+        import aiosqlite  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError(f"Fake backends require fakeredis, mongomock and aiosqlite: {e}")
+
+    tmpdir = tempfile.mkdtemp(prefix="onshp-bench-")
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{os.path.join(tmpdir, 'bench.db')}",
+        connect_args={"timeout": 30}
+    )
+    instrument_engine(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    fake_redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    fake_mongo = mongomock.MongoClient()[mongo_module.MONGO_DB_NAME]
+
+    async def override_db():
+        async with session_factory() as session:
+            yield session
+
+    async def override_redis():
+        return fake_redis
+
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_read_session_factory] = lambda: session_factory
+    app.dependency_overrides[get_redis] = override_redis
+    app.dependency_overrides[get_mongo_db] = lambda: fake_mongo
+    app.dependency_overrides[get_mongo_collection] = lambda: fake_mongo["products"]
+
+    async def cleanup():
+        app.dependency_overrides.clear()
+        await fake_redis.aclose()
+        await engine.dispose()
+
+    logger.info(f"Fake backends ready, sqlite database in {tmpdir}")
+    return Backends(session_factory, fake_redis, fake_mongo, cleanup)
+
+
+BACKENDS = {
+    "containers": use_containers,
+    "fakes": use_fakes,
+}
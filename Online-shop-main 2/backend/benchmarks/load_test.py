@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from collections import defaultdict
+import httpx
+from backend.app.main import app
+from backend.benchmarks.backends import BACKENDS
+from backend.benchmarks.seed import seed_dataset
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = None
+        self.finished = None
+
+    async def call(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            failed = response.status_code >= 400
+        except Exception as e:
+            logger.debug(f"{route} failed: {e}")
+            failed = True
+        self.latencies[route].append(time.perf_counter() - start)
+        if failed:
+            self.errors[route] += 1
+
+    def report(self) -> dict:
+        elapsed = self.finished - self.started
+        routes = {}
+        for route, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            routes[route] = {
+                "count": len(samples),
+                "errors": self.errors[route],
+                "rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 99) * 1000, 2),
+            }
+        total = sum(r["count"] for r in routes.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "rps": round(total / elapsed, 2),
+            "routes": routes,
+        }
+
+
+def percentile(sorted_samples: list[float], pct: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+async def shopper_journey(client: httpx.AsyncClient, recorder: Recorder, dataset: dict, rng: random.Random):
+    # browse → product → add to cart → checkout
+    await recorder.call(client, "GET /products/html", "GET", "/products/html",
+                        params={"query": rng.choice(dataset["search_terms"])})
+    product_id = rng.choice(dataset["product_ids"])
+    await recorder.call(client, "GET /products/{product_id}", "GET", f"/products/{product_id}")
+    await recorder.call(client, "POST /cart/add/{product_id}", "POST", f"/cart/add/{product_id}",
+                        params={"quantity": rng.randint(1, 3)})
+    await recorder.call(client, "GET /cart/html", "GET", "/cart/html")
+    await recorder.call(client, "POST /orders/", "POST", "/orders/")
+
+
+async def admin_journey(client: httpx.AsyncClient, recorder: Recorder, dataset: dict, rng: random.Random):
+    product_id = rng.choice(dataset["product_ids"])
+    await recorder.call(client, "GET /products/edit/{product_id}", "GET", f"/products/edit/{product_id}")
+    await recorder.call(client, "POST /products/edit/{product_id}", "POST", f"/products/edit/{product_id}", data={
+        "name": f"Товар {product_id}",
+        "price": round(rng.uniform(100, 100000), 2),
+        "category_id": rng.choice(dataset["category_ids"]),
+        "stock_quantity": 1_000_000,
+        "description": "Обновлено нагрузочным тестом",
+    })
+    await recorder.call(client, "GET /categories/", "GET", "/categories/")
+
+
+async def virtual_user(journey, session_id: str, recorder: Recorder, dataset: dict, deadline: float,
+                       iterations: int | None, rng_seed: int):
+    rng = random.Random(rng_seed)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 cookies={"session_id": session_id}) as client:
+        done = 0
+        while time.perf_counter() < deadline and (iterations is None or done < iterations):
+            await journey(client, recorder, dataset, rng)
+            done += 1
+
+
+async def run(args) -> dict:
+    backends = await BACKENDS[args.backend](app)
+    try:
+        dataset = await seed_dataset(backends, products=args.products, customers=max(args.users, args.customers))
+        recorder = Recorder()
+        admin_users = round(args.users * args.admin_ratio)
+        deadline = time.perf_counter() + args.duration
+        tasks = []
+        for i in range(args.users):
+            if i < admin_users:
+                session_id = dataset["admin_sessions"][i % len(dataset["admin_sessions"])]
+                journey = admin_journey
+            else:
+                session_id = dataset["user_sessions"][i % len(dataset["user_sessions"])]
+                journey = shopper_journey
+            tasks.append(virtual_user(journey, session_id, recorder, dataset, deadline, args.iterations, args.seed + i))
+        recorder.started = time.perf_counter()
+        await asyncio.gather(*tasks)
+        recorder.finished = time.perf_counter()
+    finally:
+        await backends.close()
+    report = recorder.report()
+    report["config"] = {
+        "backend": args.backend,
+        "users": args.users,
+        "admin_ratio": args.admin_ratio,
+        "duration_s": args.duration,
+        "iterations": args.iterations,
+        "products": args.products,
+    }
+    return report
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> list[str]:
+    regressions = []
+    for route, stats in report["routes"].items():
+        base = baseline.get("routes", {}).get(route)
+        if not base or not base["p95_ms"]:
+            continue
+        growth = stats["p95_ms"] / base["p95_ms"] - 1
+        if growth > max_regression:
+            regressions.append(f"{route}: p95 {base['p95_ms']}ms -> {stats['p95_ms']}ms (+{growth:.0%})")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест пользовательских сценариев магазина")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="fakes")
+    parser.add_argument("--users", type=int, default=20, help="число одновременных виртуальных пользователей")
+    parser.add_argument("--admin-ratio", type=float, default=0.1, help="доля пользователей-администраторов")
+    parser.add_argument("--duration", type=float, default=30.0, help="длительность прогона, секунды")
+    parser.add_argument("--iterations", type=int, default=None, help="число сценариев на пользователя")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="файл для JSON-отчёта (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="JSON-отчёт предыдущего коммита для сравнения")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="допустимый рост p95, доля")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # Отладочные логи приложения сами по себе становятся узким местом
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("backend.benchmarks").setLevel(logging.INFO)
+    report = asyncio.run(run(args))
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
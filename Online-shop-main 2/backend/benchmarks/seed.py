@@ -0,0 +1,97 @@
+import json
+import random
+import uuid
+import logging
+from datetime import datetime, timedelta
+from backend.app.services.passwords import pwd_context
+from backend.app.models.postgres_models import Category, Product, Customer, Admin, Review, Order, OrderItem
+from backend.app.db.mongo import COLLECTION
+
+logger = logging.getLogger(__name__)
+
+WORDS = ["Смартфон", "Ноутбук", "Наушники", "Планшет", "Часы", "Камера", "Колонка", "Монитор", "Клавиатура", "Мышь"]
+BRANDS = ["Galaxy", "Lenovo", "Apple", "Xiaomi", "Sony", "Huawei", "Asus", "Dell", "Logitech", "JBL"]
+
+
+async def seed_dataset(backends, categories: int = 10, products: int = 500, customers: int = 200,
+                       admins: int = 5, reviews_per_product: int = 5, orders_per_customer: int = 3,
+                       rng_seed: int = 42) -> dict:
+    rng = random.Random(rng_seed)
+    # Один хеш на всех: bcrypt при сидировании тысяч пользователей занял бы минуты
+    password_hash = pwd_context.hash("benchmark")
+    async with backends.session_factory() as db:
+        category_rows = [Category(name=f"Категория {i}", description=f"Описание категории {i}") for i in range(categories)]
+        db.add_all(category_rows)
+        await db.flush()
+
+        product_rows = [
+            Product(
+                name=f"{rng.choice(WORDS)} {rng.choice(BRANDS)} {i}",
+                price=round(rng.uniform(100, 100000), 2),
+                stock_quantity=1_000_000,
+                category_id=rng.choice(category_rows).id
+            )
+            for i in range(products)
+        ]
+        db.add_all(product_rows)
+        customer_rows = [
+            Customer(name=f"Покупатель {i}", email=f"bench-{i}@example.com", password=password_hash,
+                     phone="+70000000000", address="Москва")
+            for i in range(customers)
+        ]
+        db.add_all(customer_rows)
+        admin_rows = [Admin(email=f"bench-admin-{i}@example.com", password=password_hash) for i in range(admins)]
+        db.add_all(admin_rows)
+        await db.flush()
+
+        now = datetime.utcnow()
+        for product in product_rows:
+            for _ in range(rng.randint(0, reviews_per_product * 2)):
+                db.add(Review(product_id=product.id, customer_id=rng.choice(customer_rows).id,
+                              rating=rng.randint(1, 5), comment="Отзыв для нагрузочного теста",
+                              created_at=now - timedelta(days=rng.randint(0, 365))))
+        for customer in customer_rows:
+            for _ in range(orders_per_customer):
+                lines = rng.sample(product_rows, rng.randint(1, min(4, len(product_rows))))
+                quantities = [rng.randint(1, 3) for _ in lines]
+                order = Order(customer_id=customer.id, order_date=now - timedelta(days=rng.randint(0, 365)),
+                              total_amount=sum(p.price * q for p, q in zip(lines, quantities)), status="completed")
+                db.add(order)
+                await db.flush()
+                db.add_all([OrderItem(order_id=order.id, product_id=p.id, quantity=q, price=p.price)
+                            for p, q in zip(lines, quantities)])
+        await db.commit()
+        product_ids = [p.id for p in product_rows]
+        customer_ids = [c.id for c in customer_rows]
+        admin_ids = [a.id for a in admin_rows]
+
+    await _insert_profiles(backends.mongo_db, customer_ids)
+
+    # Сессии создаются напрямую в Redis, чтобы логин не искажал замеры каталога
+    user_sessions, admin_sessions = [], []
+    for customer_id in customer_ids:
+        session_id = str(uuid.uuid4())
+        await backends.redis.set(f"session:{session_id}", json.dumps(
+            {"customer_id": customer_id, "last_activity": now.isoformat()}), ex=3600)
+        user_sessions.append(session_id)
+    for admin_id in admin_ids:
+        session_id = str(uuid.uuid4())
+        await backends.redis.set(f"session:{session_id}", json.dumps(
+            {"admin_id": admin_id, "last_activity": now.isoformat()}), ex=3600)
+        admin_sessions.append(session_id)
+
+    logger.info(f"Seeded {len(product_ids)} products, {len(customer_ids)} customers, {len(admin_ids)} admins")
+    return {
+        "product_ids": product_ids,
+        "category_ids": [c.id for c in category_rows],
+        "user_sessions": user_sessions,
+        "admin_sessions": admin_sessions,
+        "search_terms": [w.lower() for w in WORDS + BRANDS],
+    }
+
+
+async def _insert_profiles(mongo_db, customer_ids: list[int]):
+    mongo_db[COLLECTION].insert_many([
+        {"customer_id": str(customer_id), "preferences": {}, "recent_views": [], "wishlist": []}
+        for customer_id in customer_ids
+    ])